@@ -0,0 +1,316 @@
+"""
+历史日报回填：为一段日期范围、一批用户或 ticker 生成（或重新生成）日报，默认不发邮件。
+
+分两个阶段：
+1. ticker 阶段：按 (目标日期, ticker 批次) 并行检索和总结，结果写入 ticker_digests（已缓存的直接跳过）；
+2. 用户阶段：按 (目标日期, 用户) 并行从缓存组装日报，写入 daily_digests（日期 = 目标日期 + 1 天，与定时任务一致）。
+
+每完成一个单元就写一次检查点文件，中断后用相同命令重跑会跳过已完成的部分；全部成功后自动删除检查点。
+摘要生成失败或没有搜到新闻的 ticker 不会写入缓存，连同关注它的用户日报一起记为失败、不写检查点（日报也不保存），
+退出码为 1，重跑时重试。
+可用于 prompt 调整后重建历史日报（--regenerate），或新部署时提前预热缓存（只传 --tickers）。
+
+用法（在 backend 目录下）：
+  python -m backfill --start 2026-01-01 --end 2026-01-07                     # 所有用户
+  python -m backfill --start 2026-01-01 --end 2026-01-07 --users a@x.com,b@y.com
+  python -m backfill --start 2026-01-01 --end 2026-01-07 --tickers AAPL,MSFT   # 只预热 ticker 缓存
+  python -m backfill --start 2026-01-01 --end 2026-01-07 --regenerate --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("backfill")
+
+
+class Checkpoint:
+    """已完成单元的记录：{"tickers": {目标日期: [ticker]}, "users": {目标日期: [user_id]}}"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict[str, Set[str]]] = {"tickers": {}, "users": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for kind in self.done:
+                self.done[kind] = {d: set(keys) for d, keys in raw.get(kind, {}).items()}
+
+    def is_done(self, kind: str, day: date, key: str) -> bool:
+        return key in self.done[kind].get(day.isoformat(), ())
+
+    def mark(self, kind: str, day: date, keys: List[str]) -> None:
+        self.done[kind].setdefault(day.isoformat(), set()).update(keys)
+        self._save()
+
+    def _save(self) -> None:
+        # 先写临时文件再替换，进程中途被杀也不会留下半个 JSON
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({kind: {d: sorted(keys) for d, keys in days.items()} for kind, days in self.done.items()}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _date_range(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+async def _select(emails: List[str], tickers: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    返回 (user_ids, [(ticker, name)])。
+    指定 --users 时 ticker 默认取这些用户关注的公司；只指定 --tickers 时不生成用户日报；都不指定时为所有有关注的用户。
+    """
+    from sqlalchemy import select
+
+    from database import AsyncSessionLocal
+    from models import Company, User, UserCompany
+    from services.digest_prefetch import followed_tickers
+
+    async with AsyncSessionLocal() as db:
+        user_ids: List[str] = []
+        if emails:
+            rows = (await db.execute(select(User.id, User.email).where(User.email.in_(emails)))).all()
+            missing = set(emails) - {email for _, email in rows}
+            if missing:
+                logger.warning(f"users not found: {', '.join(sorted(missing))}")
+            user_ids = [user_id for user_id, _ in rows]
+        elif not tickers:
+            user_ids = list(await db.scalars(select(UserCompany.user_id).distinct()))
+
+        if tickers:
+            names = dict((await db.execute(
+                select(Company.ticker, Company.name).where(Company.ticker.in_(tickers))
+            )).all())
+            selected = [(t, names.get(t, t)) for t in dict.fromkeys(tickers)]
+        elif emails:
+            selected = await db.execute(
+                select(Company.ticker, Company.name)
+                .join(UserCompany, UserCompany.company_id == Company.id)
+                .where(UserCompany.user_id.in_(user_ids))
+                .distinct()
+                .order_by(Company.ticker)
+            )
+            selected = [(t, n) for t, n in selected]
+        else:
+            selected = await followed_tickers(db)
+        return user_ids, selected
+
+
+async def _backfill_tickers(
+    days: List[date],
+    tickers: List[Tuple[str, str]],
+    checkpoint: Checkpoint,
+    concurrency: int,
+    regenerate: bool,
+) -> Dict[str, int]:
+    """ticker 阶段：所有 (日期, 批次) 单元共用一个并发上限，日期之间、批次之间并行。"""
+    from config import settings
+    from database import AsyncSessionLocal
+    from services.digest_prefetch import prefetch_ticker_digests
+    from services.ticker_digests import cached_tickers, delete_ticker_digests
+
+    batch_size = max(1, settings.DIGEST_PREFETCH_BATCH_SIZE)
+    units: List[Tuple[date, List[Tuple[str, str]]]] = []
+    for day in days:
+        todo = [(t, n) for t, n in tickers if not checkpoint.is_done("tickers", day, t)]
+        units.extend((day, todo[i:i + batch_size]) for i in range(0, len(todo), batch_size))
+
+    totals = {"cached": 0, "fetched": 0, "uncached": 0, "failed": 0}
+    sem = asyncio.Semaphore(concurrency)
+    finished = 0
+
+    async def _run(day: date, batch: List[Tuple[str, str]]) -> None:
+        nonlocal finished
+        async with sem:
+            symbols = [t for t, _ in batch]
+            try:
+                if regenerate:
+                    async with AsyncSessionLocal() as db:
+                        await delete_ticker_digests(db, symbols, day)
+                stats = await prefetch_ticker_digests(day, batch)
+                # uncached 的 ticker（摘要失败 / 没搜到新闻）没有写入缓存，按缓存里实际有哪些记检查点
+                async with AsyncSessionLocal() as db:
+                    done = await cached_tickers(db, symbols, day)
+            except Exception as e:
+                logger.error(f"[tickers] {day} {symbols[0]}..{symbols[-1]} failed: {e}")
+                totals["failed"] += len(batch)
+                return
+            for k, v in stats.items():
+                totals[k] += v
+            failed = [t for t in symbols if t not in done]
+            if failed:
+                logger.error(f"[tickers] {day} not cached (summary failed or no news): {', '.join(failed)}")
+                totals["failed"] += len(failed)
+            checkpoint.mark("tickers", day, [t for t in symbols if t in done])
+            finished += 1
+            logger.info(f"[tickers] {finished}/{len(units)} batches done ({day})")
+
+    logger.info(f"[tickers] {len(tickers)} tickers x {len(days)} days, {len(units)} batches to run")
+    await asyncio.gather(*(_run(day, batch) for day, batch in units))
+    return totals
+
+
+async def _backfill_users(
+    days: List[date],
+    user_ids: List[str],
+    checkpoint: Checkpoint,
+    concurrency: int,
+    regenerate: bool,
+    send_email: bool,
+) -> Dict[str, int]:
+    """用户阶段：ticker 已在上一阶段缓存，这里基本只是组装和写库；缓存未命中的 ticker 现场生成。"""
+    from sqlalchemy import select
+
+    from database import AsyncSessionLocal
+    from models import DailyDigest, User
+    from config import settings
+    from routers.digests import generate_digest_for_user, save_daily_digest
+    from services.email_outbox import enqueue_email
+    from services.email_sender import email_sender
+
+    units = [(day, uid) for day in days for uid in user_ids if not checkpoint.is_done("users", day, uid)]
+    totals = {"generated": 0, "skipped": 0, "sent": 0, "queued": 0, "failed": 0}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _run(day: date, user_id: str) -> None:
+        async with sem:
+            digest_day = day + timedelta(days=1)
+            db = AsyncSessionLocal()
+            try:
+                user = await db.get(User, user_id)
+                if user is None:
+                    totals["skipped"] += 1
+                    return
+                existing = await db.scalar(select(DailyDigest).where(
+                    DailyDigest.user_id == user_id,
+                    DailyDigest.date == digest_day,
+                ))
+                if existing is not None and existing.content and not regenerate:
+                    content = existing.content
+                    totals["skipped"] += 1
+                else:
+                    unavailable: Set[str] = set()
+                    content = await generate_digest_for_user(user, db, target_date=day.isoformat(), uncacheable=unavailable)
+                    if unavailable:
+                        # 含占位提示的日报不保存：保存后不加 --regenerate 的重跑会当作已生成而跳过
+                        raise RuntimeError(f"摘要未生成: {', '.join(sorted(unavailable))}")
+                    await save_daily_digest(db, user_id, digest_day, content=content)
+                    totals["generated"] += 1
+
+                if send_email and (existing is None or existing.sent_at is None):
+                    date_str = digest_day.strftime("%Y/%m/%d")
+                    if settings.EMAIL_OUTBOX_ENABLED:
+                        # 与定时任务同一个去重键：重跑或定时任务已入队的日报不会再发一次；由投递器限速、重试并回写 sent_at
+                        queued = await enqueue_email(
+                            db,
+                            to_email=user.email,
+                            message=await email_sender.render_digest_message(user.email, content, date_str),
+                            user_id=user_id,
+                            digest_date=digest_day,
+                            dedupe_key=f"digest:{user_id}:{digest_day.isoformat()}",
+                        )
+                        await db.commit()
+                        if queued:
+                            totals["queued"] += 1
+                    else:
+                        sent = await email_sender.send_digest_email(
+                            to_email=user.email,
+                            digest_content=content,
+                            date_str=date_str,
+                        )
+                        if not sent:
+                            raise RuntimeError("邮件发送失败")
+                        await save_daily_digest(db, user_id, digest_day, sent_at=datetime.utcnow())
+                        totals["sent"] += 1
+            except Exception as e:
+                logger.error(f"[users] {day} user={user_id} failed: {e}")
+                totals["failed"] += 1
+                return
+            finally:
+                await db.close()
+            checkpoint.mark("users", day, [user_id])
+
+    logger.info(f"[users] {len(user_ids)} users x {len(days)} days, {len(units)} digests to run")
+    await asyncio.gather(*(_run(day, uid) for day, uid in units))
+    return totals
+
+
+async def _main(args) -> int:
+    from services.ai_usage import attribute, flush_ai_usage
+    from services.email_sender import email_sender
+
+    days = _date_range(args.start, args.end)
+    user_ids, tickers = await _select(_split(args.users), [t.upper() for t in _split(args.tickers)])
+    checkpoint = Checkpoint(args.checkpoint)
+    concurrency = max(1, args.concurrency)
+    started = time.perf_counter()
+
+    # 回填的 AI 调用在台账里标记为 backfill，容量规划不计入
+    try:
+        with attribute(source="backfill"):
+            ticker_stats = await _backfill_tickers(days, tickers, checkpoint, concurrency, args.regenerate)
+            logger.info(f"[tickers] {ticker_stats}")
+            user_stats: Dict[str, int] = {}
+            if user_ids:
+                user_stats = await _backfill_users(days, user_ids, checkpoint, concurrency, args.regenerate, args.send_email)
+                logger.info(f"[users] {user_stats}")
+    finally:
+        await email_sender.close()
+        await flush_ai_usage()
+
+    failed = ticker_stats["failed"] + user_stats.get("failed", 0)
+    logger.info(f"backfill finished in {time.perf_counter() - started:.1f}s, failed={failed}")
+    if failed:
+        logger.info(f"checkpoint kept at {args.checkpoint}; rerun the same command to retry failed units")
+        return 1
+    checkpoint.remove()
+    return 0
+
+
+def main():
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="StockDaily digest backfill")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="起始目标日期（新闻日期，YYYY-MM-DD）")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="结束目标日期（含），默认等于 --start")
+    parser.add_argument("--users", default=None, help="用户邮箱，逗号分隔（默认所有有关注的用户）")
+    parser.add_argument("--tickers", default=None, help="ticker，逗号分隔；只指定 ticker 时只预热缓存，不生成用户日报")
+    parser.add_argument("--regenerate", action="store_true", help="忽略已有缓存和日报，重新检索和总结")
+    parser.add_argument("--send-email", action="store_true", help="生成后发送邮件（已发送过的日报不重复发送；启用发件箱时写入发件箱）")
+    parser.add_argument("--concurrency", type=int, default=settings.DIGEST_USER_CONCURRENCY, help="同时处理的单元数")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json", help="检查点文件路径")
+    parser.add_argument("--reset", action="store_true", help="删除已有检查点，从头开始")
+    args = parser.parse_args()
+    args.end = args.end or args.start
+    if args.end < args.start:
+        parser.error("--end 不能早于 --start")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    from database import Base, add_missing_columns, engine
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    raise SystemExit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
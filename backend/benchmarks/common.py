@@ -0,0 +1,96 @@
+"""
+benchmarks 公共工具：隔离环境变量、统计分位数、峰值内存、JSON 结果输出。
+
+注意：config.settings 在 import 时读取环境变量，因此 prepare_env() 必须在
+import config / database / services 之前调用。
+"""
+
+import json
+import math
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+BACKEND_DIR = Path(__file__).parent.parent.resolve()
+
+
+def prepare_env(*, db_path: Optional[str] = None, extra: Optional[Dict[str, str]] = None) -> str:
+    """
+    为基准测试设置一个独立的 SQLite 库和“假”凭据，避免误用 .env 中的线上配置。
+    返回 SQLite 文件路径。
+    """
+    if BACKEND_DIR.as_posix() not in sys.path:
+        sys.path.insert(0, BACKEND_DIR.as_posix())
+
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="stockdaily-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(db_path).resolve().as_posix()}"
+    os.environ.setdefault("AI_BUILDER_TOKEN", "bench-token")
+    os.environ.setdefault("SMTP_USER", "bench")
+    os.environ.setdefault("SMTP_PASSWORD", "bench")
+    for k, v in (extra or {}).items():
+        os.environ[k] = str(v)
+    return db_path
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, Optional[float]]:
+    """返回 count/mean/p50/p95/p99/max（单位与输入一致）。"""
+    data: List[float] = sorted(samples)
+    if not data:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+
+    def pick(q: float) -> float:
+        # nearest-rank
+        idx = max(0, min(len(data) - 1, math.ceil(q * len(data)) - 1))
+        return round(data[idx], 4)
+
+    return {
+        "count": len(data),
+        "mean": round(sum(data) / len(data), 4),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(data[-1], 4),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值 RSS（MB）。Windows 下没有 resource 模块，返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是 bytes
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
+
+
+def write_result(path: Optional[str], name: str, result: dict) -> dict:
+    """附加运行环境信息后写入 JSON（path 为空时只打印）。"""
+    payload = {
+        "benchmark": name,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **result,
+    }
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    if path:
+        Path(path).write_text(text, encoding="utf-8")
+        print(f"结果已写入 {path}")
+    else:
+        print(text)
+    return payload
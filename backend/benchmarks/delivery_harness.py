@@ -0,0 +1,235 @@
+"""
+投递链路测试台：在进程内启动 aiosmtpd 收件桩（benchmarks/smtp_sink.py），注入接收延迟和故障，
+驱动真实的发送代码（SMTP 连接池、发件箱重试），不需要外部邮件服务。
+
+两种模式（--modes）：
+- sender：EmailSender.send_digest_email 并发直发，每封只发一次，失败计入 failures（连接池断线重连一次除外）
+- send_phase：调度器发送阶段，summarized 任务 → run_digest_workers 渲染入队 → 发件箱投递；
+  临时失败按 EMAIL_OUTBOX_RETRY_BASE_SECONDS 退避重试，反复 drain 直到发件箱没有 pending 邮件
+
+故障注入：--temp-fail-rate（DATA 返回 451）、--reject-rate（RCPT 返回 550，不应重试）、
+--disconnect-rate（DATA 时直接断开连接）。输出每秒邮件数、服务器端 / 客户端连接数、
+重试与重复投递情况（send_phase 另含发件箱各状态和每封邮件的尝试次数分布）。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.delivery_harness
+  python -m benchmarks.delivery_harness --users 500 --pool-sizes 1,4,8 --temp-fail-rate 0.05 --disconnect-rate 0.01
+  python -m benchmarks.delivery_harness --modes send_phase --reject-rate 0.02 --out bench_delivery.json
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict
+
+from benchmarks.common import free_port, percentiles, prepare_env, write_result
+from benchmarks.hot_paths import gen_digest
+from benchmarks.send_phase import RUN_DATE, reset_jobs, seed_jobs
+from benchmarks.smtp_sink import SMTPSink
+
+_CONNECTION_EVENTS = ("opened", "recycled", "idle", "error", "closed", "connect_failed")
+
+
+def client_counters() -> Dict[str, float]:
+    """客户端 Prometheus 计数器的当前值（连接池连接事件、发件箱投递结果），场景前后相减得到本场景的增量"""
+    from prometheus_client import REGISTRY
+
+    values = {}
+    for event in _CONNECTION_EVENTS:
+        values[f"smtp_{event}"] = REGISTRY.get_sample_value("stockdaily_smtp_connections_total", {"event": event}) or 0
+    for outcome in ("sent", "retry", "dead", "lost", "error"):
+        values[f"outbox_{outcome}"] = (
+            REGISTRY.get_sample_value("stockdaily_email_outbox_deliveries_total", {"outcome": outcome}) or 0
+        )
+    return values
+
+
+def _delta(before: Dict[str, float], after: Dict[str, float], prefix: str) -> Dict[str, int]:
+    return {k[len(prefix):]: int(after[k] - before[k]) for k in after if k.startswith(prefix)}
+
+
+async def run_sender(pool_size: int, args) -> Dict:
+    """EmailSender 直发 --users 封邮件（并发 --concurrency）"""
+    from services.email_sender import EmailSender
+
+    sender = EmailSender()
+    sender.pool_size = pool_size
+    sender.pool_max_messages = args.max_messages
+    digest = gen_digest(args.tickers, random.Random(args.seed))
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def _one(i: int) -> None:
+        nonlocal failures
+        async with sem:
+            t0 = time.perf_counter()
+            ok = await sender.send_digest_email(f"bench{i:06d}@example.com", digest, "2026/01/02")
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                failures += 1
+
+    try:
+        await asyncio.gather(*(_one(i) for i in range(args.users)))
+    finally:
+        await sender.close()
+    return {"failures": failures, "send_latency_s": percentiles(latencies)}
+
+
+async def run_send_phase(pool_size: int, args) -> Dict:
+    """调度器发送阶段：渲染入队后反复 drain 发件箱，直到没有待重试的邮件"""
+    from sqlalchemy import select
+
+    from database import AsyncSessionLocal
+    from models import EmailOutbox
+    from services.digest_jobs import run_digest_workers
+    from services.email_outbox import PENDING, drain_outbox
+    from services.email_sender import email_sender
+
+    email_sender.pool_size = pool_size
+    email_sender.pool_max_messages = args.max_messages
+    drains = 0
+    t0 = time.perf_counter()
+    try:
+        jobs = await run_digest_workers(RUN_DATE, concurrency=args.concurrency)
+        enqueue_s = time.perf_counter() - t0
+        while True:
+            await drain_outbox()
+            drains += 1
+            async with AsyncSessionLocal() as db:
+                next_at = await db.scalar(
+                    select(EmailOutbox.next_attempt_at)
+                    .where(EmailOutbox.state == PENDING)
+                    .order_by(EmailOutbox.next_attempt_at)
+                    .limit(1)
+                )
+            if next_at is None:
+                break
+            # 还有等待退避的邮件（退避时间由 --retry-base 控制）：稍后再 drain
+            await asyncio.sleep(args.retry_base / 2)
+    finally:
+        await email_sender.close()
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(EmailOutbox.state, EmailOutbox.attempts))).all()
+    return {
+        "jobs": dict(jobs),
+        "enqueue_s": round(enqueue_s, 3),
+        "drains": drains,
+        "outbox_states": dict(Counter(state for state, _ in rows)),
+        "attempts_per_message": {str(k): v for k, v in sorted(Counter(a or 0 for _, a in rows).items())},
+    }
+
+
+def run_scenario(sink: SMTPSink, mode: str, pool_size: int, args) -> Dict:
+    if mode == "send_phase":
+        reset_jobs()
+    sink.reset()
+    before = client_counters()
+    t0 = time.perf_counter()
+    out = asyncio.run(run_sender(pool_size, args) if mode == "sender" else run_send_phase(pool_size, args))
+    wall = time.perf_counter() - t0
+    after = client_counters()
+    server = sink.stats()
+    result = {
+        "mode": mode,
+        "pool_size": pool_size,
+        "wall_time_s": round(wall, 3),
+        "messages_per_s": round(server["messages"] / wall, 2) if wall > 0 else None,
+        "server": server,
+        "client_connections": _delta(before, after, "smtp_"),
+        **out,
+    }
+    if mode == "send_phase":
+        result["outbox_deliveries"] = _delta(before, after, "outbox_")
+    print(
+        f"[{mode} pool_size={pool_size}] wall={result['wall_time_s']}s msgs/s={result['messages_per_s']} "
+        f"accepted={server['messages']}/{args.users} connections={server['connections']} "
+        f"temp_fail={server['temp_failures']} rejected={server['rejected']} disconnects={server['disconnects']} "
+        f"retried={server['retried_recipients']} duplicates={server['duplicate_deliveries']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink harness for delivery throughput and retry behavior")
+    parser.add_argument("--modes", default="sender,send_phase", help="sender / send_phase，逗号分隔")
+    parser.add_argument("--users", type=int, default=200, help="收件人数（每种模式每个场景发送的邮件数）")
+    parser.add_argument("--pool-sizes", default="1,4", help="要对比的 SMTP_POOL_SIZE，逗号分隔（0 为每封单独建连）")
+    parser.add_argument("--max-messages", type=int, default=100, help="SMTP_POOL_MAX_MESSAGES（每个连接发送多少封后重建）")
+    parser.add_argument("--concurrency", type=int, default=8, help="sender 模式的并发协程数 / send_phase 的 worker 数")
+    parser.add_argument("--tickers", type=int, default=5, help="每封日报的公司数")
+    parser.add_argument("--watchlists", type=int, default=20, help="send_phase 中不同关注列表（不同正文）的份数")
+    parser.add_argument("--handshake-latency", type=float, default=0.02, help="收件桩每个连接的握手延迟（秒）")
+    parser.add_argument("--data-latency", type=float, default=0.005, help="收件桩每封邮件的接收延迟（秒）")
+    parser.add_argument("--temp-fail-rate", type=float, default=0.05, help="DATA 返回 451 的比例")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="RCPT 返回 550 的比例")
+    parser.add_argument("--disconnect-rate", type=float, default=0.01, help="DATA 时断开连接的比例")
+    parser.add_argument("--max-attempts", type=int, default=5, help="EMAIL_OUTBOX_MAX_ATTEMPTS")
+    parser.add_argument("--retry-base", type=float, default=0.2, help="EMAIL_OUTBOX_RETRY_BASE_SECONDS（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="SQLite 文件路径（默认临时目录）")
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    # 注入的故障会让发送代码每封都打错误日志，结果里已有计数，这里不再输出
+    logging.getLogger("services").setLevel(logging.CRITICAL)
+
+    port = free_port()
+    prepare_env(
+        db_path=args.db,
+        extra={
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(port),
+            "SMTP_START_TLS": "false",
+            "EMAIL_OUTBOX_ENABLED": "true",
+            "EMAIL_RATE_PER_SECOND": "100000",
+            "EMAIL_OUTBOX_MAX_ATTEMPTS": str(args.max_attempts),
+            "EMAIL_OUTBOX_RETRY_BASE_SECONDS": str(args.retry_base),
+        },
+    )
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    pool_sizes = [int(p) for p in args.pool_sizes.split(",") if p.strip()]
+    if "send_phase" in modes:
+        seed_jobs(args.users, args.tickers, args.watchlists, args.seed)
+
+    sink = SMTPSink(
+        port,
+        handshake_latency=args.handshake_latency,
+        data_latency=args.data_latency,
+        temp_fail_rate=args.temp_fail_rate,
+        reject_rate=args.reject_rate,
+        disconnect_rate=args.disconnect_rate,
+        seed=args.seed,
+    )
+    with sink:
+        scenarios = [run_scenario(sink, mode, size, args) for mode in modes for size in pool_sizes]
+
+    write_result(
+        args.out,
+        "delivery_harness",
+        {
+            "config": {
+                "users": args.users,
+                "max_messages_per_connection": args.max_messages,
+                "concurrency": args.concurrency,
+                "tickers_per_digest": args.tickers,
+                "handshake_latency_s": args.handshake_latency,
+                "data_latency_s": args.data_latency,
+                "temp_fail_rate": args.temp_fail_rate,
+                "reject_rate": args.reject_rate,
+                "disconnect_rate": args.disconnect_rate,
+                "max_attempts": args.max_attempts,
+                "retry_base_s": args.retry_base,
+            },
+            "scenarios": scenarios,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
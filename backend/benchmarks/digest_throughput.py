@@ -0,0 +1,278 @@
+"""
+端到端日报吞吐基准：N 个用户 × 每人 M 个关注公司，AI 接口指向本地桩服务，SMTP 发送替换为固定延迟。
+
+会分别跑以下场景（每个场景开始前清空 ticker 摘要缓存和任务表）：
+- single_user：对 1 个用户执行 generate_digest_for_user
+- job：完整执行一次 _send_daily_digests_job（与 08:00 定时任务相同的代码路径，无预取）
+- prefetch / send：先执行预取阶段，再执行发送阶段（发送阶段应几乎不产生 AI 调用）
+
+输出：墙钟时间、AI 调用次数（按阶段）、人均调用数、各阶段 p50/p95/p99 延迟、峰值 RSS。
+结果写成 JSON，便于不同版本之间对比。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.digest_throughput --users 50 --tickers 5 --out bench_digest.json
+  python -m benchmarks.digest_throughput --users 500 --tickers 8 --ticker-pool 50 --search-latency 2
+"""
+
+import argparse
+import asyncio
+import functools
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.common import free_port, peak_rss_mb, percentiles, prepare_env, write_result
+from benchmarks.stub_ai_api import DEFAULT_LATENCIES, StubAIServer
+
+
+class StageTimer:
+    """记录各阶段耗时（秒）与执行的 SQL 语句数。"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.db_queries = 0
+
+    def count_query(self, *args, **kwargs) -> None:
+        self.db_queries += 1
+
+    def wrap_async(self, stage: str, fn):
+        @functools.wraps(fn)
+        async def _wrapped(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - t0)
+
+        return _wrapped
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.db_queries = 0
+
+    def report(self) -> Dict[str, dict]:
+        return {stage: percentiles(vals) for stage, vals in sorted(self.samples.items())}
+
+
+def seed_database(n_users: int, n_tickers: int, pool_size: int, seed: int) -> List[str]:
+    """写入 N 个用户，每人随机关注 M 个公司；返回用户 id 列表。"""
+    from database import Base, SessionLocal, engine
+    from models import Company, User, UserCompany
+    from routers.companies import STOCK_DATA
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(seed)
+    known = list(STOCK_DATA.items())
+    pool = []
+    for i in range(max(pool_size, n_tickers)):
+        if i < len(known):
+            ticker, info = known[i]
+            pool.append((ticker, info["name"], info.get("industry")))
+        else:
+            pool.append((f"SYN{i:04d}", f"Synthetic Corp {i}", "Technology"))
+
+    db = SessionLocal()
+    try:
+        companies = [Company(ticker=t, name=n, industry=ind) for t, n, ind in pool]
+        db.add_all(companies)
+        db.flush()
+        user_ids = []
+        for u in range(n_users):
+            user = User(email=f"bench{u:06d}@example.com", password_hash="x", name=f"bench{u}")
+            db.add(user)
+            db.flush()
+            for c in rng.sample(companies, n_tickers):
+                db.add(UserCompany(user_id=user.id, company_id=c.id))
+            user_ids.append(user.id)
+        db.commit()
+        return user_ids
+    finally:
+        db.close()
+
+
+def instrument(timer: StageTimer, smtp_latency: float) -> None:
+    """给服务单例挂上计时包装；SMTP 发送替换为固定延迟（不连真实邮件服务）。"""
+    import routers.digests as digests_router
+    import services.digest_jobs as jobs_mod
+    from sqlalchemy import event
+
+    from database import async_engine
+    import services.email_sender as email_mod
+    from services.ai_summarizer import ai_summarizer
+    from services.news_collector import news_collector
+
+    async def _fake_deliver(message, to_email=None):
+        await asyncio.sleep(smtp_latency)
+
+    email_mod.email_sender._deliver = _fake_deliver  # noqa: SLF001
+    # 服务走 AsyncSession，事件挂在异步引擎底层的同步 Engine 上
+    event.listen(async_engine.sync_engine, "before_cursor_execute", timer.count_query)
+
+    news_collector.search_news_via_agent = timer.wrap_async("search", news_collector.search_news_via_agent)
+    news_collector.collect_company_news = timer.wrap_async("collect", news_collector.collect_company_news)
+    ai_summarizer.generate_company_news_summary_with_references = timer.wrap_async(
+        "summary", ai_summarizer.generate_company_news_summary_with_references
+    )
+    # 直接发送和发件箱投递最终都走 send_message
+    email_mod.email_sender.send_message = timer.wrap_async("email", email_mod.email_sender.send_message)
+
+    wrapped_digest = timer.wrap_async("digest", digests_router.generate_digest_for_user)
+    digests_router.generate_digest_for_user = wrapped_digest
+    jobs_mod.generate_digest_for_user = wrapped_digest
+
+
+async def run_single_user(user_id: str) -> None:
+    import services.digest_jobs as jobs_mod
+    from database import AsyncSessionLocal
+    from models import User
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        await jobs_mod.generate_digest_for_user(user, db)
+
+
+def reset_state() -> None:
+    """清空 ticker 摘要缓存、任务表、发件箱与已保存的日报，保证各场景互不影响（否则已发送的用户会被后续场景跳过）。"""
+    from database import SessionLocal
+    from models import DailyDigest, DigestJob, EmailOutbox, TickerDigest
+
+    db = SessionLocal()
+    try:
+        db.query(DailyDigest).delete()
+        db.query(TickerDigest).delete()
+        db.query(DigestJob).delete()
+        db.query(EmailOutbox).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_prefetch() -> None:
+    import services.digest_scheduler as scheduler_mod
+
+    await scheduler_mod._prefetch_job()  # noqa: SLF001
+
+
+async def run_job() -> None:
+    import services.digest_scheduler as scheduler_mod
+
+    from services.email_outbox import drain_outbox
+
+    await scheduler_mod._send_daily_digests_job()  # noqa: SLF001
+    # 启用发件箱时日报只写入 email_outbox，投递计入同一场景
+    await drain_outbox()
+
+
+def run_scenario(
+    name: str, coro_factory, stub: StubAIServer, timer: StageTimer, n_users: int, reset: bool = True
+) -> dict:
+    if reset:
+        reset_state()
+    stub.reset()
+    timer.reset()
+    t0 = time.perf_counter()
+    asyncio.run(coro_factory())
+    wall = time.perf_counter() - t0
+    stats = stub.stats()
+    total_calls = stats["total_calls"]
+    result = {
+        "wall_time_s": round(wall, 3),
+        "users": n_users,
+        "ai_calls": total_calls,
+        "ai_calls_by_stage": stats["calls"],
+        "ai_errors_by_stage": stats["errors"],
+        "ai_calls_per_user": round(total_calls / n_users, 3) if n_users else None,
+        "users_per_minute": round(n_users / wall * 60, 2) if wall > 0 else None,
+        "db_queries": timer.db_queries,
+        "db_queries_per_user": round(timer.db_queries / n_users, 2) if n_users else None,
+        "stage_latency_s": timer.report(),
+    }
+    print(
+        f"[{name}] wall={result['wall_time_s']}s ai_calls={total_calls} "
+        f"calls/user={result['ai_calls_per_user']} users/min={result['users_per_minute']} "
+        f"db_queries/user={result['db_queries_per_user']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end digest throughput benchmark")
+    parser.add_argument("--users", type=int, default=20, help="用户数 N")
+    parser.add_argument("--tickers", type=int, default=5, help="每个用户关注的公司数 M")
+    parser.add_argument("--ticker-pool", type=int, default=50, help="公司池大小（用户从池中随机选 M 个）")
+    parser.add_argument("--search-latency", type=float, default=DEFAULT_LATENCIES["search"], help="桩服务 search 延迟（秒）")
+    parser.add_argument("--summary-latency", type=float, default=DEFAULT_LATENCIES["summary"], help="桩服务 summary 延迟（秒）")
+    parser.add_argument("--smtp-latency", type=float, default=0.05, help="模拟 SMTP 发送耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="桩服务注入 503 的概率")
+    parser.add_argument("--user-concurrency", type=int, default=None, help="覆盖 DIGEST_USER_CONCURRENCY")
+    parser.add_argument("--scenario", choices=["all", "single_user", "job", "two_phase"], default="all")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="SQLite 文件路径（默认临时目录）")
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    port = free_port()
+    extra = {
+        "AI_BUILDER_API_URL": f"http://127.0.0.1:{port}",
+        "ENABLE_DAILY_EMAIL_SCHEDULER": "true",
+        # 压测用户都在 example.com，不让按域名限速掩盖生成/发送本身的耗时
+        "EMAIL_RATE_PER_SECOND": "10000",
+    }
+    if args.user_concurrency is not None:
+        extra["DIGEST_USER_CONCURRENCY"] = str(args.user_concurrency)
+    db_path = prepare_env(db_path=args.db, extra=extra)
+
+    latencies = {"search": args.search_latency, "summary": args.summary_latency}
+    with StubAIServer(port, latencies=latencies, error_rate=args.error_rate) as stub:
+        t0 = time.perf_counter()
+        user_ids = seed_database(args.users, args.tickers, args.ticker_pool, args.seed)
+        seed_s = time.perf_counter() - t0
+
+        timer = StageTimer()
+        instrument(timer, args.smtp_latency)
+
+        scenarios = {}
+        if args.scenario in ("all", "single_user"):
+            scenarios["single_user"] = run_scenario(
+                "single_user", functools.partial(run_single_user, user_ids[0]), stub, timer, 1
+            )
+        if args.scenario in ("all", "job"):
+            scenarios["job"] = run_scenario("job", run_job, stub, timer, args.users)
+        if args.scenario in ("all", "two_phase"):
+            scenarios["prefetch"] = run_scenario("prefetch", run_prefetch, stub, timer, args.users)
+            scenarios["send"] = run_scenario("send", run_job, stub, timer, args.users, reset=False)
+
+    write_result(
+        args.out,
+        "digest_throughput",
+        {
+            "config": {
+                "users": args.users,
+                "tickers_per_user": args.tickers,
+                "ticker_pool": args.ticker_pool,
+                "stub_latency_s": {**DEFAULT_LATENCIES, **latencies},
+                "smtp_latency_s": args.smtp_latency,
+                "error_rate": args.error_rate,
+                "user_concurrency": args.user_concurrency,
+                "seed": args.seed,
+                "db_path": db_path,
+            },
+            "seed_time_s": round(seed_s, 3),
+            "scenarios": scenarios,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
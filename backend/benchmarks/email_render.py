@@ -0,0 +1,145 @@
+"""
+邮件渲染基准：EmailSender 渲染一封日报 HTML 的耗时，分别在每封 10 / 100 个公司时测量。
+
+每个规模先生成若干份日报语料（每个公司一段带引用的摘要 + 30 条新闻），循环渲染 --digests 次，
+取 --repeat 轮中最快的一轮，输出每封邮件耗时、每个公司耗时和体积（HTML / 纯文本 / 序列化后的整封 MIME 邮件字节数）。
+--styles 对比 EMAIL_HTML_STYLE 的两种样式（inline 逐元素内联样式，compact 样式合并为 class）。
+分别测量公司区块缓存未命中（cold，每封都清空缓存）和命中（warm）两种情况；
+mime 为构建完整 MIME 邮件（渲染 + base64 编码，build_digest_message）的耗时，grouped 表示关注列表相同、共用已编码正文。
+计时前先做往返校验：构建的邮件用 email.message_from_bytes 解析，解码纯文本 / HTML 两部分，
+必须与直接渲染的结果逐字相同（不同长度、含需转义字符和非 ASCII 的收件人地址）；不一致时退出码为 1。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.email_render
+  python -m benchmarks.email_render --tickers 10,100,300 --digests 200 --out bench_render.json
+  python -m benchmarks.email_render --styles inline,compact
+"""
+
+import argparse
+import email
+import random
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.common import prepare_env, write_result
+from benchmarks.hot_paths import gen_digest
+
+
+# 长度覆盖共享正文拼接的各种对齐情况；含 HTML 需转义的字符和多字节 UTF-8
+ROUNDTRIP_RECIPIENTS = ["a@b.co", "user@example.com", "first.last+tag@example.org", "x<y>&z@example.com", "用户@例子.公司"]
+
+
+def check_roundtrip(n_tickers: int, style: str, args) -> List[str]:
+    """构建的 MIME 邮件解析、解码后与 _generate_text_content / _generate_html_content 比较，返回不一致的说明"""
+    from services.email_sender import email_sender
+
+    email_sender.load_templates(style)
+    rng = random.Random(args.seed)
+    digest = gen_digest(n_tickers, rng)
+    mismatches = []
+    for to_email in ROUNDTRIP_RECIPIENTS:
+        raw = email_sender.build_digest_message(to_email, digest, "2026/01/02").as_bytes()
+        parsed = email.message_from_bytes(raw)
+        parts = {part.get_content_subtype(): part for part in parsed.get_payload()}
+        expected = {
+            "plain": email_sender._generate_text_content(digest, to_email),  # noqa: SLF001
+            "html": email_sender._generate_html_content(digest, to_email),  # noqa: SLF001
+        }
+        for subtype, body in expected.items():
+            part = parts.get(subtype)
+            if part is None or part.get_payload(decode=True).decode("utf-8") != body:
+                mismatches.append(f"{style} tickers={n_tickers} to={to_email} text/{subtype}")
+            elif any(len(line) > 76 for line in part.get_payload().splitlines()):
+                mismatches.append(f"{style} tickers={n_tickers} to={to_email} text/{subtype} 行长超过 76")
+    return mismatches
+
+
+def run_size(n_tickers: int, style: str, args) -> Dict:
+    from services.email_sender import email_sender
+
+    email_sender.load_templates(style)
+    rng = random.Random(args.seed)
+    digests = [gen_digest(n_tickers, rng) for _ in range(args.corpus)]
+    html_bytes = len(email_sender._generate_html_content(digests[0], "user@example.com").encode("utf-8"))  # noqa: SLF001
+    text_bytes = len(email_sender._generate_text_content(digests[0], "user@example.com").encode("utf-8"))  # noqa: SLF001
+    mime_bytes = len(email_sender.build_digest_message("user@example.com", digests[0], "2026/01/02").as_bytes())
+
+    def _render(i: int) -> None:
+        email_sender._generate_html_content(digests[i % len(digests)], f"user{i}@example.com")  # noqa: SLF001
+
+    def _mime(i: int) -> None:
+        email_sender.build_digest_message(f"user{i}@example.com", digests[i % len(digests)], "2026/01/02")
+
+    def _best(fn, cold: bool) -> float:
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for i in range(args.digests):
+                if cold:
+                    email_sender._fragments.clear()  # noqa: SLF001
+                    email_sender._bodies.clear()  # noqa: SLF001
+                fn(i)
+            best = min(best, time.perf_counter() - t0)
+        return best / args.digests
+
+    # cold：每封都重新渲染（第一个收件人）；warm：区块 / 共享正文命中缓存（其余关注相同公司的收件人）
+    cold, warm = _best(_render, cold=True), _best(_render, cold=False)
+    mime_cold, mime_warm = _best(_mime, cold=True), _best(_mime, cold=False)
+    result = {
+        "style": style,
+        "tickers": n_tickers,
+        "digests": args.digests,
+        "ms_per_digest_cold": round(cold * 1e3, 3),
+        "ms_per_digest_warm": round(warm * 1e3, 3),
+        "us_per_ticker_cold": round(cold / n_tickers * 1e6, 2),
+        "us_per_ticker_warm": round(warm / n_tickers * 1e6, 2),
+        "mime_ms_per_message_cold": round(mime_cold * 1e3, 3),
+        "mime_ms_per_message_grouped": round(mime_warm * 1e3, 3),
+        "html_bytes": html_bytes,
+        "text_bytes": text_bytes,
+        "mime_bytes": mime_bytes,
+    }
+    print(
+        f"[{style} tickers={n_tickers}] render cold {result['ms_per_digest_cold']} / warm {result['ms_per_digest_warm']} ms  "
+        f"mime cold {result['mime_ms_per_message_cold']} / grouped {result['mime_ms_per_message_grouped']} ms  "
+        f"html={html_bytes} text={text_bytes} mime={mime_bytes} bytes"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digest email render benchmark")
+    parser.add_argument("--tickers", default="10,100", help="每封日报的公司数，逗号分隔")
+    parser.add_argument("--styles", default="compact", help="HTML 样式（inline / compact），逗号分隔")
+    parser.add_argument("--digests", type=int, default=100, help="每轮渲染的邮件数")
+    parser.add_argument("--corpus", type=int, default=5, help="每个规模生成几份不同的日报轮流渲染")
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数（取最快）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    args = parser.parse_args()
+
+    prepare_env()
+    sizes = [int(t) for t in args.tickers.split(",") if t.strip()]
+    styles = [s.strip() for s in args.styles.split(",") if s.strip()]
+
+    mismatches = [m for style in styles for n in [0, 3] + sizes for m in check_roundtrip(n, style, args)]
+    for m in mismatches:
+        print(f"往返校验不一致: {m}")
+    results = [run_size(n, style, args) for style in styles for n in sizes]
+
+    write_result(
+        args.out,
+        "email_render",
+        {
+            "config": {"digests": args.digests, "corpus": args.corpus, "repeat": args.repeat, "seed": args.seed},
+            "results": results,
+            "roundtrip_mismatches": mismatches,
+        },
+    )
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+CPU 热点微基准：这些函数按“用户 × 公司”执行，用户量增长时 CPU 成本线性放大。
+
+覆盖：
+- NewsCollector._parse_agent_response / _dedupe_news_items / _filter_by_target_date
+- EmailSender 引用解析（_extract_cited_numbers）+ References 构建（_reference_items）
+- EmailSender._generate_html_content（整封邮件；cold 为每封清空公司区块缓存的完整渲染，warm 为区块缓存命中）
+- AISummarizer._clean_response（模型输出清理）
+
+每个用例用生成的语料在多个规模下运行（最多数万条新闻、数千个用户），取多次运行的最快值，
+换算成“每单位耗时（微秒）”，并与 hot_paths_thresholds.json 中的阈值比较；超出阈值时退出码为 1。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.hot_paths
+  python -m benchmarks.hot_paths --quick --out bench_hot_paths.json
+  python -m benchmarks.hot_paths --update-thresholds   # 以当前机器结果 × headroom 重写阈值
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.common import prepare_env, write_result
+
+THRESHOLDS_FILE = Path(__file__).parent / "hot_paths_thresholds.json"
+
+TARGET_DATE = "2026-01-02"
+SOURCES = ["Reuters", "Bloomberg", "WSJ", "CNBC", "FT", "MarketWatch"]
+
+
+# ============ 语料生成 ============
+
+def gen_news_items(n: int, rng: random.Random, dup_ratio: float = 0.0, on_date_ratio: float = 1.0) -> List[Dict[str, Any]]:
+    unique = max(1, int(n * (1 - dup_ratio)))
+    items = []
+    for i in range(n):
+        k = i if i < unique else rng.randrange(unique)
+        items.append({
+            "title": f"Company announces development #{k} in supply chain and regulatory matters",
+            "content": "Something concrete happened and it may affect margins and demand. " * 3,
+            "url": f"https://news.example.com/articles/{k}",
+            "source": rng.choice(SOURCES),
+            "published_date": TARGET_DATE if rng.random() < on_date_ratio else "2026-01-01",
+        })
+    return items
+
+
+def gen_agent_response(n: int, rng: random.Random) -> str:
+    payload = json.dumps(gen_news_items(n, rng), ensure_ascii=False, indent=2)
+    return f"以下是检索结果：\n```json\n{payload}\n```\n"
+
+
+def gen_summary(n_items: int, rng: random.Random) -> str:
+    sentences = []
+    for _ in range(4):
+        refs = "".join(f"[{rng.randint(1, max(1, n_items))}]" for _ in range(rng.randint(1, 3)))
+        sentences.append(f"公司披露了新的供应链安排，可能影响下季度毛利率{refs}。")
+    return "".join(sentences)
+
+
+def gen_digest(n_tickers: int, rng: random.Random, items_per_ticker: int = 30) -> Dict[str, Any]:
+    company_news = {}
+    for t in range(n_tickers):
+        ticker = f"T{t:03d}"
+        company_news[ticker] = [{
+            "title": f"Company {ticker} 新闻摘要",
+            "summary": gen_summary(items_per_ticker, rng) + "\n第二段补充说明[1]。",
+            "source": "AI 摘要",
+            "items": gen_news_items(items_per_ticker, rng),
+        }]
+    return {"company_news": company_news, "industry_news": [], "generated_at": f"{TARGET_DATE}T12:00:00"}
+
+
+def gen_model_output(rng: random.Random) -> str:
+    body = "公司宣布回购计划[1]，同时监管机构启动调查[2]。"
+    variants = [
+        body,
+        "好的，这是为您生成的摘要：" + body,
+        "Here's my thinking process: ... lots of reasoning ...\n\nFinal answer: " + body,
+        "摘要：" + body,
+    ]
+    return rng.choice(variants)
+
+
+# ============ 计时 ============
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def build_cases(quick: bool) -> List[Tuple[str, int, str, Callable[[], Callable[[], Any]]]]:
+    """返回 (case, size, unit, setup)；setup() 生成语料并返回待计时的无参函数。"""
+    from services.ai_summarizer import ai_summarizer
+    from services.email_sender import email_sender
+    from services.news_collector import news_collector
+
+    rng = random.Random(7)
+    item_sizes = [100, 1_000, 10_000] if quick else [100, 1_000, 10_000, 50_000]
+    user_sizes = [10, 100] if quick else [10, 100, 1_000, 3_000]
+
+    cases = []
+
+    for n in item_sizes:
+        def setup_parse(n=n):
+            text = gen_agent_response(n, rng)
+            return lambda: news_collector._parse_agent_response(text)  # noqa: SLF001
+        cases.append(("parse_agent_response", n, "item", setup_parse))
+
+        def setup_dedupe(n=n):
+            items = gen_news_items(n, rng, dup_ratio=0.3)
+            return lambda: news_collector._dedupe_news_items(items)  # noqa: SLF001
+        cases.append(("dedupe_news_items", n, "item", setup_dedupe))
+
+        def setup_filter(n=n):
+            items = gen_news_items(n, rng, on_date_ratio=0.5)
+            return lambda: news_collector._filter_by_target_date(items, TARGET_DATE)  # noqa: SLF001
+        cases.append(("filter_by_target_date", n, "item", setup_filter))
+
+    for users in user_sizes:
+        # 每个用户 5 个公司，每个公司 30 条新闻
+        sections = users * 5
+
+        def setup_refs(sections=sections):
+            corpus = [(gen_summary(30, rng), gen_news_items(30, rng)) for _ in range(min(sections, 500))]
+
+            def run():
+                for i in range(sections):
+                    summary, items = corpus[i % len(corpus)]
+                    cited = email_sender._extract_cited_numbers(summary, len(items))  # noqa: SLF001
+                    email_sender._reference_items(cited, items)  # noqa: SLF001
+            return run
+        cases.append(("citations_and_references", sections, "section", setup_refs))
+
+        def setup_html(users=users, cold=False):
+            digests = [gen_digest(5, rng) for _ in range(min(users, 50))]
+
+            def run():
+                for i in range(users):
+                    if cold:
+                        # 每封都清空公司区块缓存：测的是完整渲染，而不是缓存命中
+                        email_sender._fragments.clear()  # noqa: SLF001
+                    email_sender._generate_html_content(digests[i % len(digests)], f"user{i}@example.com")  # noqa: SLF001
+            return run
+        cases.append(("generate_html_content_cold", users, "digest", lambda users=users: setup_html(users, cold=True)))
+        cases.append(("generate_html_content_warm", users, "digest", setup_html))
+
+        def setup_clean(sections=sections):
+            outputs = [gen_model_output(rng) for _ in range(sections)]
+
+            def run():
+                for o in outputs:
+                    ai_summarizer._clean_response(o)  # noqa: SLF001
+            return run
+        cases.append(("clean_response", sections, "response", setup_clean))
+
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU hot path microbenchmarks")
+    parser.add_argument("--quick", action="store_true", help="只跑较小规模（CI 用）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数（取最快）")
+    parser.add_argument("--only", default=None, help="只跑名称包含该子串的用例")
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    parser.add_argument("--update-thresholds", action="store_true", help="用本次结果重写阈值文件")
+    parser.add_argument("--headroom", type=float, default=3.0, help="重写阈值时的放宽倍数")
+    args = parser.parse_args()
+
+    prepare_env()
+
+    thresholds: Dict[str, float] = {}
+    if THRESHOLDS_FILE.exists():
+        thresholds = json.loads(THRESHOLDS_FILE.read_text(encoding="utf-8"))
+
+    results = []
+    per_unit_worst: Dict[str, float] = {}
+    failures = []
+    for case, size, unit, setup in build_cases(args.quick):
+        if args.only and args.only not in case:
+            continue
+        fn = setup()
+        seconds = best_of(fn, args.repeat)
+        us_per_unit = seconds / size * 1e6
+        per_unit_worst[case] = max(per_unit_worst.get(case, 0.0), us_per_unit)
+        limit = thresholds.get(case)
+        ok = limit is None or us_per_unit <= limit
+        if not ok:
+            failures.append(case)
+        results.append({
+            "case": case,
+            "size": size,
+            "unit": unit,
+            "total_ms": round(seconds * 1e3, 3),
+            "us_per_unit": round(us_per_unit, 3),
+            "threshold_us_per_unit": limit,
+            "ok": ok,
+        })
+        flag = "OK " if ok else "REGRESSION"
+        print(f"{flag:10s} {case:28s} size={size:<7d} {seconds * 1e3:10.2f} ms  {us_per_unit:9.3f} us/{unit}"
+              + (f"  (limit {limit})" if limit is not None else ""))
+
+    if args.update_thresholds:
+        new = {**thresholds, **{k: round(v * args.headroom, 2) for k, v in per_unit_worst.items()}}
+        THRESHOLDS_FILE.write_text(json.dumps(new, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"阈值已写入 {THRESHOLDS_FILE}")
+
+    if args.out:
+        write_result(args.out, "hot_paths", {"quick": args.quick, "repeat": args.repeat, "results": results, "failures": failures})
+
+    if failures and not args.update_thresholds:
+        print(f"\n超出阈值: {', '.join(sorted(set(failures)))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+发送阶段基准：只测“日报已生成（summarized）→ 渲染邮件 → 写入发件箱 → 投递”这一段，以及它对事件循环的影响。
+
+预先写入 N 个用户和状态为 summarized 的 digest_jobs（日报内容从 --watchlists 份不同的关注列表中轮流分配），
+然后在同一个事件循环里运行 run_digest_workers 和 drain_outbox，SMTP 发送替换为固定延迟。
+运行期间用 LoopLagMonitor 每 --lag-interval 秒采样一次事件循环延迟（与 API 共用循环时请求会被同样拖慢）。
+
+对比 EMAIL_RENDER_PROCESSES（--render-processes）：0 为渲染 / MIME 编码在事件循环上执行，
+大于 0 时放到进程池，循环只处理数据库和 SMTP I/O。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.send_phase --users 500 --tickers 30
+  python -m benchmarks.send_phase --users 2000 --tickers 50 --render-processes 0,2,4 --out bench_send.json
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import date
+
+from benchmarks.common import percentiles, prepare_env, write_result
+from benchmarks.hot_paths import gen_digest
+
+RUN_DATE = date(2026, 1, 2)
+
+
+def seed_jobs(n_users: int, n_tickers: int, n_watchlists: int, seed: int) -> None:
+    """写入 N 个用户及其 summarized 状态的任务（不需要 AI 调用）。"""
+    from database import Base, SessionLocal, engine
+    from models import DigestJob, User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    contents = [gen_digest(n_tickers, rng) for _ in range(max(1, n_watchlists))]
+
+    db = SessionLocal()
+    try:
+        for u in range(n_users):
+            user = User(email=f"bench{u:06d}@example.com", password_hash="x", name=f"bench{u}")
+            db.add(user)
+            db.flush()
+            db.add(DigestJob(user_id=user.id, date=RUN_DATE, state="summarized", attempts=0, content=contents[u % len(contents)]))
+        db.commit()
+    finally:
+        db.close()
+
+
+def reset_jobs() -> None:
+    """把任务恢复为 summarized、清空发件箱，让各场景处理同样的工作量。"""
+    from database import SessionLocal
+    from models import DailyDigest, DigestJob, EmailOutbox
+
+    db = SessionLocal()
+    try:
+        db.query(EmailOutbox).delete()
+        db.query(DailyDigest).delete()
+        db.query(DigestJob).update({DigestJob.state: "summarized", DigestJob.lease_owner: None, DigestJob.attempts: 0})
+        db.commit()
+    finally:
+        db.close()
+
+
+async def send_phase(render_processes: int, args) -> dict:
+    from services.digest_jobs import run_digest_workers
+    from services.email_outbox import drain_outbox
+    from services.email_sender import email_sender
+    from services.loop_monitor import LoopLagMonitor
+
+    async def _fake_deliver(message, to_email=None):
+        await asyncio.sleep(args.smtp_latency)
+
+    email_sender._deliver = _fake_deliver  # noqa: SLF001
+    email_sender.render_processes = render_processes
+    # 清空本进程的渲染缓存，各场景从同样的状态开始（子进程每个场景重新创建）
+    email_sender._fragments.clear()  # noqa: SLF001
+    email_sender._bodies.clear()  # noqa: SLF001
+
+    try:
+        if render_processes > 0:
+            # 进程池启动（spawn + import）不计入发送阶段
+            await asyncio.gather(*(
+                email_sender.render_digest_message("warmup@example.com", {"company_news": {}}, "2026/01/02")
+                for _ in range(render_processes)
+            ))
+        async with LoopLagMonitor(args.lag_interval, keep_samples=True) as monitor:
+            t0 = time.perf_counter()
+            jobs = await run_digest_workers(RUN_DATE, concurrency=args.concurrency)
+            queued_s = time.perf_counter() - t0
+            delivered = await drain_outbox()
+            wall = time.perf_counter() - t0
+    finally:
+        await email_sender.close()
+    return {"jobs": dict(jobs), "delivered": dict(delivered), "queued_s": queued_s, "wall": wall, "lag": monitor.samples}
+
+
+def run_scenario(render_processes: int, args) -> dict:
+    reset_jobs()
+    out = asyncio.run(send_phase(render_processes, args))
+    lag = percentiles(out["lag"])
+    result = {
+        "render_processes": render_processes,
+        "wall_time_s": round(out["wall"], 3),
+        "enqueue_s": round(out["queued_s"], 3),
+        "messages_per_s": round(args.users / out["wall"], 2) if out["wall"] > 0 else None,
+        "jobs": out["jobs"],
+        "delivered": out["delivered"],
+        "loop_lag_s": lag,
+        "loop_lag_samples": len(out["lag"]),
+    }
+    print(
+        f"[render_processes={render_processes}] wall={result['wall_time_s']}s msgs/s={result['messages_per_s']} "
+        f"loop lag p50={lag.get('p50')} p99={lag.get('p99')} max={lag.get('max')}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digest send phase benchmark (render, outbox, delivery, loop lag)")
+    parser.add_argument("--users", type=int, default=300, help="收件人数")
+    parser.add_argument("--tickers", type=int, default=30, help="每封日报的公司数")
+    parser.add_argument("--watchlists", type=int, default=20, help="不同关注列表（不同正文）的份数")
+    parser.add_argument("--render-processes", default="0,4", help="要对比的 EMAIL_RENDER_PROCESSES，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=8, help="run_digest_workers 并发数")
+    parser.add_argument("--smtp-latency", type=float, default=0.005, help="模拟每封邮件的 SMTP 发送耗时（秒）")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="事件循环延迟采样间隔（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="SQLite 文件路径（默认临时目录）")
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    prepare_env(db_path=args.db, extra={"EMAIL_OUTBOX_ENABLED": "true", "EMAIL_RATE_PER_SECOND": "100000"})
+    seed_jobs(args.users, args.tickers, args.watchlists, args.seed)
+    sizes = [int(p) for p in args.render_processes.split(",") if p.strip()]
+    scenarios = [run_scenario(n, args) for n in sizes]
+
+    write_result(
+        args.out,
+        "send_phase",
+        {
+            "config": {
+                "users": args.users,
+                "tickers_per_digest": args.tickers,
+                "watchlists": args.watchlists,
+                "concurrency": args.concurrency,
+                "smtp_latency_s": args.smtp_latency,
+                "lag_interval_s": args.lag_interval,
+            },
+            "scenarios": scenarios,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+进程内的 SMTP 收件桩（aiosmtpd），用于邮件发送基准测试，不访问外部邮件服务。
+
+- 在独立线程的事件循环里运行，不占用被测代码的事件循环
+- 接受任意账号的 AUTH（不要求 TLS），客户端需设置 SMTP_START_TLS=false
+- handshake_latency：每个连接 EHLO 时的延迟，模拟建连 + STARTTLS + AUTH 的握手开销
+- data_latency：每封邮件 DATA 的延迟，模拟服务器接收耗时
+- 故障注入（按 seed 可复现）：
+  temp_fail_rate 的 DATA 返回 451（临时失败，应重试）；reject_rate 的 RCPT 返回 550（永久拒收，不应重试）；
+  disconnect_rate 的 DATA 直接断开连接、不回复（客户端应丢弃连接、重连）
+- stats() 返回连接数、收到的邮件数、各类注入的故障次数和重复投递情况
+"""
+
+import asyncio
+import logging
+import random
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP, AuthResult
+
+# aiosmtpd 每个连接都会打印日志（含 login_data 弃用警告），基准输出里只保留错误
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+
+class _SinkHandler:
+    def __init__(self, sink: "SMTPSink"):
+        self.sink = sink
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        if self.sink.handshake_latency:
+            await asyncio.sleep(self.sink.handshake_latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self.sink._inject("reject_rate"):  # noqa: SLF001
+            self.sink._count("rejected")  # noqa: SLF001
+            return "550 5.1.1 Recipient rejected (injected)"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.sink.data_latency:
+            await asyncio.sleep(self.sink.data_latency)
+        self.sink._attempt(envelope.rcpt_tos)  # noqa: SLF001
+        if self.sink._inject("disconnect_rate"):  # noqa: SLF001
+            self.sink._count("disconnects")  # noqa: SLF001
+            server.transport.close()
+            return "421 4.4.2 Connection dropped (injected)"
+        if self.sink._inject("temp_fail_rate"):  # noqa: SLF001
+            self.sink._count("temp_failures")  # noqa: SLF001
+            return "451 4.3.0 Temporary failure (injected)"
+        self.sink._accept(envelope.rcpt_tos)  # noqa: SLF001
+        return "250 Message accepted for delivery"
+
+
+class _CountingSMTP(SMTP):
+    def __init__(self, sink: "SMTPSink", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sink = sink
+
+    def connection_made(self, transport):
+        self._sink._count("connections")  # noqa: SLF001
+        super().connection_made(transport)
+
+
+class _SinkController(Controller):
+    def __init__(self, sink: "SMTPSink", **kwargs):
+        self.sink = sink
+        super().__init__(_SinkHandler(sink), **kwargs)
+
+    def factory(self):
+        return _CountingSMTP(self.sink, self.handler, **self.SMTP_kwargs)
+
+
+class SMTPSink:
+    """with SMTPSink(port) as sink: ... sink.stats()"""
+
+    def __init__(
+        self,
+        port: int,
+        *,
+        handshake_latency: float = 0.0,
+        data_latency: float = 0.0,
+        temp_fail_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        disconnect_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.port = port
+        self.handshake_latency = handshake_latency
+        self.data_latency = data_latency
+        self.temp_fail_rate = temp_fail_rate
+        self.reject_rate = reject_rate
+        self.disconnect_rate = disconnect_rate
+        self._rng = random.Random(seed)
+        self._counts: Counter = Counter()
+        # 每个收件人的 DATA 次数 / 成功接收次数（统计重试和重复投递）
+        self._attempts: Counter = Counter()
+        self._accepted: Counter = Counter()
+        self._lock = threading.Lock()
+        self._controller = _SinkController(
+            self,
+            hostname="127.0.0.1",
+            port=port,
+            authenticator=lambda *args: AuthResult(success=True),
+            auth_require_tls=False,
+        )
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def _inject(self, kind: str) -> bool:
+        rate = getattr(self, kind)
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _attempt(self, rcpt_tos) -> None:
+        with self._lock:
+            self._attempts.update(rcpt_tos)
+
+    def _accept(self, rcpt_tos) -> None:
+        with self._lock:
+            self._counts["messages"] += 1
+            self._accepted.update(rcpt_tos)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        connections / messages：连接数和成功接收的邮件数；
+        temp_failures / rejected / disconnects：注入的各类故障次数；
+        retried_recipients：DATA 不止一次的收件人数；duplicate_deliveries：同一收件人被成功接收多于一次的次数
+        """
+        with self._lock:
+            return {
+                "connections": self._counts["connections"],
+                "messages": self._counts["messages"],
+                "data_attempts": sum(self._attempts.values()),
+                "temp_failures": self._counts["temp_failures"],
+                "rejected": self._counts["rejected"],
+                "disconnects": self._counts["disconnects"],
+                "unique_recipients": len(self._accepted),
+                "retried_recipients": sum(1 for n in self._attempts.values() if n > 1),
+                "duplicate_deliveries": sum(n - 1 for n in self._accepted.values() if n > 1),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._attempts.clear()
+            self._accepted.clear()
+
+    def __enter__(self) -> "SMTPSink":
+        self._controller.start()
+        # start() 会自己连一次确认服务已启动，不计入统计
+        self.reset()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._controller.stop()
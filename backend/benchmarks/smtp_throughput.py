@@ -0,0 +1,118 @@
+"""
+SMTP 发送吞吐基准：EmailSender 对本地 aiosmtpd 收件桩（benchmarks/smtp_sink.py）批量发送日报邮件，
+对比“每封邮件单独建连”（SMTP_POOL_SIZE=0）与不同大小的连接池。
+
+收件桩的握手延迟（--handshake-latency）模拟建连 + STARTTLS + AUTH 的开销，
+DATA 延迟（--data-latency）模拟服务器接收一封邮件的耗时。
+
+输出：墙钟时间、每秒邮件数、服务器端连接数、单封发送 p50/p95/p99。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.smtp_throughput --messages 500
+  python -m benchmarks.smtp_throughput --messages 2000 --pool-sizes 0,4,8,16 --concurrency 16 --out bench_smtp.json
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.common import free_port, percentiles, prepare_env, write_result
+from benchmarks.hot_paths import gen_digest
+from benchmarks.smtp_sink import SMTPSink
+
+
+async def send_batch(pool_size: int, max_messages: int, n_messages: int, concurrency: int, digest: dict) -> Dict:
+    """用一个新的 EmailSender 并发发送 n_messages 封邮件，返回 (失败数, 单封耗时列表)。"""
+    from services.email_sender import EmailSender
+
+    sender = EmailSender()
+    sender.pool_size = pool_size
+    sender.pool_max_messages = max_messages
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def _one(i: int) -> None:
+        nonlocal failures
+        async with sem:
+            t0 = time.perf_counter()
+            ok = await sender.send_digest_email(f"bench{i:06d}@example.com", digest, "2026/01/02")
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                failures += 1
+
+    try:
+        await asyncio.gather(*(_one(i) for i in range(n_messages)))
+    finally:
+        await sender.close()
+    return {"failures": failures, "latencies": latencies}
+
+
+def run_scenario(sink: SMTPSink, pool_size: int, args, digest: dict) -> dict:
+    sink.reset()
+    t0 = time.perf_counter()
+    out = asyncio.run(send_batch(pool_size, args.max_messages, args.messages, args.concurrency, digest))
+    wall = time.perf_counter() - t0
+    server = sink.stats()
+    result = {
+        "pool_size": pool_size,
+        "wall_time_s": round(wall, 3),
+        "messages": args.messages,
+        "failures": out["failures"],
+        "messages_per_s": round(args.messages / wall, 2) if wall > 0 else None,
+        "server_connections": server["connections"],
+        "server_messages": server["messages"],
+        "send_latency_s": percentiles(out["latencies"]),
+    }
+    print(
+        f"[pool_size={pool_size}] wall={result['wall_time_s']}s msgs/s={result['messages_per_s']} "
+        f"connections={server['connections']} failures={out['failures']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP delivery throughput benchmark")
+    parser.add_argument("--messages", type=int, default=300, help="每个场景发送的邮件数")
+    parser.add_argument("--pool-sizes", default="0,4,8", help="要对比的 SMTP_POOL_SIZE，逗号分隔（0 为每封单独建连）")
+    parser.add_argument("--max-messages", type=int, default=100, help="SMTP_POOL_MAX_MESSAGES（每个连接发送多少封后重建）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时调用 send_digest_email 的协程数")
+    parser.add_argument("--tickers", type=int, default=5, help="每封日报包含的公司数")
+    parser.add_argument("--handshake-latency", type=float, default=0.05, help="收件桩每个连接的握手延迟（秒）")
+    parser.add_argument("--data-latency", type=float, default=0.005, help="收件桩每封邮件的接收延迟（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    port = free_port()
+    prepare_env(extra={"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_START_TLS": "false"})
+    digest = gen_digest(args.tickers, random.Random(args.seed))
+    pool_sizes = [int(p) for p in args.pool_sizes.split(",") if p.strip()]
+
+    with SMTPSink(port, handshake_latency=args.handshake_latency, data_latency=args.data_latency) as sink:
+        scenarios = [run_scenario(sink, size, args, digest) for size in pool_sizes]
+
+    write_result(
+        args.out,
+        "smtp_throughput",
+        {
+            "config": {
+                "messages": args.messages,
+                "max_messages_per_connection": args.max_messages,
+                "concurrency": args.concurrency,
+                "tickers_per_digest": args.tickers,
+                "handshake_latency_s": args.handshake_latency,
+                "data_latency_s": args.data_latency,
+            },
+            "scenarios": scenarios,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
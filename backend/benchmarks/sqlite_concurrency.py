@@ -0,0 +1,200 @@
+"""
+SQLite 并发读写基准：调度器写库与 API 读库同时进行时，对比 SQLite 默认配置（rollback journal）与 SQLITE_* 调优配置
+（WAL + synchronous=NORMAL + busy_timeout + mmap + 页缓存）。
+
+每个配置使用一个新的 SQLite 文件，预先写入 --users 个用户、每人 --history 天的 daily_digests 和当天 summarized 的 digest_jobs。
+然后在同一个事件循环里运行 --duration 秒（与应用一样走 aiosqlite + AsyncSession）：
+- --writers 个写协程模拟调度器发送阶段：enqueue_email 写发件箱 + 把任务标记为 sent，一个事务提交；
+- --readers 个读协程模拟 API：轮流查询日报历史、按状态统计任务（count_jobs_by_state）、发件箱状态（outbox_stats）。
+输出读 / 写的 ops/s、延迟分位数（毫秒）和 "database is locked" 错误数。
+
+用法（在 backend 目录下）：
+  python -m benchmarks.sqlite_concurrency
+  python -m benchmarks.sqlite_concurrency --writers 8 --readers 32 --duration 20 --out bench_sqlite.json
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import percentiles, prepare_env, write_result
+from benchmarks.hot_paths import gen_digest
+
+RUN_DATE = date(2026, 1, 2)
+PROFILES = ("default", "tuned")
+
+
+def seed(db_path: str, args) -> List[tuple]:
+    """写入用户、历史日报和 summarized 任务；返回 [(job_id, user_id, email)]。"""
+    from sqlalchemy import create_engine, insert, select
+
+    from database import Base
+    from models import DailyDigest, DigestJob, User
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    contents = [gen_digest(args.tickers, rng) for _ in range(5)]
+    users = [{"email": f"bench{u:06d}@example.com", "password_hash": "x", "name": f"bench{u}"} for u in range(args.users)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), users)
+        user_ids = [(uid, email) for uid, email in conn.execute(select(User.id, User.email))]
+        conn.execute(insert(DailyDigest), [
+            {"user_id": uid, "date": RUN_DATE - timedelta(days=d), "content": contents[(i + d) % len(contents)]}
+            for i, (uid, _) in enumerate(user_ids) for d in range(args.history)
+        ])
+        conn.execute(insert(DigestJob), [
+            {"user_id": uid, "date": RUN_DATE, "state": "summarized", "attempts": 0} for uid, _ in user_ids
+        ])
+        jobs = [(jid, uid) for jid, uid in conn.execute(select(DigestJob.id, DigestJob.user_id))]
+    engine.dispose()
+    emails = dict(user_ids)
+    return [(jid, uid, emails[uid]) for jid, uid in jobs]
+
+
+async def run_profile(profile: str, jobs: List[tuple], db_path: str, args) -> Dict:
+    from sqlalchemy import select, text, update
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from database import apply_sqlite_pragmas
+    from models import DailyDigest, DigestJob
+    from services.digest_jobs import count_jobs_by_state
+    from services.email_outbox import enqueue_email, outbox_stats
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    if profile == "tuned":
+        apply_sqlite_pragmas(engine.sync_engine)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    message = "x" * args.message_bytes
+    latencies: Dict[str, List[float]] = {"read": [], "write": []}
+    errors: Dict[str, Counter] = {"read": Counter(), "write": Counter()}
+    job_iter = iter(jobs)
+    deadline = time.perf_counter() + args.duration
+
+    async def _timed(kind: str, op) -> None:
+        t0 = time.perf_counter()
+        try:
+            await op()
+        except OperationalError as e:
+            errors[kind]["locked" if "locked" in str(e) else "operational"] += 1
+            return
+        latencies[kind].append(time.perf_counter() - t0)
+
+    async def _send_one(job_id: str, user_id: str, email: str) -> None:
+        async with Session() as db:
+            await enqueue_email(db, to_email=email, message=message, user_id=user_id,
+                                digest_date=RUN_DATE, dedupe_key=f"digest:{user_id}:{RUN_DATE}")
+            await db.execute(
+                update(DigestJob).where(DigestJob.id == job_id)
+                .values(state="sent", sent_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def _writer() -> None:
+        for job_id, user_id, email in job_iter:
+            if time.perf_counter() >= deadline:
+                return
+            await _timed("write", lambda: _send_one(job_id, user_id, email))
+
+    async def _history(rng: random.Random) -> None:
+        _, user_id, _ = rng.choice(jobs)
+        async with Session() as db:
+            list(await db.scalars(
+                select(DailyDigest).where(DailyDigest.user_id == user_id)
+                .order_by(DailyDigest.date.desc()).limit(args.history)
+            ))
+
+    async def _job_counts(rng: random.Random) -> None:
+        async with Session() as db:
+            await count_jobs_by_state(db, RUN_DATE)
+
+    async def _outbox(rng: random.Random) -> None:
+        async with Session() as db:
+            await outbox_stats(db, dead_limit=20)
+
+    async def _reader(i: int) -> None:
+        rng = random.Random(args.seed + i)
+        ops = (_history, _history, _job_counts, _outbox)
+        while time.perf_counter() < deadline:
+            op = rng.choice(ops)
+            await _timed("read", lambda: op(rng))
+
+    try:
+        async with engine.connect() as conn:
+            journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_writer() for _ in range(args.writers)), *(_reader(i) for i in range(args.readers)))
+        wall = time.perf_counter() - t0
+    finally:
+        await engine.dispose()
+
+    result = {"profile": profile, "journal_mode": journal_mode, "wall_time_s": round(wall, 3)}
+    for kind in ("read", "write"):
+        ms = [s * 1e3 for s in latencies[kind]]
+        result[f"{kind}s_per_s"] = round(len(ms) / wall, 1)
+        result[f"{kind}_latency_ms"] = percentiles(ms)
+        result[f"{kind}_errors"] = dict(errors[kind])
+    print(
+        f"[{profile} journal={journal_mode}] reads {result['reads_per_s']}/s p99={result['read_latency_ms']['p99']}ms "
+        f"errors={result['read_errors']}  writes {result['writes_per_s']}/s p99={result['write_latency_ms']['p99']}ms "
+        f"errors={result['write_errors']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrent read/write benchmark (default journal vs WAL tuning)")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="要对比的配置（default / tuned），逗号分隔")
+    parser.add_argument("--users", type=int, default=2000, help="用户数（也是可写的任务数上限）")
+    parser.add_argument("--history", type=int, default=7, help="每个用户的历史日报天数")
+    parser.add_argument("--tickers", type=int, default=10, help="每份日报的公司数（决定日报 JSON 大小）")
+    parser.add_argument("--writers", type=int, default=4, help="写协程数（调度器发送阶段）")
+    parser.add_argument("--readers", type=int, default=16, help="读协程数（API 请求）")
+    parser.add_argument("--duration", type=float, default=10, help="每个配置运行的秒数")
+    parser.add_argument("--message-bytes", type=int, default=20_000, help="写入发件箱的邮件大小")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="JSON 结果输出路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    prepare_env()
+    workdir = tempfile.mkdtemp(prefix="stockdaily-sqlite-")
+    results = []
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        if profile not in PROFILES:
+            parser.error(f"未知配置: {profile}")
+        # 每个配置一个新库：journal_mode=WAL 会持久化在库文件里
+        db_path = Path(os.path.join(workdir, f"{profile}.db")).resolve().as_posix()
+        jobs = seed(db_path, args)
+        results.append(asyncio.run(run_profile(profile, jobs, db_path, args)))
+
+    write_result(
+        args.out,
+        "sqlite_concurrency",
+        {
+            "config": {
+                "users": args.users,
+                "history_days": args.history,
+                "tickers_per_digest": args.tickers,
+                "writers": args.writers,
+                "readers": args.readers,
+                "duration_s": args.duration,
+                "message_bytes": args.message_bytes,
+            },
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+AI Builder Chat Completions 的本地桩服务（用于基准测试，不访问外网）。
+
+- 按 prompt 特征识别阶段：search / context_queries / relevance_filter / summary / classify
+- 每个阶段可配置模拟延迟（秒）与抖动
+- GET /stats 返回各阶段调用次数，供基准脚本统计 “AI calls issued”
+
+用法（独立运行）：
+  python -m benchmarks.stub_ai_api --port 18080 --search-latency 2 --summary-latency 1
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+DEFAULT_LATENCIES: Dict[str, float] = {
+    "search": 0.2,
+    "context_queries": 0.05,
+    "relevance_filter": 0.05,
+    "summary": 0.1,
+    "classify": 0.05,
+    "other": 0.05,
+}
+
+
+def classify_prompt(prompt: str) -> str:
+    """根据 prompt 内容判断调用阶段（与 services 中的 prompt 文案对应）。"""
+    if "美股新闻检索器" in prompt:
+        return "search"
+    if "新闻清单（仅供引用）" in prompt or "投资者摘要" in prompt:
+        return "summary"
+    if "web search queries" in prompt:
+        return "context_queries"
+    if "industry context" in prompt:
+        return "relevance_filter"
+    if "细分行业" in prompt:
+        return "classify"
+    return "other"
+
+
+def _fake_search_content(prompt: str) -> str:
+    m = re.search(r"(\d{4}-\d{2}-\d{2})", prompt)
+    target_date = m.group(1) if m else ""
+    n_match = re.search(r"返回 (\d+) 条", prompt)
+    n = int(n_match.group(1)) if n_match else 5
+    topic = re.search(r"检索主题：(.+)", prompt)
+    topic_text = (topic.group(1) if topic else "market")[:40]
+    items = [
+        {
+            "title": f"{topic_text} headline #{i}",
+            "content": f"Synthetic news body #{i} describing what happened and the possible impact. " * 2,
+            "url": f"https://news.example.com/{abs(hash(topic_text)) % 100000}/{i}",
+            "source": random.choice(["Reuters", "Bloomberg", "WSJ", "CNBC"]),
+            "published_date": target_date,
+        }
+        for i in range(1, n + 1)
+    ]
+    return "```json\n" + json.dumps(items, ensure_ascii=False) + "\n```"
+
+
+def _fake_content(stage: str, prompt: str) -> str:
+    if stage == "search":
+        return _fake_search_content(prompt)
+    if stage == "summary":
+        return "公司公布了新的产品路线图，可能提振下半年需求[1]。监管方面出现新的调查进展，短期存在不确定性[2][3]。"
+    if stage == "context_queries":
+        return json.dumps(["semiconductor export controls", "smartphone supply chain", "AI accelerator demand"])
+    if stage == "relevance_filter":
+        return json.dumps([{"index": 0, "relevance_score": 90, "why": "供应链"}, {"index": 1, "relevance_score": 70, "why": "竞争"}])
+    if stage == "classify":
+        return "芯片半导体,人工智能"
+    return "ok"
+
+
+def create_app(latencies: Dict[str, float], jitter: float = 0.2, error_rate: float = 0.0):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    calls: Counter = Counter()
+    errors: Counter = Counter()
+    started = time.time()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        stage = classify_prompt(prompt)
+        calls[stage] += 1
+
+        base = latencies.get(stage, latencies.get("other", 0.0))
+        delay = max(0.0, base * (1 + random.uniform(-jitter, jitter)))
+        if delay:
+            await asyncio.sleep(delay)
+
+        if error_rate and random.random() < error_rate:
+            errors[stage] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+
+        content = _fake_content(stage, prompt)
+        return {
+            "id": f"stub-{sum(calls.values())}",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": len(prompt) // 4 + len(content) // 4,
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "calls": dict(calls),
+            "errors": dict(errors),
+            "total_calls": sum(calls.values()),
+            "uptime_s": round(time.time() - started, 3),
+        }
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        calls.clear()
+        errors.clear()
+        return {"ok": True}
+
+    return app
+
+
+def serve(port: int, latencies: Dict[str, float], jitter: float = 0.2, error_rate: float = 0.0) -> None:
+    import uvicorn
+
+    app = create_app(latencies, jitter=jitter, error_rate=error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+class StubAIServer:
+    """在子进程里运行桩服务，避免它与被测代码争抢同一个事件循环/GIL。"""
+
+    def __init__(self, port: int, latencies: Optional[Dict[str, float]] = None, jitter: float = 0.2, error_rate: float = 0.0):
+        self.port = port
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._proc: Optional[multiprocessing.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 15.0) -> "StubAIServer":
+        import httpx
+
+        self._proc = multiprocessing.Process(
+            target=serve,
+            args=(self.port, self.latencies, self.jitter, self.error_rate),
+            daemon=True,
+        )
+        self._proc.start()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{self.base_url}/stats", timeout=1.0).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError(f"stub AI API did not start on port {self.port}")
+
+    def stats(self) -> dict:
+        import httpx
+
+        return httpx.get(f"{self.base_url}/stats", timeout=5.0).json()
+
+    def reset(self) -> None:
+        import httpx
+
+        httpx.post(f"{self.base_url}/stats/reset", timeout=5.0)
+
+    def stop(self) -> None:
+        if self._proc and self._proc.is_alive():
+            self._proc.terminate()
+            self._proc.join(timeout=5)
+        self._proc = None
+
+    def __enter__(self) -> "StubAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub AI Builder API")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--search-latency", type=float, default=DEFAULT_LATENCIES["search"])
+    parser.add_argument("--summary-latency", type=float, default=DEFAULT_LATENCIES["summary"])
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    latencies = {**DEFAULT_LATENCIES, "search": args.search_latency, "summary": args.summary_latency}
+    serve(args.port, latencies, jitter=args.jitter, error_rate=args.error_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,15 @@ ENV_FILE = BACKEND_DIR / ".env"
 class Settings(BaseSettings):
     # 数据库配置 (默认使用 SQLite 方便开发)
     DATABASE_URL: str = "sqlite:///./stockdaily.db"
+    # SQLite 调优（仅 DATABASE_URL 为 sqlite 时生效，每个新连接上执行 PRAGMA；false 为 SQLite 默认行为）：
+    # WAL 日志让读和写互不阻塞（调度器写库时 API 仍可读），WAL 下 synchronous=NORMAL 只在断电时可能丢最后几个事务、不会损坏库；
+    # busy_timeout 为写锁被占用时的等待上限（毫秒）；mmap / cache 单位为 MB（cache 为每个连接的页缓存）
+    SQLITE_TUNING: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_CACHE_SIZE_MB: int = 64
     
     # Redis 配置
     REDIS_URL: str = "redis://localhost:6379"
@@ -30,6 +39,29 @@ class Settings(BaseSettings):
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     FROM_EMAIL: str = "noreply@stockdaily.com"
+    # SMTP 服务器不支持 STARTTLS 时（如本地测试用的 aiosmtpd）设为 false
+    SMTP_START_TLS: bool = True
+    # SMTP 连接池：最多保持的已登录会话数（也是并发发送上限，0 表示每封邮件单独建连），每个会话发送多少封后重建
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_MAX_MESSAGES: int = 100
+    # 邮件中每个公司区块的渲染结果按 (ticker, 日期, 内容) 缓存，所有收件人共用；最多缓存多少个区块
+    EMAIL_FRAGMENT_CACHE_SIZE: int = 5000
+    # 日报 HTML 样式：compact 把重复的内联样式合并到 <style> 中的 class 并去掉缩进（体积更小）；
+    # inline 为逐元素内联样式，兼容会剥掉 <style> 的老邮件客户端
+    EMAIL_HTML_STYLE: str = "compact"
+    # 关注列表 + 日期相同的收件人共用一份已渲染、已编码的正文；最多缓存多少份不同的正文
+    EMAIL_BODY_CACHE_SIZE: int = 500
+    # 大批量发送时把邮件渲染和 MIME 编码放到多少个子进程中（0 表示在事件循环所在进程内执行）
+    EMAIL_RENDER_PROCESSES: int = 0
+    # 邮件发件箱（email_outbox）：日报渲染后写入发件箱，由投递器按收件域名限速发送，失败指数退避重试，重试耗尽进入 dead
+    EMAIL_OUTBOX_ENABLED: bool = True
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: float = 30
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    # 每个收件域名每秒最多发送的邮件数；EMAIL_PROVIDER_RATE_LIMITS 单独指定，如 "gmail.com=5,qq.com=2"
+    EMAIL_RATE_PER_SECOND: float = 10.0
+    EMAIL_PROVIDER_RATE_LIMITS: str = ""
     
     # 应用配置（生产环境默认关闭 DEBUG）
     DEBUG: bool = False
@@ -37,11 +69,47 @@ class Settings(BaseSettings):
     # AI/外部请求并发控制（避免 rate limit / 超时风暴）
     MAX_CONCURRENT_AI_REQUESTS: int = 3
 
-    # 定时发送日报（纽约时间每天 08:00）
+    # 定时发送日报（每个用户当地时间每天 08:00；DAILY_EMAIL_TIMEZONE 为未设置时区用户的默认时区）
     ENABLE_DAILY_EMAIL_SCHEDULER: bool = False
     DAILY_EMAIL_TIMEZONE: str = "America/New_York"
     DAILY_EMAIL_HOUR: int = 8
     DAILY_EMAIL_MINUTE: int = 0
+    # 调度器检查各时区槽位是否到点的间隔（分钟，需能整除 60 才能对齐半点/45 分时区）
+    DIGEST_SLOT_TICK_MINUTES: int = 15
+    # 多进程/多副本部署时只有持有主节点锁的进程运行调度器；锁有效期（秒），持有者每 1/3 有效期续期一次
+    SCHEDULER_LEADER_TTL_SECONDS: int = 30
+    # 定时任务同时处理的用户数（总 AI 并发约为 DIGEST_USER_CONCURRENCY × MAX_CONCURRENT_AI_REQUESTS）
+    DIGEST_USER_CONCURRENCY: int = 4
+    # 日报任务队列（digest_jobs）：租约时长、最大尝试次数、重试退避基数
+    DIGEST_JOB_LEASE_SECONDS: int = 30 * 60
+    DIGEST_JOB_MAX_ATTEMPTS: int = 3
+    DIGEST_JOB_RETRY_BASE_SECONDS: int = 60
+    # inline：API 进程内的调度器直接处理任务；queue：调度器只入队，由 `python -m worker` 独立进程处理
+    DIGEST_WORKER_MODE: str = "inline"
+    DIGEST_WORKER_PROCESSES: int = 2
+    # 预取阶段：在发送时间前多少分钟开始检索/总结所有被关注的 ticker（0 表示不预取），每批 ticker 数
+    DIGEST_PREFETCH_LEAD_MINUTES: int = 120
+    DIGEST_PREFETCH_BATCH_SIZE: int = 20
+    # 容量规划：按最近 N 天的实测耗时估算下一次日报的预取/发送时长（估算值乘以安全系数）
+    CAPACITY_LOOKBACK_DAYS: int = 7
+    CAPACITY_SAFETY_FACTOR: float = 1.5
+    # 预取估算超过 DIGEST_PREFETCH_LEAD_MINUTES 时自动提前开始（最多提前 DIGEST_PREFETCH_MAX_LEAD_MINUTES 分钟）
+    DIGEST_PREFETCH_AUTO_ADVANCE: bool = True
+    DIGEST_PREFETCH_MAX_LEAD_MINUTES: int = 12 * 60
+    # 发送时间后多少分钟内所有日报应发送完（如 08:00 发送、09:30 开盘，留出余量设为 60）
+    DIGEST_DELIVERY_WINDOW_MINUTES: int = 60
+
+    # 本地 tracing（span 写入 JSONL，用 trace_waterfall.py 查看）
+    ENABLE_TRACING: bool = False
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+
+    # AI 调用台账（ai_calls 表）与成本估算（每 1K token 的价格，0 表示不估算）
+    ENABLE_AI_USAGE_LEDGER: bool = True
+    AI_COST_PER_1K_PROMPT_TOKENS: float = 0.0
+    AI_COST_PER_1K_COMPLETION_TOKENS: float = 0.0
+
+    # 管理员邮箱（逗号分隔），可访问 /api/admin/*
+    ADMIN_EMAILS: str = ""
     
     class Config:
         env_file = str(ENV_FILE) if ENV_FILE.exists() else ".env"
@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
+from typing import List
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
 from config import settings
+from metrics import DB_SESSION_SECONDS, observe_seconds
 
 # 创建数据库引擎
 # SQLite 需要 check_same_thread=False
@@ -15,6 +20,23 @@ if database_url.startswith("sqlite:///./"):
     abs_path = (Path(__file__).parent / rel).resolve().as_posix()
     database_url = f"sqlite:///{abs_path}"
 
+# 异步驱动：应用代码（API、调度器、worker、投递器）都在事件循环上访问数据库，
+# 同步驱动的每次查询都会阻塞整个循环
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _async_url(url: str) -> str:
+    """把连接串换成对应的异步驱动（sqlite -> aiosqlite，postgresql -> asyncpg；已指定异步驱动的保持不变）"""
+    parsed = make_url(url)
+    if parsed.get_driver_name() in ("aiosqlite", "asyncpg", "psycopg"):
+        return url
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"不支持的数据库（没有对应的异步驱动）: {parsed.drivername}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# 同步引擎：只用于建表 / 补列和离线脚本（基准测试造数据等），应用代码使用下面的 async_engine
 if database_url.startswith("sqlite"):
     engine = create_engine(
         database_url,
@@ -22,18 +44,74 @@ if database_url.startswith("sqlite"):
     )
 else:
     engine = create_engine(database_url)
+async_engine = create_async_engine(_async_url(database_url))
+
+
+def sqlite_pragmas() -> List[str]:
+    """按配置生成每个 SQLite 连接要执行的 PRAGMA（见 config.py 中的 SQLITE_*）"""
+    return [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_MB) * 1024 * 1024}",
+        # 负数单位为 KB（正数为页数）
+        f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_MB) * 1024}",
+    ]
+
+
+def apply_sqlite_pragmas(sync_engine: Engine) -> None:
+    """
+    在 sync_engine 每次新建连接时执行 sqlite_pragmas()。
+    异步引擎传 async_engine.sync_engine：aiosqlite 的适配连接同样提供同步的 cursor() 接口。
+    """
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+if database_url.startswith("sqlite") and settings.SQLITE_TUNING:
+    apply_sqlite_pragmas(engine)
+    apply_sqlite_pragmas(async_engine.sync_engine)
 
 # 创建 SessionLocal 类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步 session：提交后不让对象过期（异步 session 里访问过期属性会触发隐式 IO 而报错），
+# 需要数据库生成的新值时显式 await db.refresh(obj)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # 创建 Base 类
 Base = declarative_base()
 
 
+def add_missing_columns() -> None:
+    """
+    create_all 不会给已存在的表加列：为已有表补上模型里新增的可空列。
+    项目没有引入迁移工具，这里只处理“新增可空列”这一种情况。
+    """
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_cols = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing_cols or not col.nullable:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+
+
 # 获取数据库 session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db():
+    with observe_seconds(DB_SESSION_SECONDS, source="api"):
+        async with AsyncSessionLocal() as db:
+            yield db
@@ -4,13 +4,18 @@ from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import logging
 
-from database import engine, Base
-from routers import auth, companies, digests
+from database import engine, Base, add_missing_columns
+from routers import auth, companies, digests, admin
 from config import settings
-from services.digest_scheduler import start_daily_email_scheduler
+from metrics import render_latest
+from services.ai_usage import flush_ai_usage
+from services.digest_scheduler import start_daily_email_scheduler, stop_daily_email_scheduler
+from services.email_outbox import start_email_dispatcher, stop_email_dispatcher
+from services.email_sender import email_sender
+from services.loop_monitor import LoopLagMonitor
 
 # 配置日志
 logging.basicConfig(
@@ -21,6 +26,7 @@ logger = logging.getLogger(__name__)
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -42,6 +48,9 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(companies.router)
 app.include_router(digests.router)
+app.include_router(admin.router)
+
+_loop_monitor = LoopLagMonitor()
 
 # 静态文件目录（前端构建后的文件）
 STATIC_DIR = Path(__file__).parent / "static"
@@ -62,7 +71,23 @@ async def _startup():
         logger.info(f"Mounted /assets from {assets_dir}")
     
     # 启动每日邮件调度器（AsyncIOScheduler 在同一事件循环中运行，不是独立进程）
+    # 多个 uvicorn worker / 副本中只有抢到主节点锁的进程真正调度
+    # DIGEST_WORKER_MODE=queue 时调度器只入队，日报由 `python -m worker` 生成
     start_daily_email_scheduler()
+    # 发件箱投递器：同样只在抢到 email_outbox_dispatcher 锁的进程上发送
+    start_email_dispatcher()
+    # 事件循环延迟（stockdaily_event_loop_lag_seconds）：日报发送与 API 请求共用这个循环
+    _loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    """应用退出时释放调度器/投递器主节点锁、关闭 SMTP 连接池，并把缓冲中的 AI 调用记录落库"""
+    await stop_daily_email_scheduler()
+    await stop_email_dispatcher()
+    await _loop_monitor.stop()
+    await email_sender.close()
+    await flush_ai_usage()
 
 
 @app.get("/api/health")
@@ -83,6 +108,13 @@ def api_status():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus 抓取端点（日报流水线各阶段指标）"""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 # 根路由：返回前端页面
 @app.get("/")
 async def serve_root():
@@ -0,0 +1,161 @@
+"""
+Prometheus 指标定义（日报流水线各阶段）。
+
+所有指标都是进程内计数器/直方图，记录一次的开销是微秒级，可以在生产环境常开。
+注意：为避免标签基数爆炸，这里不按 ticker / user 打标签，按 ticker 维度的分析请用日志或 AI 调用台账。
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# AI agent 搜索可能耗时数分钟，桶的上限要足够大
+_SLOW_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 180, 300, 600)
+_FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# ============ 新闻搜索 ============
+
+AGENT_SEARCH_SECONDS = Histogram(
+    "stockdaily_agent_search_seconds",
+    "search_news_via_agent 总耗时（含重试）",
+    ["outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+AGENT_SEARCH_RETRIES = Counter(
+    "stockdaily_agent_search_retries_total",
+    "search_news_via_agent 的重试次数",
+)
+AGENT_SEARCH_TIMEOUTS = Counter(
+    "stockdaily_agent_search_timeouts_total",
+    "search_news_via_agent 的单次请求超时次数",
+)
+COMPANY_NEWS_ITEMS = Histogram(
+    "stockdaily_company_news_items",
+    "每个 ticker 收集到的新闻条数",
+    buckets=(0, 1, 2, 5, 10, 15, 20, 25, 30),
+)
+
+# ============ AI 摘要 ============
+
+SUMMARY_SECONDS = Histogram(
+    "stockdaily_summary_seconds",
+    "带引用的公司摘要生成耗时（含引用重试）",
+    ["outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+SUMMARY_REQUESTS = Counter(
+    "stockdaily_summary_requests_total",
+    "带引用的公司摘要生成次数",
+)
+SUMMARY_CITATION_RETRIES = Counter(
+    "stockdaily_summary_citation_retries_total",
+    "因缺少引用/结论空泛而重试的摘要次数（除以 requests_total 即重试率）",
+)
+
+# ============ 邮件 ============
+
+EMAIL_RENDER_SECONDS = Histogram(
+    "stockdaily_email_render_seconds",
+    "日报邮件 HTML 渲染耗时",
+    buckets=_FAST_BUCKETS,
+)
+EMAIL_FRAGMENT_CACHE = Counter(
+    "stockdaily_email_fragment_cache_total",
+    "邮件公司区块渲染缓存的命中情况（hit / miss）",
+    ["result"],
+)
+EMAIL_BODY_CACHE = Counter(
+    "stockdaily_email_body_cache_total",
+    "共享邮件正文缓存的命中情况（关注列表 + 日期相同的收件人共用一份已编码的正文）",
+    ["result"],
+)
+EMAIL_MESSAGE_BYTES = Histogram(
+    "stockdaily_email_message_bytes",
+    "序列化后的日报邮件大小（字节，含 MIME 头和 base64 编码；Gmail 超过约 102KB 会截断正文）",
+    buckets=(10_000, 25_000, 50_000, 75_000, 100_000, 150_000, 250_000, 500_000, 1_000_000, 2_500_000),
+)
+EMAIL_SEND_SECONDS = Histogram(
+    "stockdaily_email_smtp_send_seconds",
+    "SMTP 发送耗时",
+    ["outcome"],
+    buckets=_FAST_BUCKETS + (30, 60),
+)
+EMAIL_OUTBOX_DELIVERIES = Counter(
+    "stockdaily_email_outbox_deliveries_total",
+    "发件箱投递结果（sent / retry / dead；lost 为租约已被其他投递器接手）",
+    ["outcome"],
+)
+SMTP_CONNECTIONS = Counter(
+    "stockdaily_smtp_connections_total",
+    "SMTP 连接池的连接事件（opened 为新建连接，其余为关闭原因：recycled / idle / error / closed / connect_failed）",
+    ["event"],
+)
+
+# ============ 定时任务 ============
+
+SCHEDULER_JOB_SECONDS = Histogram(
+    "stockdaily_scheduler_job_seconds",
+    "每日日报定时任务总耗时",
+    buckets=(10, 30, 60, 300, 600, 1200, 1800, 3600, 7200, 14400, 28800),
+)
+SCHEDULER_USERS_PROCESSED = Counter(
+    "stockdaily_scheduler_users_processed_total",
+    "定时任务处理的用户数",
+    ["outcome"],
+)
+
+TICKER_DIGEST_CACHE = Counter(
+    "stockdaily_ticker_digest_cache_total",
+    "按 (ticker, 目标日期) 查询预取结果的次数（hit 为命中预取，miss 为发送时现场生成）",
+    ["result"],
+)
+PREFETCH_TICKERS = Counter(
+    "stockdaily_prefetch_tickers_total",
+    "预取阶段处理的 ticker 数",
+    ["outcome"],
+)
+CAPACITY_ESTIMATE_SECONDS = Gauge(
+    "stockdaily_capacity_estimate_seconds",
+    "容量规划估算的下一次日报耗时（所有时区槽位中的最大值，已乘安全系数）",
+    ["phase"],
+)
+CAPACITY_WARNINGS = Gauge(
+    "stockdaily_capacity_warnings",
+    "容量规划当前的告警数（预取来不及 / 发送超出窗口）",
+)
+
+# ============ 事件循环 ============
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "stockdaily_event_loop_lag_seconds",
+    "事件循环延迟：定时唤醒的实际时间比预期晚了多少（CPU 密集的同步代码会阻塞循环）",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+# ============ 数据库 ============
+
+DB_SESSION_SECONDS = Histogram(
+    "stockdaily_db_session_seconds",
+    "数据库 session 从打开到关闭的时长",
+    ["source"],
+    buckets=_FAST_BUCKETS + (30, 60, 300),
+)
+
+
+@contextmanager
+def observe_seconds(histogram, **labels) -> Iterator[None]:
+    """记录代码块耗时到 histogram（labels 可选）。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """返回 (exposition 文本, content-type)，供 /metrics 使用。"""
+    return generate_latest(), CONTENT_TYPE_LATEST
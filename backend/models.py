@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, JSON, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Date, JSON, UniqueConstraint, Integer, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -17,6 +17,8 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
     name = Column(String(255), nullable=True)
+    # IANA 时区名（如 "Asia/Shanghai"），日报在用户当地时间 DAILY_EMAIL_HOUR 发送；为空时使用 DAILY_EMAIL_TIMEZONE
+    timezone = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 关系
@@ -97,3 +99,117 @@ class DailyDigest(Base):
     
     # 关系
     user = relationship("User", back_populates="digests")
+
+
+class DigestJob(Base):
+    """每日日报任务（每个用户每天一行），状态持久化，进程重启后可从中断处继续"""
+    __tablename__ = "digest_jobs"
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    # pending -> collecting -> summarized -> sent（或写入发件箱后为 queued）；重试耗尽为 failed
+    state = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    # summarized 之后保存日报内容，重试时只需重新发送
+    content = Column(JSON, nullable=True)
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    # SMTP 发送耗时（毫秒），容量规划用
+    send_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 唯一约束
+    __table_args__ = (
+        UniqueConstraint('user_id', 'date', name='uix_job_user_date'),
+        Index("ix_digest_jobs_state_date", "state", "date"),
+    )
+    
+    # 关系
+    user = relationship("User")
+
+
+class EmailOutbox(Base):
+    """待发送邮件（已渲染），由投递器按收件域名限速发送；失败指数退避重试，重试耗尽进入 dead"""
+    __tablename__ = "email_outbox"
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    # 去重键（如 digest:<user_id>:<date>），同一封日报重复入队时只保留一行
+    dedupe_key = Column(String(128), unique=True, nullable=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    digest_date = Column(Date, nullable=True)
+    to_email = Column(String(255), nullable=False)
+    # 收件域名，按域名限速
+    provider = Column(String(255), nullable=False)
+    # 完整的 MIME 邮件文本
+    message = Column(Text, nullable=False)
+    # pending -> sending -> sent；重试耗尽或永久错误为 dead
+    state = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    lease_owner = Column(String(128), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    # SMTP 发送耗时（毫秒），容量规划用
+    send_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_email_outbox_state_next_attempt", "state", "next_attempt_at"),
+    )
+
+
+class SchedulerLease(Base):
+    """调度器主节点锁（每个锁名一行）：持有者定期续期，过期后其他进程可接管"""
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(128), nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TickerDigest(Base):
+    """单个 ticker 在某个目标日期的新闻与摘要（预取阶段写入，发送阶段所有关注该 ticker 的用户共用）"""
+    __tablename__ = "ticker_digests"
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    ticker = Column(String(10), nullable=False)
+    target_date = Column(Date, nullable=False)
+    # 与日报 company_news[ticker][0] 结构相同：title / summary / source / items
+    entry = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # 唯一约束
+    __table_args__ = (UniqueConstraint('ticker', 'target_date', name='uix_ticker_target_date'),)
+
+
+class AICall(Base):
+    """AI Builder 调用台账（每次调用一行，追加写入）"""
+    __tablename__ = "ai_calls"
+    
+    # 高频追加写入，用自增整数主键保持行紧凑
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    stage = Column(String(32), nullable=False)
+    ticker = Column(String(16), nullable=True)
+    user_id = Column(String(36), nullable=True)
+    tokens_in = Column(Integer, nullable=True)
+    tokens_out = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=False)
+    attempt = Column(Integer, nullable=False, default=1)
+    outcome = Column(String(16), nullable=False)
+    # 日报的目标日期（ticker 检索和总结时才有）；source 为 backfill 时是历史回填，空为线上流程
+    target_date = Column(Date, nullable=True)
+    source = Column(String(16), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_ai_calls_created_at", "created_at"),
+        Index("ix_ai_calls_stage_created_at", "stage", "created_at"),
+    )
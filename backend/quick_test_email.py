@@ -13,8 +13,10 @@ if sys.platform == 'win32':
 
 from services.email_sender import email_sender
 from config import settings
-from database import SessionLocal, Base, engine
+from database import AsyncSessionLocal, Base, engine
 from models import User, UserCompany
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 from routers.digests import generate_digest_for_user
 
 
@@ -52,14 +54,18 @@ async def main():
         Base.metadata.create_all(bind=engine)
 
         # 从 DB 找到用户 + 其关注公司列表
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         try:
-            user = db.query(User).filter(User.email == target_email).first()
+            user = await db.scalar(select(User).where(User.email == target_email))
             if not user:
                 print(f"\n错误: 数据库中未找到用户 {target_email}，请先注册并添加关注公司。")
                 return
 
-            user_companies = db.query(UserCompany).filter(UserCompany.user_id == user.id).all()
+            user_companies = (await db.scalars(
+                select(UserCompany)
+                .options(joinedload(UserCompany.company))
+                .where(UserCompany.user_id == user.id)
+            )).all()
             if not user_companies:
                 print(f"\n错误: 用户 {target_email} 尚未关注任何公司，请先在前端添加关注。")
                 return
@@ -71,7 +77,7 @@ async def main():
             # 生成日报内容（与真实接口一致）
             digest_content = await generate_digest_for_user(user, db)
         finally:
-            db.close()
+            await db.close()
         
         # 4. 发送邮件
         print(f"\n正在发送邮件到 {target_email}...")
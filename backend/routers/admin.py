@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List
+
+from database import get_db
+from models import User, AICall
+from schemas import AIUsageRow, CapacityPlan, OutboxEntry, OutboxStatus
+from auth import get_current_admin
+from config import settings
+from services.ai_usage import flush_ai_usage
+from services.capacity import plan_capacity
+from services.email_outbox import outbox_stats, requeue_dead
+
+router = APIRouter(prefix="/api/admin", tags=["管理"])
+
+# 允许的聚合维度
+_GROUP_COLUMNS = {
+    "day": func.date(AICall.created_at),
+    "stage": AICall.stage,
+    "ticker": AICall.ticker,
+}
+
+
+@router.get("/ai-usage", response_model=List[AIUsageRow])
+async def get_ai_usage(
+    days: int = Query(7, ge=1, le=90, description="统计最近 N 天"),
+    group_by: str = Query("day,stage,ticker", description="聚合维度，逗号分隔：day / stage / ticker"),
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """AI 调用台账聚合：按天/阶段/ticker 统计调用次数、失败数、token 与耗时"""
+    dims = [d.strip() for d in group_by.split(",") if d.strip()]
+    unknown = [d for d in dims if d not in _GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的聚合维度: {', '.join(unknown)}"
+        )
+
+    # 先把内存缓冲落库，保证看到最新数据
+    await flush_ai_usage()
+
+    group_cols = [_GROUP_COLUMNS[d].label(d) for d in dims]
+    since = datetime.utcnow() - timedelta(days=days)
+    stmt = select(
+        *group_cols,
+        func.count(AICall.id).label("calls"),
+        func.sum(case((AICall.outcome != "ok", 1), else_=0)).label("failures"),
+        func.coalesce(func.sum(AICall.tokens_in), 0).label("tokens_in"),
+        func.coalesce(func.sum(AICall.tokens_out), 0).label("tokens_out"),
+        func.avg(AICall.latency_ms).label("avg_latency_ms"),
+        func.max(AICall.latency_ms).label("max_latency_ms"),
+        func.sum(AICall.latency_ms).label("total_latency_ms"),
+    ).where(AICall.created_at >= since)
+    if group_cols:
+        stmt = stmt.group_by(*group_cols)
+    rows = (await db.execute(stmt.order_by(func.sum(AICall.latency_ms).desc()))).all()
+
+    result = []
+    for r in rows:
+        tokens_in = int(r.tokens_in or 0)
+        tokens_out = int(r.tokens_out or 0)
+        cost = (
+            tokens_in / 1000 * settings.AI_COST_PER_1K_PROMPT_TOKENS
+            + tokens_out / 1000 * settings.AI_COST_PER_1K_COMPLETION_TOKENS
+        )
+        day = getattr(r, "day", None)
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        result.append(AIUsageRow(
+            day=day,
+            stage=getattr(r, "stage", None),
+            ticker=getattr(r, "ticker", None),
+            calls=r.calls,
+            failures=int(r.failures or 0),
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
+            avg_latency_ms=round(float(r.avg_latency_ms or 0), 1),
+            max_latency_ms=int(r.max_latency_ms or 0),
+            total_latency_s=round((r.total_latency_ms or 0) / 1000, 1),
+            estimated_cost=round(cost, 4),
+        ))
+    return result
+
+
+@router.get("/capacity", response_model=CapacityPlan)
+async def get_capacity_plan(
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """容量规划：按实测耗时估算下一次日报各时区槽位的预取/发送时长，warnings 非空表示可能赶不上发送时间"""
+    # 先把内存缓冲落库，估算用上最新的耗时
+    await flush_ai_usage()
+    return await plan_capacity(db)
+
+
+@router.get("/outbox", response_model=OutboxStatus)
+async def get_outbox_status(
+    limit: int = Query(20, ge=1, le=200, description="返回最近多少封 dead 邮件"),
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """发件箱各状态的邮件数，以及最近投递失败（dead）的邮件"""
+    return await outbox_stats(db, dead_limit=limit)
+
+
+@router.post("/outbox/{outbox_id}/retry", response_model=OutboxEntry)
+async def retry_outbox_email(
+    outbox_id: str,
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """把一封 dead 邮件重新放回发件箱，由投递器重新发送"""
+    row = await requeue_dead(db, outbox_id)
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="邮件不存在或不是 dead 状态"
+        )
+    return row
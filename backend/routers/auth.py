@@ -1,19 +1,37 @@
+from typing import Optional
+
+import pytz
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from models import User
-from schemas import UserRegister, UserLogin, AuthResponse, UserResponse
-from auth import get_password_hash, verify_password, create_access_token
+from schemas import UserRegister, UserLogin, AuthResponse, UserResponse, UserUpdate
+from auth import get_password_hash, verify_password, create_access_token, get_current_user
 
 router = APIRouter(prefix="/api/auth", tags=["认证"])
 
 
+def _validate_timezone(tz_name: Optional[str]) -> Optional[str]:
+    """校验 IANA 时区名，空值表示使用默认时区"""
+    if not tz_name:
+        return None
+    try:
+        return pytz.timezone(tz_name).zone
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的时区: {tz_name}"
+        )
+
+
 @router.post("/register", response_model=AuthResponse)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """用户注册"""
     # 检查邮箱是否已存在
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -23,12 +41,14 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
     # 创建新用户
     user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
-        name=user_data.name
+        # bcrypt 是 CPU 密集的（约几百毫秒），放到线程池，不阻塞事件循环
+        password_hash=await run_in_threadpool(get_password_hash, user_data.password),
+        name=user_data.name,
+        timezone=_validate_timezone(user_data.timezone)
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # 生成 token
     token = create_access_token(user.id)
@@ -38,16 +58,17 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         user=UserResponse(
             id=user.id,
             email=user.email,
-            name=user.name
+            name=user.name,
+            timezone=user.timezone
         )
     )
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     """用户登录"""
     # 查找用户
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = await db.scalar(select(User).where(User.email == user_data.email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,7 +76,7 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         )
     
     # 验证密码
-    if not verify_password(user_data.password, user.password_hash):
+    if not await run_in_threadpool(verify_password, user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="邮箱或密码错误"
@@ -69,6 +90,29 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
         user=UserResponse(
             id=user.id,
             email=user.email,
-            name=user.name
+            name=user.name,
+            timezone=user.timezone
         )
     )
+
+
+@router.get("/me", response_model=UserResponse)
+async def get_me(current_user: User = Depends(get_current_user)):
+    """获取当前用户信息"""
+    return current_user
+
+
+@router.patch("/me", response_model=UserResponse)
+async def update_me(
+    user_data: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """更新当前用户信息（名称、时区；日报在用户当地时间早上发送）"""
+    if user_data.name is not None:
+        current_user.name = user_data.name
+    if user_data.timezone is not None:
+        current_user.timezone = _validate_timezone(user_data.timezone)
+    await db.commit()
+    await db.refresh(current_user)
+    return current_user
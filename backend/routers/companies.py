@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
 
 from database import get_db
@@ -65,7 +67,7 @@ STOCK_DATA = {
 
 
 @router.get("/companies/search", response_model=List[CompanySearchResult])
-def search_companies(
+async def search_companies(
     q: str = Query(..., min_length=1, description="搜索关键词"),
     current_user: User = Depends(get_current_user)
 ):
@@ -87,14 +89,18 @@ def search_companies(
 
 
 @router.get("/user/companies", response_model=List[UserCompanyResponse])
-def get_user_companies(
+async def get_user_companies(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """获取用户关注的公司列表"""
-    user_companies = db.query(UserCompany).filter(
-        UserCompany.user_id == current_user.id
-    ).all()
+    user_companies = (await db.scalars(
+        select(UserCompany).options(
+            joinedload(UserCompany.company)
+        ).where(
+            UserCompany.user_id == current_user.id
+        )
+    )).all()
     
     result = []
     for uc in user_companies:
@@ -111,16 +117,16 @@ def get_user_companies(
 
 
 @router.post("/user/companies", response_model=UserCompanyResponse)
-def add_company(
+async def add_company(
     company_data: CompanyCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """添加关注公司"""
     ticker = company_data.ticker.upper()
     
     # 查找或创建公司
-    company = db.query(Company).filter(Company.ticker == ticker).first()
+    company = await db.scalar(select(Company).where(Company.ticker == ticker))
     if not company:
         company = Company(
             ticker=ticker,
@@ -128,14 +134,14 @@ def add_company(
             industry=company_data.industry
         )
         db.add(company)
-        db.commit()
-        db.refresh(company)
+        await db.commit()
+        await db.refresh(company)
     
     # 检查是否已关注
-    existing = db.query(UserCompany).filter(
+    existing = await db.scalar(select(UserCompany).where(
         UserCompany.user_id == current_user.id,
         UserCompany.company_id == company.id
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -149,8 +155,8 @@ def add_company(
         company_id=company.id
     )
     db.add(user_company)
-    db.commit()
-    db.refresh(user_company)
+    await db.commit()
+    await db.refresh(user_company)
     
     return UserCompanyResponse(
         id=company.id,
@@ -162,16 +168,16 @@ def add_company(
 
 
 @router.delete("/user/companies/{company_id}")
-def remove_company(
+async def remove_company(
     company_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """取消关注公司"""
-    user_company = db.query(UserCompany).filter(
+    user_company = await db.scalar(select(UserCompany).where(
         UserCompany.user_id == current_user.id,
         UserCompany.company_id == company_id
-    ).first()
+    ))
     
     if not user_company:
         raise HTTPException(
@@ -179,7 +185,7 @@ def remove_company(
             detail="未找到该关注记录"
         )
     
-    db.delete(user_company)
-    db.commit()
+    await db.delete(user_company)
+    await db.commit()
     
     return {"message": "已取消关注"}
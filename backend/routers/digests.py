@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Set
 import asyncio
+import pytz
 
 from database import get_db
 from models import User, UserCompany, DailyDigest
@@ -12,58 +16,51 @@ from services.news_collector import news_collector
 from services.ai_summarizer import ai_summarizer
 from services.email_sender import email_sender
 from config import settings
+from services.ai_usage import attribute
+from services.tracing import span
+from services.ticker_digests import cached_tickers, compute_once, load_ticker_digests, store_ticker_digests
 
 router = APIRouter(prefix="/api/digests", tags=["日报"])
 
 
-async def generate_digest_for_user(user: User, db: Session) -> dict:
-    """为用户生成日报内容（过去的一天的新闻）"""
-    
-    # 获取用户关注的公司
-    user_companies = db.query(UserCompany).filter(
-        UserCompany.user_id == user.id
-    ).all()
-    
-    if not user_companies:
-        return {
-            "company_news": {},
-            "industry_news": [],
-            "generated_at": datetime.utcnow().isoformat()
-        }
-    
-    # 提取公司信息
-    tickers = [uc.company.ticker for uc in user_companies]
-    names = [uc.company.name for uc in user_companies]
-    
-    # 目标日期（前一天，按天）
-    target_date, tz_name = news_collector._get_target_date(None)  # noqa: SLF001
+async def summarize_tickers(
+    tickers: List[str],
+    ticker_to_name: Dict[str, str],
+    target_date: str,
+    tz_name: Optional[str] = None,
+) -> tuple[Dict[str, dict], Set[str]]:
+    """
+    收集并总结一批公司在 target_date 的新闻。
+    返回 ({ticker: 日报条目}, 不宜缓存的 ticker 集合)。
+    摘要失败、或没有搜到新闻（也可能是搜索服务暂时失败）的结果不写入缓存，发送阶段会重新尝试。
+    """
+    names = [ticker_to_name.get(t, t) for t in tickers]
 
-    # 收集公司新闻（前一天）
-    company_news_raw = await news_collector.collect_company_news(tickers, names, max_results_per_company=30)
-    
-    # 为每个公司生成摘要
-    company_news: Dict[str, List[dict]] = {}
+    # 收集公司新闻（前一天）；AI 调用台账按目标日期归属，容量规划据此估算每个 ticker 的耗时
+    with attribute(target_date=target_date):
+        company_news_raw = await news_collector.collect_company_news(
+            tickers, names, user_timezone=tz_name, max_results_per_company=30, target_date=target_date
+        )
 
     # 并行生成摘要（限流）
     max_concurrency = max(1, int(getattr(settings, "MAX_CONCURRENT_AI_REQUESTS", 3)))
     sem = asyncio.Semaphore(max_concurrency)
-
-    # 便于查公司名
-    ticker_to_name = {uc.company.ticker: uc.company.name for uc in user_companies}
+    uncacheable: Set[str] = set()
 
     async def _summarize_one(ticker: str, news_items: list[dict]) -> tuple[str, dict]:
         """为单个公司生成摘要。即使没有新闻也返回结果（不丢弃公司）。"""
         company_name = ticker_to_name.get(ticker, ticker)
-        
+    
         # 即使没有新闻，也不丢弃公司，而是返回"今日无重大新闻"
         if not news_items:
+            uncacheable.add(ticker)
             return ticker, {
                 "title": f"{company_name} 新闻摘要",
                 "summary": f"**{target_date}** 未搜索到关于 **{company_name} ({ticker})** 的重大新闻。这可能意味着：\n\n1. 该公司当日没有重要的公开新闻发布\n2. 新闻尚未被索引或搜索服务暂时不可用\n\n建议关注公司官网或财经新闻网站获取最新信息。",
                 "source": "AI 摘要",
                 "items": [],
             }
-        
+    
         async with sem:
             try:
                 summary = await ai_summarizer.generate_company_news_summary_with_references(
@@ -81,6 +78,7 @@ async def generate_digest_for_user(user: User, db: Session) -> dict:
                 }
             except Exception as e:
                 # 单个失败不影响其他公司
+                uncacheable.add(ticker)
                 return ticker, {
                     "title": f"{company_name} 新闻摘要",
                     "summary": f"{target_date} 关于 {company_name} 的摘要生成失败：{str(e)}",
@@ -88,61 +86,146 @@ async def generate_digest_for_user(user: User, db: Session) -> dict:
                     "items": news_items[: min(len(news_items), 30)],
                 }
 
-    # 确保所有用户关注的公司都有任务（即使 company_news_raw 中没有该公司的数据）
-    all_tickers_set = set(tickers)
-    for t in all_tickers_set:
+    # 确保所有公司都有任务（即使 company_news_raw 中没有该公司的数据）
+    for t in tickers:
         if t not in company_news_raw:
             company_news_raw[t] = []  # 确保每个公司都有条目
+
+    with attribute(target_date=target_date):
+        tasks = [_summarize_one(t, items) for t, items in company_news_raw.items()]
+        results = await asyncio.gather(*tasks, return_exceptions=False)
+    return dict(results), uncacheable
+
+
+async def generate_digest_for_user(
+    user: User,
+    db: AsyncSession,
+    target_date: Optional[str] = None,
+    uncacheable: Optional[Set[str]] = None,
+) -> dict:
+    """
+    为用户生成日报内容（过去的一天的新闻）。
+    优先使用预取阶段缓存的 ticker 摘要（ticker_digests），只对未命中的 ticker 现场检索和总结。
+    传入 uncacheable 时，把没能写入缓存的 ticker（摘要生成失败、没有搜到新闻）加进去，
+    这些公司在日报里是占位提示，调用方可据此不保存、稍后重试。
+    """
+    with span("digest.generate", user_id=user.id) as sp, attribute(user_id=user.id):
+        # 获取用户关注的公司
+        # 一次查询带出关注公司（避免每个 uc.company 再懒加载一次）
+        user_companies = (await db.scalars(
+            select(UserCompany).options(
+                joinedload(UserCompany.company)
+            ).where(
+                UserCompany.user_id == user.id
+            )
+        )).all()
+    
+        if not user_companies:
+            return {
+                "company_news": {},
+                "industry_news": [],
+                "generated_at": datetime.utcnow().isoformat()
+            }
+    
+        # 提取公司信息
+        tickers = [uc.company.ticker for uc in user_companies]
+        sp.set_attribute("tickers", len(tickers))
     
-    tasks = [_summarize_one(t, items) for t, items in company_news_raw.items()]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    for r in results:
-        if r is None:
-            continue
-        ticker, obj = r
-        company_news[ticker] = [obj]
+        # 目标日期（前一天，按天）
+        # 按用户时区取“前一天”；指定 target_date 时（定时任务/预取）直接使用
+        default_date, tz_name = news_collector._get_target_date(user.timezone or settings.DAILY_EMAIL_TIMEZONE)  # noqa: SLF001
+        target_date = target_date or default_date
+
+        # 便于查公司名
+        ticker_to_name = {uc.company.ticker: uc.company.name for uc in user_companies}
+
+        entries = await load_ticker_digests(db, tickers, target_date)
+        missing = [t for t in tickers if t not in entries]
+        sp.set_attribute("cache_hits", len(entries))
+        if missing:
+            async def _compute(owned: List[str]) -> Dict[str, dict]:
+                fresh, uncacheable = await summarize_tickers(owned, ticker_to_name, target_date, tz_name)
+                await store_ticker_digests(db, target_date, {t: e for t, e in fresh.items() if t not in uncacheable})
+                return fresh
+
+            # 其他用户正在生成的同一 ticker 直接等结果，不重复检索/总结
+            entries.update(await compute_once(missing, target_date, _compute))
+            if uncacheable is not None:
+                # 等别的协程算出来的 ticker 拿不到它的 uncacheable，按是否已写入缓存判断
+                uncacheable.update(set(missing) - await cached_tickers(db, missing, target_date))
+
+        company_news: Dict[str, List[dict]] = {t: [entries[t]] for t in tickers if t in entries}
     
-    return {
-        "company_news": company_news,
-        "industry_news": [],  # 行业新闻已融合进公司摘要（按需求取消独立板块）
-        "generated_at": datetime.utcnow().isoformat()
-    }
+        return {
+            "company_news": company_news,
+            "industry_news": [],  # 行业新闻已融合进公司摘要（按需求取消独立板块）
+            "generated_at": datetime.utcnow().isoformat()
+        }
+
+
+def user_today(user: User) -> date:
+    """用户当地的“今天”（与定时任务 digest_jobs.date 一致）"""
+    tz_name = user.timezone or settings.DAILY_EMAIL_TIMEZONE
+    try:
+        return datetime.now(pytz.timezone(tz_name)).date()
+    except pytz.UnknownTimeZoneError:
+        return datetime.now(pytz.timezone(settings.DAILY_EMAIL_TIMEZONE)).date()
+
+
+async def save_daily_digest(
+    db: AsyncSession,
+    user_id: str,
+    day: date,
+    content: Optional[dict] = None,
+    sent_at: Optional[datetime] = None,
+) -> DailyDigest:
+    """
+    写入/更新用户某天的日报（user_id + date 唯一），只覆盖传入的字段。
+    手动生成与定时任务可能同时写同一天：插入冲突时改为更新已有行。
+    """
+    for _ in range(2):
+        digest = await db.scalar(select(DailyDigest).where(
+            DailyDigest.user_id == user_id,
+            DailyDigest.date == day
+        ))
+        if digest is None:
+            digest = DailyDigest(user_id=user_id, date=day)
+            try:
+                async with db.begin_nested():
+                    db.add(digest)
+            except IntegrityError:
+                continue
+        if content is not None:
+            digest.content = content
+        if sent_at is not None:
+            digest.sent_at = sent_at
+        await db.commit()
+        return digest
+    raise RuntimeError(f"保存日报失败: user={user_id} date={day}")
 
 
 @router.post("/generate", response_model=DigestResponse)
 async def generate_digest(
     request: GenerateDigestRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """手动生成日报（用于测试）"""
-    today = date.today()
+    """手动生成日报（用于测试）。今日日报已存在时直接复用，除非 regenerate=true"""
+    today = user_today(current_user)
     
     # 检查今日是否已有日报
-    existing_digest = db.query(DailyDigest).filter(
+    existing_digest = await db.scalar(select(DailyDigest).where(
         DailyDigest.user_id == current_user.id,
         DailyDigest.date == today
-    ).first()
+    ))
     
-    # 生成日报内容
-    content = await generate_digest_for_user(current_user, db)
-    
-    if existing_digest:
-        # 更新现有日报
-        existing_digest.content = content
-        db.commit()
-        db.refresh(existing_digest)
+    if existing_digest and existing_digest.content and not request.regenerate:
         digest = existing_digest
+        content = existing_digest.content
     else:
-        # 创建新日报
-        digest = DailyDigest(
-            user_id=current_user.id,
-            date=today,
-            content=content
-        )
-        db.add(digest)
-        db.commit()
-        db.refresh(digest)
+        # 生成日报内容
+        content = await generate_digest_for_user(current_user, db)
+        digest = await save_daily_digest(db, current_user.id, today, content=content)
     
     # 如果需要发送邮件
     if request.send_email:
@@ -153,10 +236,9 @@ async def generate_digest(
             date_str=date_str
         )
         if sent:
-            digest.sent_at = datetime.utcnow()
-            db.commit()
-            db.refresh(digest)
+            digest = await save_daily_digest(db, current_user.id, today, sent_at=datetime.utcnow())
     
+    await db.refresh(digest)
     return DigestResponse(
         id=digest.id,
         date=digest.date,
@@ -167,19 +249,19 @@ async def generate_digest(
 
 
 @router.get("/today", response_model=DigestResponse)
-def get_today_digest(
+async def get_today_digest(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """获取今日日报"""
-    today = date.today()
+    """获取今日日报（包括定时任务生成并发送的日报）"""
+    today = user_today(current_user)
     
-    digest = db.query(DailyDigest).filter(
+    digest = await db.scalar(select(DailyDigest).where(
         DailyDigest.user_id == current_user.id,
         DailyDigest.date == today
-    ).first()
+    ))
     
-    if not digest:
+    if not digest or digest.content is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="今日日报尚未生成"
@@ -195,15 +277,17 @@ def get_today_digest(
 
 
 @router.get("", response_model=List[DigestResponse])
-def get_digest_history(
+async def get_digest_history(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     limit: int = 30
 ):
     """获取历史日报列表"""
-    digests = db.query(DailyDigest).filter(
-        DailyDigest.user_id == current_user.id
-    ).order_by(DailyDigest.date.desc()).limit(limit).all()
+    digests = (await db.scalars(
+        select(DailyDigest).where(
+            DailyDigest.user_id == current_user.id
+        ).order_by(DailyDigest.date.desc()).limit(limit)
+    )).all()
     
     return [
         DigestResponse(
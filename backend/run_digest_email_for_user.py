@@ -17,7 +17,10 @@ import logging
 from datetime import datetime
 
 from config import settings
-from database import SessionLocal, Base, engine
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from database import AsyncSessionLocal, Base, engine
 from models import User, UserCompany
 from routers.digests import generate_digest_for_user
 from services.email_sender import email_sender
@@ -58,14 +61,18 @@ async def main():
     Base.metadata.create_all(bind=engine)
 
     print(f"\n目标用户邮箱: {target_email}")
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     try:
-        user = db.query(User).filter(User.email == target_email).first()
+        user = await db.scalar(select(User).where(User.email == target_email))
         if not user:
             print(f"\n错误: 数据库中未找到用户 {target_email}（请先注册）")
             return
 
-        user_companies = db.query(UserCompany).filter(UserCompany.user_id == user.id).all()
+        user_companies = (await db.scalars(
+            select(UserCompany)
+            .options(joinedload(UserCompany.company))
+            .where(UserCompany.user_id == user.id)
+        )).all()
         if not user_companies:
             print(f"\n错误: 用户 {target_email} 尚未关注任何公司（请先添加关注）")
             return
@@ -133,7 +140,7 @@ async def main():
         else:
             print("\n❌ 邮件发送失败（请检查 SMTP 配置/日志）。")
     finally:
-        db.close()
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 from datetime import datetime, date
 
 
@@ -9,6 +9,7 @@ class UserRegister(BaseModel):
     email: EmailStr
     password: str
     name: Optional[str] = None
+    timezone: Optional[str] = None  # IANA 时区名，如 "Asia/Shanghai"
 
 
 class UserLogin(BaseModel):
@@ -20,11 +21,17 @@ class UserResponse(BaseModel):
     id: str
     email: str
     name: Optional[str] = None
+    timezone: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+    timezone: Optional[str] = None
+
+
 class AuthResponse(BaseModel):
     token: str
     user: UserResponse
@@ -102,3 +109,74 @@ class DigestResponse(BaseModel):
 
 class GenerateDigestRequest(BaseModel):
     send_email: bool = False
+    regenerate: bool = False  # 今日日报已存在时是否重新生成
+
+
+# ============ Admin Schemas ============
+
+class AIUsageRow(BaseModel):
+    day: Optional[date] = None
+    stage: Optional[str] = None
+    ticker: Optional[str] = None
+    calls: int
+    failures: int
+    tokens_in: int
+    tokens_out: int
+    avg_latency_ms: float
+    max_latency_ms: int
+    total_latency_s: float
+    estimated_cost: float
+
+
+class CapacityLatencies(BaseModel):
+    ticker_seconds: float
+    ticker_samples: int
+    send_seconds: float
+    send_samples: int
+
+
+class CapacitySlot(BaseModel):
+    timezone: str
+    send_at: datetime
+    target_date: date
+    users: int
+    tickers: int
+    tickers_cached: int
+    prefetch_minutes: float
+    send_minutes: float
+    prefetch_lead_minutes: int
+    prefetch_start_at: Optional[datetime] = None
+    delivered_by: datetime
+    warnings: List[str]
+
+
+class CapacityPlan(BaseModel):
+    generated_at: datetime
+    latencies: CapacityLatencies
+    ai_concurrency: int
+    send_concurrency: int
+    safety_factor: float
+    slots: List[CapacitySlot]
+    warnings: List[str]
+
+
+class OutboxEntry(BaseModel):
+    id: str
+    to_email: str
+    provider: str
+    digest_date: Optional[date] = None
+    state: str
+    attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OutboxStatus(BaseModel):
+    counts: Dict[str, int]
+    dead: List[OutboxEntry]
@@ -1,11 +1,22 @@
 import httpx
 from typing import List, Dict, Any
 import logging
+import re
+import time
 
 from config import settings
+from metrics import SUMMARY_CITATION_RETRIES, SUMMARY_REQUESTS, SUMMARY_SECONDS
+from services.ai_usage import track_ai_call
+from services.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# 摘要中的引用标注，如 [1] [12]
+_CITATION_RE = re.compile(r"\[\d{1,3}\]")
+
+# 模型有时会加的礼貌语/说明语前缀
+_CHINESE_PREFIXES = ("好的，这是为您生成的摘要：", "好的，这是摘要：", "以下是摘要：", "摘要：", "总结：")
+
 
 class AISummarizer:
     """AI 摘要服务 - 使用 AI Builder Chat API"""
@@ -17,6 +28,17 @@ class AISummarizer:
             "Content-Type": "application/json"
         }
     
+    def _clean_response(self, content: str) -> str:
+        """移除模型输出中的思考过程标记与常见中文前缀（保留 [1] 这种引用标注）。"""
+        if "Here's my thinking" in content:
+            parts = content.split("Final answer:")
+            content = parts[-1].strip() if len(parts) > 1 else content.strip()
+        content = content.replace("Here's my thinking process", "").replace("Here's my thinking", "").strip()
+        for p in _CHINESE_PREFIXES:
+            if content.startswith(p):
+                content = content[len(p):].strip()
+        return content
+
     async def summarize_news(self, news_items: List[Dict[str, Any]], company_name: str) -> str:
         """
         生成新闻摘要
@@ -45,18 +67,20 @@ class AISummarizer:
 
         try:
             async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json={
-                        "model": "supermind-agent-v1",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 500,
-                        "temperature": 0.7
-                    }
-                )
+                with track_ai_call("summary_legacy") as call:
+                    response = await client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json={
+                            "model": "supermind-agent-v1",
+                            "messages": [
+                                {"role": "user", "content": prompt}
+                            ],
+                            "max_tokens": 500,
+                            "temperature": 0.7
+                        }
+                    )
+                    call.set_response(response)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -148,16 +172,18 @@ class AISummarizer:
 
         try:
             async with httpx.AsyncClient(timeout=90.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json={
-                        "model": "supermind-agent-v1",
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 500,
-                        "temperature": 0.4,
-                    },
-                )
+                with track_ai_call("digest_summary", ticker=ticker) as call:
+                    response = await client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json={
+                            "model": "supermind-agent-v1",
+                            "messages": [{"role": "user", "content": prompt}],
+                            "max_tokens": 500,
+                            "temperature": 0.4,
+                        },
+                    )
+                    call.set_response(response)
 
                 if response.status_code != 200:
                     logger.error(f"融合公司摘要失败: {response.status_code}")
@@ -167,17 +193,7 @@ class AISummarizer:
                 content = data["choices"][0]["message"]["content"].strip()
 
                 # 复用已有清理逻辑（思考过程/前缀）
-                if "Here's my thinking" in content or "Here's my thinking process" in content:
-                    parts = content.split("Final answer:")
-                    content = parts[-1].strip() if len(parts) > 1 else content.strip()
-
-                content = content.replace("Here's my thinking process", "").replace("Here's my thinking", "").strip()
-                chinese_prefixes = ["好的，这是为您生成的摘要：", "好的，这是摘要：", "以下是摘要：", "摘要：", "总结："]
-                for p in chinese_prefixes:
-                    if content.startswith(p):
-                        content = content[len(p):].strip()
-
-                return content
+                return self._clean_response(content)
         except Exception as e:
             logger.error(f"融合公司摘要时出错: {str(e)}")
             return f"{target_date} 关于 {company_name} 有新闻更新。"
@@ -222,38 +238,34 @@ class AISummarizer:
 新闻清单（仅供引用）：
 {chr(10).join(lines)}
 """
-        async def call_once(prompt_text: str, *, temperature: float) -> str:
-            async with httpx.AsyncClient(timeout=90.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json={
-                        "model": "supermind-agent-v1",
-                        "messages": [{"role": "user", "content": prompt_text}],
-                        "max_tokens": 650,
-                        "temperature": temperature,
-                    },
-                )
-                if response.status_code != 200:
-                    raise RuntimeError(f"summary request failed: {response.status_code}")
-                data = response.json()
-                content = (data["choices"][0]["message"]["content"] or "").strip()
-
-                # 清理（保留 [1] 这种引用标注）
-                if "Here's my thinking" in content or "Here's my thinking process" in content:
-                    parts = content.split("Final answer:")
-                    content = parts[-1].strip() if len(parts) > 1 else content.strip()
-                content = content.replace("Here's my thinking process", "").replace("Here's my thinking", "").strip()
-                chinese_prefixes = ["好的，这是为您生成的摘要：", "好的，这是摘要：", "以下是摘要：", "摘要：", "总结："]
-                for p in chinese_prefixes:
-                    if content.startswith(p):
-                        content = content[len(p):].strip()
-                return content
+        async def call_once(prompt_text: str, *, temperature: float, attempt: int = 1) -> str:
+            with span("summary.call", ticker=ticker, items=len(items), temperature=temperature):
+                async with httpx.AsyncClient(timeout=90.0) as client:
+                    with track_ai_call("summary", ticker=ticker, attempt=attempt) as call:
+                        response = await client.post(
+                            self.api_url,
+                            headers=self.headers,
+                            json={
+                                "model": "supermind-agent-v1",
+                                "messages": [{"role": "user", "content": prompt_text}],
+                                "max_tokens": 650,
+                                "temperature": temperature,
+                            },
+                        )
+                        call.set_response(response)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"summary request failed: {response.status_code}")
+                    data = response.json()
+                    content = (data["choices"][0]["message"]["content"] or "").strip()
+
+                    # 清理（保留 [1] 这种引用标注）
+                    return self._clean_response(content)
 
         def has_citations(text: str) -> bool:
-            import re
-            return bool(re.search(r"\[\d{1,3}\]", text or ""))
+            return bool(_CITATION_RE.search(text or ""))
 
+        SUMMARY_REQUESTS.inc()
+        started = time.perf_counter()
         try:
             content = await call_once(build_prompt(), temperature=0.4)
 
@@ -263,7 +275,8 @@ class AISummarizer:
                     "7) 必须从清单中挑出至少 2 条最具体的“事件/进展”（例如诉讼/监管/供应链/产品计划/安全事件），分别点出影响并引用。\n"
                     "8) 每句话都必须包含引用编号；不要输出“没有显著公司事件”。"
                 )
-                content = await call_once(build_prompt(extra_rules=retry_rules), temperature=0.2)
+                SUMMARY_CITATION_RETRIES.inc()
+                content = await call_once(build_prompt(extra_rules=retry_rules), temperature=0.2, attempt=2)
 
             # 最后兜底：如果仍无引用，则用标题做一个安全摘要（保证不空泛）
             if not has_citations(content):
@@ -272,9 +285,11 @@ class AISummarizer:
                 parts = [p for p in [t1, t2] if p]
                 if parts:
                     content = f"{target_date} 相关新闻主要包括：{parts[0]}[1]" + (f"；以及 {parts[1]}[2]" if len(parts) > 1 else "。")
+            SUMMARY_SECONDS.labels(outcome="ok").observe(time.perf_counter() - started)
             return content
         except Exception as e:
             logger.error(f"公司摘要(引用)时出错: {str(e)}")
+            SUMMARY_SECONDS.labels(outcome="failed").observe(time.perf_counter() - started)
             return f"{target_date} 关于 {company_name} 有新闻更新。"
     
     async def generate_industry_summary(self, industry: str, news_items: List[Dict[str, Any]], related_companies: List[str] = None) -> str:
@@ -316,18 +331,20 @@ class AISummarizer:
 
         try:
             async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json={
-                        "model": "supermind-agent-v1",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 500,
-                        "temperature": 0.7
-                    }
-                )
+                with track_ai_call("industry_summary") as call:
+                    response = await client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json={
+                            "model": "supermind-agent-v1",
+                            "messages": [
+                                {"role": "user", "content": prompt}
+                            ],
+                            "max_tokens": 500,
+                            "temperature": 0.7
+                        }
+                    )
+                    call.set_response(response)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -409,18 +426,20 @@ class AISummarizer:
 
         try:
             async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json={
-                        "model": "supermind-agent-v1",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 200,
-                        "temperature": 0.3  # 降低温度以获得更一致的结果
-                    }
-                )
+                with track_ai_call("classify", ticker=ticker) as call:
+                    response = await client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json={
+                            "model": "supermind-agent-v1",
+                            "messages": [
+                                {"role": "user", "content": prompt}
+                            ],
+                            "max_tokens": 200,
+                            "temperature": 0.3  # 降低温度以获得更一致的结果
+                        }
+                    )
+                    call.set_response(response)
                 
                 if response.status_code == 200:
                     data = response.json()
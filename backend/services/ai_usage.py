@@ -0,0 +1,161 @@
+"""
+AI 调用台账：记录每一次 AI Builder 调用的阶段、ticker、用户、token、耗时、第几次尝试与结果。
+
+- 归属（user_id / ticker / target_date / source）通过 contextvars 传递：在外层用 attribute(user_id=...) 包一下，
+  asyncio.gather 出来的子任务会自动继承。
+- 记录先进内存缓冲，按条数/时间批量写入 ai_calls 表，避免每次调用都打一次数据库。
+  缓冲满时在当前事件循环上起一个后台任务写入，记录调用的代码不用等数据库。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_attribution: ContextVar[Dict[str, Optional[str]]] = ContextVar("stockdaily_ai_attribution", default={})
+
+_buffer: List[Dict[str, Any]] = []
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+# 后台写入任务（保留引用，避免任务未完成就被回收）
+_flush_tasks: Set[asyncio.Task] = set()
+
+# 缓冲达到这么多条，或距上次写入超过这么多秒，就落库
+_FLUSH_SIZE = 50
+_FLUSH_INTERVAL_S = 10.0
+
+
+@contextmanager
+def attribute(**kwargs: Optional[str]) -> Iterator[None]:
+    """在代码块内为 AI 调用标注 user_id / ticker / target_date（ISO 日期）/ source（与外层标注合并）。"""
+    token = _attribution.set({**_attribution.get(), **kwargs})
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+class AICallRecord:
+    """一次 AI 调用的记录；由 track_ai_call 创建，调用方拿到 response 后调用 set_response。"""
+
+    __slots__ = ("stage", "ticker", "user_id", "target_date", "source", "attempt", "tokens_in", "tokens_out", "outcome")
+
+    def __init__(
+        self,
+        stage: str,
+        ticker: Optional[str],
+        user_id: Optional[str],
+        attempt: int,
+        target_date: Optional[str] = None,
+        source: Optional[str] = None,
+    ):
+        self.stage = stage
+        self.ticker = ticker
+        self.user_id = user_id
+        self.target_date = target_date
+        self.source = source
+        self.attempt = attempt
+        self.tokens_in: Optional[int] = None
+        self.tokens_out: Optional[int] = None
+        self.outcome = "ok"
+
+    def set_response(self, response: httpx.Response) -> None:
+        if response.status_code != 200:
+            self.outcome = "http_error"
+            return
+        try:
+            usage = response.json().get("usage") or {}
+        except ValueError:
+            return
+        self.tokens_in = usage.get("prompt_tokens")
+        self.tokens_out = usage.get("completion_tokens")
+
+
+@contextmanager
+def track_ai_call(stage: str, *, ticker: Optional[str] = None, attempt: int = 1) -> Iterator[AICallRecord]:
+    """
+    记录一次 AI 调用：
+
+        with track_ai_call("search", attempt=attempt + 1) as call:
+            response = await client.post(...)
+            call.set_response(response)
+    """
+    ctx = _attribution.get()
+    record = AICallRecord(
+        stage, ticker or ctx.get("ticker"), ctx.get("user_id"), attempt,
+        target_date=ctx.get("target_date"), source=ctx.get("source"),
+    )
+    start = time.perf_counter()
+    try:
+        yield record
+    except httpx.TimeoutException:
+        record.outcome = "timeout"
+        raise
+    except BaseException:
+        record.outcome = "error"
+        raise
+    finally:
+        if settings.ENABLE_AI_USAGE_LEDGER:
+            _enqueue(record, time.perf_counter() - start)
+
+
+def _enqueue(record: AICallRecord, latency_s: float) -> None:
+    row = {
+        "created_at": datetime.utcnow(),
+        "stage": record.stage,
+        "ticker": record.ticker,
+        "user_id": record.user_id,
+        "target_date": date.fromisoformat(record.target_date) if record.target_date else None,
+        "source": record.source,
+        "tokens_in": record.tokens_in,
+        "tokens_out": record.tokens_out,
+        "latency_ms": int(latency_s * 1000),
+        "attempt": record.attempt,
+        "outcome": record.outcome,
+    }
+    with _buffer_lock:
+        _buffer.append(row)
+        due = len(_buffer) >= _FLUSH_SIZE or (time.monotonic() - _last_flush) >= _FLUSH_INTERVAL_S
+    if due:
+        try:
+            task = asyncio.get_running_loop().create_task(flush_ai_usage())
+        except RuntimeError:
+            return  # 不在事件循环里：留在缓冲中，下一次 flush 时写入
+        _flush_tasks.add(task)
+        task.add_done_callback(_flush_tasks.discard)
+
+
+async def flush_ai_usage() -> int:
+    """把缓冲中的记录写入 ai_calls 表，返回写入条数。写入失败只记日志，不影响业务。"""
+    global _last_flush
+    with _buffer_lock:
+        rows = list(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not rows:
+        return 0
+
+    from sqlalchemy import insert
+
+    from database import AsyncSessionLocal
+    from models import AICall
+
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(insert(AICall), rows)
+            await db.commit()
+            return len(rows)
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"[ai_usage] 写入 {len(rows)} 条 AI 调用记录失败: {e}")
+            return 0
@@ -0,0 +1,179 @@
+"""
+容量规划：根据最近的实测耗时和当前关注数，估算下一次日报每个时区槽位的预取、发送各需要多久。
+
+- 每个 ticker 的检索 + 总结耗时：ai_calls 台账里按 (ticker, 目标日期) 汇总的 AI 调用耗时，除以计算次数后取平均
+  （发送阶段重算未缓存的 ticker 会产生多次计算；历史回填的调用不计入）
+- 每个用户的发送耗时：digest_jobs.send_ms 与 email_outbox.send_ms（SMTP 发送耗时）的平均值
+- 没有历史数据时使用保守的默认值
+估算值乘以 CAPACITY_SAFETY_FACTOR。预取估算超过 DIGEST_PREFETCH_LEAD_MINUTES 时，调度器自动提前该槽位的预取
+（DIGEST_PREFETCH_AUTO_ADVANCE），仍来不及或发送超出 DIGEST_DELIVERY_WINDOW_MINUTES 时产生告警，
+写日志并通过 GET /api/admin/capacity 查看。
+
+注意：目标日期相同的槽位共用 ticker 缓存，各槽位单独估算时会重复计入共同关注的 ticker，结果偏保守。
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from metrics import CAPACITY_ESTIMATE_SECONDS, CAPACITY_WARNINGS
+from models import AICall, DigestJob, EmailOutbox, TickerDigest, User, UserCompany
+from services.digest_jobs import next_send_at, timezone_slots, user_timezone_clause
+from services.digest_prefetch import followed_tickers
+
+# 没有历史数据时的默认耗时（秒）
+_DEFAULT_TICKER_SECONDS = 90.0
+_DEFAULT_SEND_SECONDS = 2.0
+
+
+async def recorded_latencies(db: AsyncSession) -> Dict[str, float]:
+    """最近 CAPACITY_LOOKBACK_DAYS 天的实测耗时：每个 ticker 每次计算的 AI 耗时、每封邮件的 SMTP 耗时。"""
+    since = datetime.utcnow() - timedelta(days=max(1, settings.CAPACITY_LOOKBACK_DAYS))
+
+    # 每次计算一个 ticker 恰好有一次首次检索（search, attempt=1），用它的次数把同一 (ticker, 目标日期) 的耗时摊成单次
+    computations = func.sum(case((and_(AICall.stage == "search", AICall.attempt == 1), 1), else_=0))
+    per_ticker_day = (
+        select((func.sum(AICall.latency_ms) / case((computations > 0, computations), else_=1)).label("ms"))
+        .where(
+            AICall.ticker.isnot(None),
+            AICall.target_date.isnot(None),
+            or_(AICall.source.is_(None), AICall.source != "backfill"),
+            AICall.created_at >= since,
+        )
+        .group_by(AICall.ticker, AICall.target_date)
+        .subquery()
+    )
+    ticker_ms, ticker_samples = (await db.execute(
+        select(func.avg(per_ticker_day.c.ms), func.count())
+    )).one()
+    job_ms, job_samples = (await db.execute(
+        select(func.avg(DigestJob.send_ms), func.count(DigestJob.send_ms))
+        .where(DigestJob.send_ms.isnot(None), DigestJob.sent_at >= since)
+    )).one()
+    outbox_ms, outbox_samples = (await db.execute(
+        select(func.avg(EmailOutbox.send_ms), func.count(EmailOutbox.send_ms))
+        .where(EmailOutbox.send_ms.isnot(None), EmailOutbox.sent_at >= since)
+    )).one()
+    # 直接发送与发件箱投递按样本数加权
+    send_samples = (job_samples or 0) + (outbox_samples or 0)
+    send_ms = (
+        ((job_ms or 0) * (job_samples or 0) + (outbox_ms or 0) * (outbox_samples or 0)) / send_samples
+        if send_samples
+        else None
+    )
+
+    return {
+        "ticker_seconds": round(float(ticker_ms) / 1000, 2) if ticker_samples else _DEFAULT_TICKER_SECONDS,
+        "ticker_samples": int(ticker_samples or 0),
+        "send_seconds": round(float(send_ms) / 1000, 3) if send_samples else _DEFAULT_SEND_SECONDS,
+        "send_samples": int(send_samples or 0),
+    }
+
+
+async def _count_slot_users(db: AsyncSession, tz_name: str) -> int:
+    """tz_name 槽位里至少关注了一家公司的用户数（没有关注的用户不会收到日报）。"""
+    return (await db.scalar(
+        select(func.count(func.distinct(UserCompany.user_id)))
+        .join(User, User.id == UserCompany.user_id)
+        .where(user_timezone_clause(tz_name))
+    )) or 0
+
+
+async def _count_cached(db: AsyncSession, tickers: List[str], target_date: date) -> int:
+    if not tickers:
+        return 0
+    return (await db.scalar(
+        select(func.count(TickerDigest.id))
+        .where(TickerDigest.target_date == target_date, TickerDigest.ticker.in_(tickers))
+    )) or 0
+
+
+def send_concurrency() -> int:
+    """发送阶段同时处理的用户数（queue 模式下乘以 worker 进程数）。"""
+    per_process = max(1, settings.DIGEST_USER_CONCURRENCY)
+    if settings.DIGEST_WORKER_MODE.lower() == "queue":
+        return per_process * max(1, settings.DIGEST_WORKER_PROCESSES)
+    return per_process
+
+
+async def plan_slot(db: AsyncSession, tz_name: str, now_utc: datetime, latencies: Dict[str, float]) -> dict:
+    """估算 tz_name 槽位下一次发送的预取/发送耗时，给出实际使用的预取提前量和告警。"""
+    safety = max(1.0, settings.CAPACITY_SAFETY_FACTOR)
+    ai_concurrency = max(1, settings.MAX_CONCURRENT_AI_REQUESTS)
+    concurrency = send_concurrency()
+
+    send_at = next_send_at(now_utc.astimezone(pytz.timezone(tz_name)))
+    target_date = send_at.date() - timedelta(days=1)
+    tickers = [t for t, _ in await followed_tickers(db, tz_name)]
+    cached = await _count_cached(db, tickers, target_date)
+    users = await _count_slot_users(db, tz_name)
+
+    # 预取按批进行，批内检索和总结都受 MAX_CONCURRENT_AI_REQUESTS 限流
+    prefetch_s = (len(tickers) - cached) * latencies["ticker_seconds"] / ai_concurrency * safety
+    send_s = users * latencies["send_seconds"] / concurrency * safety
+
+    warnings: List[str] = []
+    configured = max(0, settings.DIGEST_PREFETCH_LEAD_MINUTES)
+    needed = math.ceil(prefetch_s / 60)
+    lead = configured
+    if configured == 0:
+        # 不预取：ticker 在发送阶段现场生成，耗时算进发送
+        send_s += prefetch_s
+    elif needed > configured:
+        if settings.DIGEST_PREFETCH_AUTO_ADVANCE:
+            lead = min(needed, max(configured, settings.DIGEST_PREFETCH_MAX_LEAD_MINUTES))
+        if needed > lead:
+            warnings.append(
+                f"{tz_name}: 预取预计需要 {needed} 分钟，超过提前量 {lead} 分钟，"
+                f"未完成的 ticker 将在发送时现场生成"
+            )
+
+    window_s = max(1, settings.DIGEST_DELIVERY_WINDOW_MINUTES) * 60
+    if send_s > window_s:
+        required = math.ceil(send_s * concurrency / window_s)
+        warnings.append(
+            f"{tz_name}: 发送预计需要 {math.ceil(send_s / 60)} 分钟，超过 {settings.DIGEST_DELIVERY_WINDOW_MINUTES} "
+            f"分钟的发送窗口，需要约 {required} 个并发（当前 {concurrency}）"
+        )
+
+    return {
+        "timezone": tz_name,
+        "send_at": send_at,
+        "target_date": target_date,
+        "users": users,
+        "tickers": len(tickers),
+        "tickers_cached": cached,
+        "prefetch_minutes": round(prefetch_s / 60, 1),
+        "send_minutes": round(send_s / 60, 1),
+        "prefetch_lead_minutes": lead,
+        "prefetch_start_at": send_at - timedelta(minutes=lead) if lead else None,
+        "delivered_by": send_at + timedelta(seconds=send_s),
+        "warnings": warnings,
+    }
+
+
+async def plan_capacity(db: AsyncSession, now_utc: Optional[datetime] = None) -> dict:
+    """所有时区槽位的容量估算，同时更新 Prometheus 指标。"""
+    now_utc = now_utc or datetime.now(pytz.utc)
+    latencies = await recorded_latencies(db)
+    slots = [await plan_slot(db, tz_name, now_utc, latencies) for tz_name in await timezone_slots(db)]
+    warnings = [w for slot in slots for w in slot["warnings"]]
+
+    CAPACITY_ESTIMATE_SECONDS.labels(phase="prefetch").set(max((s["prefetch_minutes"] * 60 for s in slots), default=0))
+    CAPACITY_ESTIMATE_SECONDS.labels(phase="send").set(max((s["send_minutes"] * 60 for s in slots), default=0))
+    CAPACITY_WARNINGS.set(len(warnings))
+
+    return {
+        "generated_at": now_utc,
+        "latencies": latencies,
+        "ai_concurrency": max(1, settings.MAX_CONCURRENT_AI_REQUESTS),
+        "send_concurrency": send_concurrency(),
+        "safety_factor": max(1.0, settings.CAPACITY_SAFETY_FACTOR),
+        "slots": slots,
+        "warnings": warnings,
+    }
@@ -0,0 +1,416 @@
+"""
+持久化的日报任务队列（digest_jobs 表）。
+
+每个 (user, date) 一行，状态：pending -> collecting -> summarized -> sent；重试耗尽为 failed。
+- worker 通过“带条件的 UPDATE”抢占租约（lease），多个 worker / 进程不会同时处理同一任务
+- 处理过程中定期续租；进程崩溃后租约过期，任务会被其他 worker 重新领取
+- summarized 之后日报内容已落库，重试只重新发送邮件，不再重复检索/总结
+- sent 是终态，不会被再次领取，保证同一天不会给同一用户发两封邮件
+- 启用发件箱（EMAIL_OUTBOX_ENABLED）时 summarized 之后写入 email_outbox 并置为终态 queued，由投递器发送
+- 生成的内容和发送时间同步写入 daily_digests（/api/digests/today 读取）；当天已发送过的用户不会入队
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import pytz
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from config import settings
+from database import AsyncSessionLocal
+from metrics import DB_SESSION_SECONDS, SCHEDULER_USERS_PROCESSED, observe_seconds
+from models import DailyDigest, DigestJob, User, generate_uuid
+from routers.digests import generate_digest_for_user, save_daily_digest
+from services.ai_usage import flush_ai_usage
+from services.email_outbox import enqueue_email
+from services.email_sender import email_sender
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COLLECTING = "collecting"
+SUMMARIZED = "summarized"
+SENT = "sent"
+# 邮件已写入 email_outbox，由投递器发送（EMAIL_OUTBOX_ENABLED=true 时的终态）
+QUEUED = "queued"
+FAILED = "failed"
+
+ACTIVE_STATES = (PENDING, COLLECTING, SUMMARIZED)
+
+# 入队时每页读取的用户数
+_ENQUEUE_PAGE_SIZE = 1000
+
+
+def make_worker_id(prefix: str = "worker") -> str:
+    return f"{prefix}-{socket.gethostname()}-{os.getpid()}-{random.randrange(16 ** 6):06x}"
+
+
+def user_timezone_clause(tz_name: str):
+    """筛选时区为 tz_name 的用户（未设置时区的用户算作 DAILY_EMAIL_TIMEZONE）。"""
+    if tz_name == settings.DAILY_EMAIL_TIMEZONE:
+        return or_(User.timezone == tz_name, User.timezone.is_(None))
+    return User.timezone == tz_name
+
+
+async def timezone_slots(db: AsyncSession) -> List[str]:
+    """当前所有用户的时区（未设置时区的用户归入 DAILY_EMAIL_TIMEZONE），无效时区会被忽略。"""
+    rows = await db.scalars(select(func.coalesce(User.timezone, settings.DAILY_EMAIL_TIMEZONE)).distinct())
+    slots = []
+    for tz_name in rows:
+        try:
+            pytz.timezone(tz_name)
+        except pytz.UnknownTimeZoneError:
+            logger.warning(f"[digest_jobs] unknown timezone {tz_name!r}, skipped")
+            continue
+        slots.append(tz_name)
+    return sorted(slots)
+
+
+def local_send_at(now_local: datetime) -> datetime:
+    """当地今天的发送时间。"""
+    return now_local.replace(
+        hour=settings.DAILY_EMAIL_HOUR, minute=settings.DAILY_EMAIL_MINUTE, second=0, microsecond=0
+    )
+
+
+def next_send_at(now_local: datetime) -> datetime:
+    """当地下一次发送时间（今天的已过则为明天）。"""
+    send_at = local_send_at(now_local)
+    return send_at if send_at > now_local else send_at + timedelta(days=1)
+
+
+async def enqueue_daily_jobs(db: AsyncSession, run_date: date, tz_name: Optional[str] = None) -> int:
+    """
+    为用户创建 run_date（用户当地日期）的任务（已存在的跳过），返回新建数量。可重复调用。
+    tz_name 不为空时只为该时区的用户入队。
+    用户 id 按页流式读取（stream + yield_per），每页一次查重、一次批量插入，内存占用与用户总数无关。
+    """
+    stmt = select(User.id).order_by(User.id)
+    if tz_name is not None:
+        stmt = stmt.where(user_timezone_clause(tz_name))
+    pages = (await db.stream_scalars(stmt.execution_options(yield_per=_ENQUEUE_PAGE_SIZE))).partitions()
+
+    # 同一个 session 边读边写（批量 INSERT 不进 identity map），最后一次性提交：
+    # SQLite 上另开连接提交会被读游标持有的共享锁挡住
+    created = 0
+    async for page in pages:
+        uids = list(page)
+        existing = set(await db.scalars(
+            select(DigestJob.user_id).where(DigestJob.date == run_date, DigestJob.user_id.in_(uids))
+        ))
+        # 当天已经发送过日报的用户（例如手动发送）不再入队
+        existing.update(await db.scalars(
+            select(DailyDigest.user_id).where(
+                DailyDigest.date == run_date, DailyDigest.user_id.in_(uids), DailyDigest.sent_at.isnot(None)
+            )
+        ))
+        rows = [
+            {"id": generate_uuid(), "user_id": uid, "date": run_date, "state": PENDING, "attempts": 0}
+            for uid in uids
+            if uid not in existing
+        ]
+        if rows:
+            await db.execute(insert(DigestJob), rows)
+            created += len(rows)
+    await db.commit()
+    return created
+
+
+def _claimable(now: datetime):
+    return and_(
+        DigestJob.state.in_(ACTIVE_STATES),
+        or_(DigestJob.lease_expires_at.is_(None), DigestJob.lease_expires_at < now),
+        or_(DigestJob.next_attempt_at.is_(None), DigestJob.next_attempt_at <= now),
+    )
+
+
+async def claim_job(db: AsyncSession, worker_id: str, run_date: Optional[date] = None) -> Optional[str]:
+    """
+    领取一个可处理的任务并加租约，返回 job id；没有可领取的任务时返回 None。
+    用条件 UPDATE 抢占：只有一个 worker 的 UPDATE 会命中（rowcount == 1）。
+    """
+    now = datetime.utcnow()
+    stmt = select(DigestJob.id).where(_claimable(now))
+    if run_date is not None:
+        stmt = stmt.where(DigestJob.date == run_date)
+    candidates = list(await db.scalars(stmt.order_by(DigestJob.created_at).limit(20)))
+    random.shuffle(candidates)  # 降低多个 worker 抢同一行的冲突
+
+    lease_until = now + timedelta(seconds=settings.DIGEST_JOB_LEASE_SECONDS)
+    for jid in candidates:
+        result = await db.execute(
+            update(DigestJob)
+            .where(DigestJob.id == jid, _claimable(now))
+            .values(lease_owner=worker_id, lease_expires_at=lease_until)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if result.rowcount == 1:
+            return jid
+    return None
+
+
+async def has_remaining_work(db: AsyncSession, run_date: Optional[date] = None) -> Optional[float]:
+    """
+    是否还有本进程可能领取的任务（未到重试时间的，或租约即将过期的）。
+    返回建议等待秒数；没有剩余任务时返回 None。被其他存活 worker 持有的任务不计入。
+    """
+    now = datetime.utcnow()
+    stmt = select(DigestJob.next_attempt_at).where(
+        DigestJob.state.in_(ACTIVE_STATES),
+        or_(DigestJob.lease_expires_at.is_(None), DigestJob.lease_expires_at < now),
+    )
+    if run_date is not None:
+        stmt = stmt.where(DigestJob.date == run_date)
+    waits = [
+        max(0.0, (next_at - now).total_seconds()) if next_at else 0.0
+        for next_at in await db.scalars(stmt.limit(1000))
+    ]
+    return min(waits) if waits else None
+
+
+async def _keep_lease(job_id: str, worker_id: str) -> None:
+    """处理期间定期续租，避免长时间检索时租约过期被别人领走。"""
+    interval = max(5, settings.DIGEST_JOB_LEASE_SECONDS // 3)
+    while True:
+        await asyncio.sleep(interval)
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(
+                    update(DigestJob)
+                    .where(DigestJob.id == job_id, DigestJob.lease_owner == worker_id)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.DIGEST_JOB_LEASE_SECONDS))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            except Exception as e:
+                logger.warning(f"[digest_jobs] 续租失败 job={job_id}: {e}")
+
+
+def _release(job: DigestJob) -> None:
+    job.lease_owner = None
+    job.lease_expires_at = None
+
+
+async def process_job(job_id: str, worker_id: str) -> str:
+    """
+    处理一个已领取的任务，从当前状态继续：
+    pending/collecting -> 生成日报 -> summarized -> 发送邮件 -> sent
+    （启用发件箱时 summarized -> 写入发件箱 -> queued）。
+    返回结果标签：sent / queued / already_sent / retry / failed / skipped。
+    """
+    with observe_seconds(DB_SESSION_SECONDS, source="scheduler"):
+        # 任务在租约内只由本 worker 修改：提交后不必让 job / user 过期重新加载（AsyncSessionLocal 默认如此）
+        db = AsyncSessionLocal()
+        try:
+            job = await db.get(DigestJob, job_id, options=[joinedload(DigestJob.user)])
+            if job is None or job.lease_owner != worker_id or job.state not in ACTIVE_STATES:
+                return "skipped"
+            user = job.user
+            if user is None:
+                job.state = FAILED
+                job.last_error = "用户不存在"
+                _release(job)
+                await db.commit()
+                return "failed"
+
+            # 当天日报已发送过（例如用户手动生成并发送）：不再生成、不再发信
+            digest = await db.scalar(select(DailyDigest).where(
+                DailyDigest.user_id == user.id, DailyDigest.date == job.date
+            ))
+            if digest is not None and digest.sent_at is not None:
+                job.state = SENT
+                job.sent_at = digest.sent_at
+                job.content = job.content or digest.content
+                _release(job)
+                await db.commit()
+                return "already_sent"
+
+            renewer = asyncio.create_task(_keep_lease(job_id, worker_id))
+            # 邮件已发出的时间：之后的任何失败都不能再安排重试，否则用户会收到两封
+            delivered_at: Optional[datetime] = None
+            try:
+                with span("digest_job", user_id=user.id, state=job.state, attempt=job.attempts + 1) as sp:
+                    try:
+                        if job.state in (PENDING, COLLECTING):
+                            if digest is not None and digest.content:
+                                # 当天日报已生成过，直接复用
+                                job.content = digest.content
+                            else:
+                                job.state = COLLECTING
+                                await db.commit()
+                                # 日报覆盖的是发送日期的前一天，与预取阶段使用同一个目标日期
+                                target_date = (job.date - timedelta(days=1)).isoformat()
+                                job.content = await generate_digest_for_user(user, db, target_date=target_date)
+                            job.state = SUMMARIZED
+                            # 同时写入 daily_digests，/api/digests/today 可直接读取
+                            await save_daily_digest(db, user.id, job.date, content=job.content)
+
+                        if not email_sender.is_configured:
+                            # 配置问题重试也不会成功，直接失败
+                            raise _PermanentError("SMTP 未配置")
+                        if settings.EMAIL_OUTBOX_ENABLED:
+                            # 写入发件箱，与任务状态同一次提交；由投递器限速发送、失败重试
+                            await enqueue_email(
+                                db,
+                                to_email=user.email,
+                                message=await email_sender.render_digest_message(
+                                    user.email, job.content, job.date.strftime("%Y/%m/%d")
+                                ),
+                                user_id=user.id,
+                                digest_date=job.date,
+                                dedupe_key=f"digest:{user.id}:{job.date.isoformat()}",
+                            )
+                            job.state = QUEUED
+                            job.last_error = None
+                            _release(job)
+                            await db.commit()
+                            return "queued"
+                        send_started = time.perf_counter()
+                        sent = await email_sender.send_digest_email(
+                            to_email=user.email,
+                            digest_content=job.content,
+                            date_str=job.date.strftime("%Y/%m/%d"),
+                        )
+                        if not sent:
+                            raise RuntimeError("邮件发送失败")
+                        delivered_at = datetime.utcnow()
+                        # 发送成功后先只提交任务状态（一次单行 UPDATE），尽量缩小“已发送但未记录”的窗口
+                        job.state = SENT
+                        job.sent_at = delivered_at
+                        job.send_ms = int((time.perf_counter() - send_started) * 1000)
+                        job.last_error = None
+                        _release(job)
+                        await db.commit()
+                        try:
+                            await save_daily_digest(db, user.id, job.date, sent_at=delivered_at)
+                        except Exception as e:
+                            # 任务已记为 sent，不会重发；daily_digests.sent_at 只影响展示
+                            await db.rollback()
+                            logger.warning(f"[digest_jobs] job={job_id} user={user.id} sent, but saving daily digest failed: {e}")
+                        return "sent"
+                    except Exception as e:
+                        sp.set_error(e)
+                        return await _record_failure(db, job_id, e, delivered_at=delivered_at)
+            finally:
+                renewer.cancel()
+        finally:
+            await db.close()
+
+
+class _PermanentError(Exception):
+    """不值得重试的错误"""
+
+
+async def _record_failure(db: AsyncSession, job_id: str, error: Exception, delivered_at: Optional[datetime] = None) -> str:
+    """
+    记录一次失败并安排重试。邮件已经发出（delivered_at 不为空，或库里的任务已有 sent_at）时
+    只把任务记为 sent，不再重试，避免重复发信。
+    """
+    await db.rollback()
+    job = await db.get(DigestJob, job_id)
+    if job is None:
+        return "failed"
+    if delivered_at is not None or job.sent_at is not None:
+        job.state = SENT
+        job.sent_at = job.sent_at or delivered_at
+        _release(job)
+        logger.warning(f"[digest_jobs] job={job_id} user={job.user_id} email already sent, not retrying: {error}")
+        await db.commit()
+        return "sent"
+    job.attempts = (job.attempts or 0) + 1
+    job.last_error = str(error)[:1000]
+    _release(job)
+    if isinstance(error, _PermanentError) or job.attempts >= settings.DIGEST_JOB_MAX_ATTEMPTS:
+        job.state = FAILED
+        outcome = "failed"
+        logger.error(f"[digest_jobs] job={job_id} user={job.user_id} failed after {job.attempts} attempts: {error}")
+    else:
+        backoff = settings.DIGEST_JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+        outcome = "retry"
+        logger.warning(
+            f"[digest_jobs] job={job_id} user={job.user_id} state={job.state} attempt {job.attempts} failed, "
+            f"retry in {backoff}s: {error}"
+        )
+    await db.commit()
+    return outcome
+
+
+async def run_digest_workers(
+    run_date: Optional[date],
+    *,
+    concurrency: int,
+    worker_prefix: str = "worker",
+    exit_when_idle: bool = True,
+    idle_poll_seconds: float = 5.0,
+    stop_event: Optional[asyncio.Event] = None,
+) -> Counter:
+    """
+    启动 concurrency 个 asyncio worker 领取并处理任务（run_date 为 None 时处理任意日期）。
+    exit_when_idle=True 时，没有剩余可领取任务就退出；否则持续轮询（独立 worker 进程用）。
+    stop_event 被 set 后不再领取新任务，处理完手上的任务即退出。
+    """
+    started = time.perf_counter()
+    progress: Counter = Counter()
+
+    async def _worker(n: int) -> None:
+        worker_id = make_worker_id(f"{worker_prefix}{n}")
+        while not (stop_event and stop_event.is_set()):
+            async with AsyncSessionLocal() as db:
+                job_id = await claim_job(db, worker_id, run_date)
+                wait = None if job_id else await has_remaining_work(db, run_date)
+
+            if job_id is None:
+                if wait is None and exit_when_idle:
+                    return
+                await flush_ai_usage()  # 空闲时把台账落库（常驻 worker 不会走到最后的 flush）
+                delay = min(idle_poll_seconds, wait if wait is not None else idle_poll_seconds) or 0.5
+                if stop_event is None:
+                    await asyncio.sleep(delay)
+                else:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            try:
+                outcome = await process_job(job_id, worker_id)
+            except Exception as e:
+                logger.exception(f"[digest_jobs] worker {worker_id} crashed on job={job_id}: {e}")
+                outcome = "failed"
+            progress[outcome] += 1
+            SCHEDULER_USERS_PROCESSED.labels(outcome=outcome).inc()
+
+            done = sum(progress.values())
+            if done % 10 == 0:
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"[digest_jobs] progress processed={done} sent={progress['sent']} retry={progress['retry']} "
+                    f"failed={progress['failed']} elapsed={elapsed:.0f}s rate={done / elapsed * 60:.1f} jobs/min"
+                )
+
+    try:
+        await asyncio.gather(*(_worker(i) for i in range(max(1, concurrency))))
+    finally:
+        await flush_ai_usage()
+    return progress
+
+
+async def count_jobs_by_state(db: AsyncSession, run_date: date) -> Counter:
+    rows = await db.execute(
+        select(DigestJob.state, func.count(DigestJob.id)).where(DigestJob.date == run_date).group_by(DigestJob.state)
+    )
+    return Counter({state: n for state, n in rows})
@@ -0,0 +1,88 @@
+"""
+日报预取阶段：在发送时间之前，把所有用户关注的 ticker 在目标日期的新闻检索和摘要提前算好，
+写入 ticker_digests。发送阶段只需从缓存组装、渲染、发送，不再等待 agent 检索。
+"""
+
+import logging
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal
+from metrics import PREFETCH_TICKERS
+from models import Company, User, UserCompany
+from routers.digests import summarize_tickers
+from services.ai_usage import flush_ai_usage
+from services.digest_jobs import user_timezone_clause
+from services.ticker_digests import load_ticker_digests, store_ticker_digests
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+async def followed_tickers(db: AsyncSession, tz_name: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    被至少一个用户关注的 (ticker, name)，按关注人数从多到少排序（热门的先算）。
+    tz_name 不为空时只统计该时区的用户。
+    """
+    stmt = (
+        select(Company.ticker, Company.name, func.count(UserCompany.id).label("followers"))
+        .join(UserCompany, UserCompany.company_id == Company.id)
+    )
+    if tz_name is not None:
+        stmt = stmt.join(User, User.id == UserCompany.user_id).where(user_timezone_clause(tz_name))
+    rows = await db.execute(
+        stmt.group_by(Company.ticker, Company.name)
+        .order_by(func.count(UserCompany.id).desc(), Company.ticker)
+    )
+    return [(ticker, name) for ticker, name, _ in rows]
+
+
+async def prefetch_ticker_digests(
+    target_date: date,
+    tickers: Optional[List[Tuple[str, str]]] = None,
+    tz_name: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    为 target_date 预取 ticker 摘要（已缓存的跳过），分批写入缓存，中途退出也不会丢失已完成的批次。
+    tickers 为 None 时取 tz_name 时区用户（tz_name 也为空时为所有用户）关注的 ticker。
+    不同时区槽位只要目标日期相同就共用缓存，先到的槽位算过的 ticker 后面的槽位直接命中。
+    返回 {"cached": ..., "fetched": ..., "uncached": ...}。
+    """
+    started = time.perf_counter()
+    target = target_date.isoformat()
+    db = AsyncSessionLocal()
+    try:
+        if tickers is None:
+            tickers = await followed_tickers(db, tz_name)
+        ticker_to_name = dict(tickers)
+        already = await load_ticker_digests(db, ticker_to_name, target)
+        todo = [t for t in ticker_to_name if t not in already]
+        PREFETCH_TICKERS.labels(outcome="cached").inc(len(already))
+        logger.info(f"[prefetch] tz={tz_name or '*'} target_date={target} tickers={len(ticker_to_name)} cached={len(already)} todo={len(todo)}")
+
+        stats = {"cached": len(already), "fetched": 0, "uncached": 0}
+        batch_size = max(1, settings.DIGEST_PREFETCH_BATCH_SIZE)
+        with span("digest.prefetch", target_date=target, tickers=len(todo)):
+            for i in range(0, len(todo), batch_size):
+                batch = todo[i:i + batch_size]
+                entries, uncacheable = await summarize_tickers(batch, ticker_to_name, target, tz_name)
+                await store_ticker_digests(db, target, {t: e for t, e in entries.items() if t not in uncacheable})
+                stats["fetched"] += len(batch) - len(uncacheable)
+                stats["uncached"] += len(uncacheable)
+                PREFETCH_TICKERS.labels(outcome="fetched").inc(len(batch) - len(uncacheable))
+                PREFETCH_TICKERS.labels(outcome="uncached").inc(len(uncacheable))
+                logger.info(
+                    f"[prefetch] {min(i + batch_size, len(todo))}/{len(todo)} "
+                    f"elapsed={time.perf_counter() - started:.0f}s"
+                )
+    finally:
+        await db.close()
+        await flush_ai_usage()
+
+    logger.info(f"[prefetch] target_date={target} finished in {time.perf_counter() - started:.1f}s: {stats}")
+    return stats
@@ -1,82 +1,290 @@
+"""
+每日日报调度（按用户时区分槽）。
+
+用户按时区分组，每个时区是一个槽位：槽位在当地 DAILY_EMAIL_HOUR:DAILY_EMAIL_MINUTE 发送，
+提前 DIGEST_PREFETCH_LEAD_MINUTES 分钟预取该槽位用户关注的 ticker（容量规划估算来不及时自动提前，见 services/capacity.py）。
+调度器每 DIGEST_SLOT_TICK_MINUTES 分钟检查一次哪些槽位到点，负载因此分散到一天中的不同时间。
+目标日期相同的槽位共用 ticker_digests 缓存，同一个 ticker 一天只检索、总结一次。
+"""
+
+import asyncio
 import logging
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
 from config import settings
-from database import SessionLocal
-from models import User
-from routers.digests import generate_digest_for_user
-from services.email_sender import email_sender
+from database import AsyncSessionLocal
+from metrics import SCHEDULER_JOB_SECONDS, observe_seconds
+from models import DigestJob
+from services.digest_jobs import (
+    ACTIVE_STATES,
+    count_jobs_by_state,
+    enqueue_daily_jobs,
+    local_send_at,
+    next_send_at,
+    run_digest_workers,
+    timezone_slots,
+)
+from services.capacity import plan_capacity
+from services.digest_prefetch import prefetch_ticker_digests
+from services.leader import LeaderElector
 
 logger = logging.getLogger(__name__)
 
+# 错过触发时间后仍允许补跑的窗口
+_MISFIRE_GRACE_SECONDS = 60 * 30
 
-async def _send_daily_digests_job():
+# 本进程内正在运行 / 已完成的槽位任务，避免每次 tick 重复启动
+_running: Dict[Tuple, asyncio.Task] = {}
+_finished: Set[Tuple] = set()
+# 已记录过日志的容量规划提示（(类型, 时区, 目标日期, 内容)）
+_noticed: Set[Tuple] = set()
+
+
+def _queue_mode() -> bool:
+    return settings.DIGEST_WORKER_MODE.lower() == "queue"
+
+
+async def _timezone_slots() -> List[str]:
+    async with AsyncSessionLocal() as db:
+        return await timezone_slots(db)
+
+
+async def _run_jobs_for_date(run_date: date, *, tz_name: Optional[str] = None, enqueue: bool = True) -> None:
     """
-    遍历所有用户，生成日报并发送邮件。
-    注意：这会触发新闻检索 + AI 总结，耗时较长；用户量大时需要队列化（Celery/任务队列）。
+    （可选）为 tz_name 时区的用户入队 run_date 的任务，然后用有界 worker 池处理该日期所有未完成的任务。
+    queue 模式下只入队，任务由独立的 worker 进程（python -m worker）领取。
+    """
+    started = time.perf_counter()
+    with observe_seconds(SCHEDULER_JOB_SECONDS):
+        async with AsyncSessionLocal() as db:
+            created = await enqueue_daily_jobs(db, run_date, tz_name) if enqueue else 0
+            before = await count_jobs_by_state(db, run_date)
+        logger.info(f"[scheduler] tz={tz_name or '*'} date={run_date} enqueued={created} jobs={dict(before)}")
+        if _queue_mode():
+            return
+
+        concurrency = max(1, int(settings.DIGEST_USER_CONCURRENCY))
+        progress = await run_digest_workers(run_date, concurrency=concurrency, worker_prefix="scheduler")
+
+    elapsed = time.perf_counter() - started
+    done = sum(progress.values())
+    logger.info(
+        f"[scheduler] tz={tz_name or '*'} date={run_date} finished in {elapsed:.1f}s: {done} jobs processed, "
+        f"{dict(progress)}, throughput={done / elapsed * 60 if elapsed else 0:.1f} jobs/min"
+    )
+
+
+def _launch(key: Tuple, factory: Callable[[], Awaitable[None]]) -> None:
+    """在后台启动一个槽位任务（同一个 key 只启动一次），不阻塞调度 tick。"""
+    if key in _running or key in _finished:
+        return
+
+    async def _wrapped():
+        try:
+            await factory()
+            _finished.add(key)
+        except Exception as e:
+            logger.exception(f"[scheduler] {key} failed: {e}")
+        finally:
+            _running.pop(key, None)
+
+    _running[key] = asyncio.create_task(_wrapped())
+
+
+async def _slot_tick() -> None:
+    """
+    检查每个时区槽位：
+    - 当地时间进入预取窗口（发送前 DIGEST_PREFETCH_LEAD_MINUTES 分钟内，容量规划估算来不及时自动提前）→ 预取该槽位关注的 ticker
+    - 当地时间到达发送时间（允许 _MISFIRE_GRACE_SECONDS 内补发）→ 入队并处理该槽位的日报
     """
     if not settings.ENABLE_DAILY_EMAIL_SCHEDULER:
         return
 
-    tz = pytz.timezone(settings.DAILY_EMAIL_TIMEZONE)
-    now_local = datetime.now(tz)
-    logger.info(f"[scheduler] daily digest job started at {now_local.isoformat()}")
+    now_utc = datetime.now(pytz.utc)
+    # 只保留最近几天的完成记录
+    stale = now_utc.date() - timedelta(days=3)
+    _finished.difference_update({k for k in _finished if k[2] < stale})
+    _noticed.difference_update({k for k in _noticed if k[2] < stale})
 
-    db: Session = SessionLocal()
     try:
-        users = db.query(User).all()
-        logger.info(f"[scheduler] users={len(users)}")
-        for u in users:
-            try:
-                content = await generate_digest_for_user(u, db)
-                date_str = now_local.strftime("%Y/%m/%d")
-                await email_sender.send_digest_email(
-                    to_email=u.email,
-                    digest_content=content,
-                    date_str=date_str,
-                )
-            except Exception as e:
-                logger.exception(f"[scheduler] failed for user={u.email}: {e}")
-    finally:
-        db.close()
-
-    logger.info("[scheduler] daily digest job finished")
-
-
-def start_daily_email_scheduler() -> AsyncIOScheduler | None:
+        async with AsyncSessionLocal() as db:
+            slots = (await plan_capacity(db, now_utc))["slots"]
+    except Exception as e:
+        # 容量规划只能提前预取，不能挡住发送：出错时按固定的 DIGEST_PREFETCH_LEAD_MINUTES 继续
+        logger.warning(f"[scheduler] capacity planning failed, using static prefetch lead: {e}")
+        slots = [_static_slot(tz_name, now_utc) for tz_name in await _timezone_slots()]
+
+    for slot in slots:
+        tz_name = slot["timezone"]
+        now_local = now_utc.astimezone(pytz.timezone(tz_name))
+
+        send_at = local_send_at(now_local)
+        if send_at <= now_local <= send_at + timedelta(seconds=_MISFIRE_GRACE_SECONDS):
+            run_date = send_at.date()
+            _launch(("send", tz_name, run_date), lambda d=run_date, tz=tz_name: _run_jobs_for_date(d, tz_name=tz))
+
+        target_date = slot["target_date"]
+        _notice_plan(slot)
+        lead = timedelta(minutes=slot["prefetch_lead_minutes"])
+        if lead and slot["send_at"] - now_local <= lead:
+            _launch(
+                ("prefetch", tz_name, target_date),
+                lambda d=target_date, tz=tz_name: prefetch_ticker_digests(d, tz_name=tz),
+            )
+
+
+def _static_slot(tz_name: str, now_utc: datetime) -> dict:
+    """不做容量估算的槽位（字段与 plan_slot 相同的子集），预取提前量为 DIGEST_PREFETCH_LEAD_MINUTES。"""
+    send_at = next_send_at(now_utc.astimezone(pytz.timezone(tz_name)))
+    return {
+        "timezone": tz_name,
+        "send_at": send_at,
+        "target_date": send_at.date() - timedelta(days=1),
+        "prefetch_minutes": None,
+        "prefetch_lead_minutes": max(0, settings.DIGEST_PREFETCH_LEAD_MINUTES),
+        "warnings": [],
+    }
+
+
+def _notice_plan(slot: dict) -> None:
+    """容量规划的提前预取和告警，每个槽位每个目标日期只记一次日志。"""
+    tz_name, target_date = slot["timezone"], slot["target_date"]
+    lead = slot["prefetch_lead_minutes"]
+    if lead > settings.DIGEST_PREFETCH_LEAD_MINUTES > 0 and ("advance", tz_name, target_date, lead) not in _noticed:
+        _noticed.add(("advance", tz_name, target_date, lead))
+        logger.info(
+            f"[scheduler] tz={tz_name} target_date={target_date}: prefetch estimated {slot['prefetch_minutes']} min, "
+            f"starting {lead} min before send instead of {settings.DIGEST_PREFETCH_LEAD_MINUTES}"
+        )
+    for warning in slot["warnings"]:
+        if ("warn", tz_name, target_date, warning) not in _noticed:
+            _noticed.add(("warn", tz_name, target_date, warning))
+            logger.warning(f"[scheduler] capacity: {warning}")
+
+
+async def _send_daily_digests_job():
     """
-    在 FastAPI 启动时调用。默认关闭，通过 .env 打开。
-    纽约时间每天 08:00 触发一次。
+    立即为所有用户入队当地“今天”的任务并处理（不看槽位时间，供手动触发和基准测试使用）。
+    任务状态持久化在数据库中：重复触发不会给同一用户重复发信。
     """
     if not settings.ENABLE_DAILY_EMAIL_SCHEDULER:
-        logger.info("[scheduler] ENABLE_DAILY_EMAIL_SCHEDULER=false, scheduler disabled")
-        return None
+        return
 
-    tz = pytz.timezone(settings.DAILY_EMAIL_TIMEZONE)
-    scheduler = AsyncIOScheduler(timezone=tz)
-    trigger = CronTrigger(
-        hour=settings.DAILY_EMAIL_HOUR,
-        minute=settings.DAILY_EMAIL_MINUTE,
-        timezone=tz,
-    )
+    now_utc = datetime.now(pytz.utc)
+    run_dates = set()
+    async with AsyncSessionLocal() as db:
+        for tz_name in await timezone_slots(db):
+            run_date = now_utc.astimezone(pytz.timezone(tz_name)).date()
+            await enqueue_daily_jobs(db, run_date, tz_name)
+            run_dates.add(run_date)
+    for run_date in sorted(run_dates):
+        await _run_jobs_for_date(run_date, enqueue=False)
+
+
+async def _prefetch_job():
+    """立即为所有槽位预取下一次发送的目标日期（不看预取窗口，供手动触发和基准测试使用）。"""
+    if not settings.ENABLE_DAILY_EMAIL_SCHEDULER:
+        return
+
+    now_utc = datetime.now(pytz.utc)
+    for tz_name in await _timezone_slots():
+        next_send = next_send_at(now_utc.astimezone(pytz.timezone(tz_name)))
+        await prefetch_ticker_digests(next_send.date() - timedelta(days=1), tz_name=tz_name)
+
+
+async def _resume_unfinished_jobs():
+    """启动时执行一次：继续处理最近两天内未完成的任务（上次进程中途退出）。"""
+    if _queue_mode():
+        return  # 未完成的任务由 worker 进程续跑
+
+    since = datetime.utcnow().date() - timedelta(days=1)
+    async with AsyncSessionLocal() as db:
+        dates = list(await db.scalars(
+            select(DigestJob.date)
+            .where(DigestJob.state.in_(ACTIVE_STATES), DigestJob.date >= since)
+            .distinct()
+        ))
+
+    for run_date in sorted(dates):
+        logger.info(f"[scheduler] resuming unfinished digest jobs for {run_date}")
+        await _run_jobs_for_date(run_date, enqueue=False)
+
+
+def _build_scheduler() -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler(timezone=pytz.utc)
+    tick = max(1, min(60, settings.DIGEST_SLOT_TICK_MINUTES))
+    # 从发送分钟开始按 tick 对齐，整点/半点/45 分时区都能准点触发
+    minutes = sorted({(settings.DAILY_EMAIL_MINUTE + i) % 60 for i in range(0, 60, tick)})
     scheduler.add_job(
-        _send_daily_digests_job,
-        trigger=trigger,
-        id="daily_digest_email",
+        _slot_tick,
+        trigger=CronTrigger(minute=",".join(str(m) for m in minutes), timezone=pytz.utc),
+        id="digest_slot_tick",
         replace_existing=True,
         max_instances=1,
         coalesce=True,
-        misfire_grace_time=60 * 30,
+        misfire_grace_time=60 * tick,
     )
-    scheduler.start()
+    scheduler.add_job(_resume_unfinished_jobs, id="resume_digest_jobs", replace_existing=True)
+    scheduler.add_job(_slot_tick, id="digest_slot_tick_startup", replace_existing=True)
+    return scheduler
+
+
+_scheduler: Optional[AsyncIOScheduler] = None
+_elector: Optional[LeaderElector] = None
+
+
+async def _on_elected() -> None:
+    global _scheduler
+    _scheduler = _build_scheduler()
+    _scheduler.start()
     logger.info(
-        f"[scheduler] started: {settings.DAILY_EMAIL_TIMEZONE} {settings.DAILY_EMAIL_HOUR:02d}:{settings.DAILY_EMAIL_MINUTE:02d}"
+        f"[scheduler] started: local {settings.DAILY_EMAIL_HOUR:02d}:{settings.DAILY_EMAIL_MINUTE:02d} per user timezone, "
+        f"tick every {settings.DIGEST_SLOT_TICK_MINUTES} min, default timezone {settings.DAILY_EMAIL_TIMEZONE}"
     )
-    return scheduler
 
 
+async def _on_demoted() -> None:
+    """失去主节点：停止调度新的槽位。已在运行的任务继续完成（digest_jobs 的租约保证不会重复发送）。"""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+        logger.info("[scheduler] stopped (no longer leader)")
+
+
+def start_daily_email_scheduler() -> Optional[LeaderElector]:
+    """
+    在 FastAPI 启动时调用。默认关闭，通过 .env 打开。
+    每个用户在当地时间 08:00 收到日报；调度器每 DIGEST_SLOT_TICK_MINUTES 分钟检查一次各时区槽位。
+    多个进程/副本同时启动时，只有抢到主节点锁的进程运行调度器，它退出后由其他进程接管。
+    成为主节点时会续跑未完成的任务，并立即检查一次槽位（补发错过的槽位）。
+    """
+    global _elector
+    if not settings.ENABLE_DAILY_EMAIL_SCHEDULER:
+        logger.info("[scheduler] ENABLE_DAILY_EMAIL_SCHEDULER=false, scheduler disabled")
+        return None
+
+    _elector = LeaderElector(
+        "daily_digest_scheduler",
+        settings.SCHEDULER_LEADER_TTL_SECONDS,
+        on_elected=_on_elected,
+        on_demoted=_on_demoted,
+    )
+    _elector.start()
+    logger.info(f"[scheduler] waiting for leadership as {_elector.owner}")
+    return _elector
+
+
+async def stop_daily_email_scheduler() -> None:
+    """在 FastAPI 退出时调用：停止调度并释放主节点锁，其他进程无需等锁过期即可接管。"""
+    global _elector
+    if _elector is not None:
+        await _elector.stop()
+        _elector = None
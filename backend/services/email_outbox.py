@@ -0,0 +1,362 @@
+"""
+邮件发件箱（email_outbox 表）与投递器。
+
+日报生成后只把渲染好的邮件写入发件箱（与任务状态在同一个事务里提交），由投递器异步发送：
+SMTP 变慢或暂时不可用时不会拖住生成日报的 worker，发送失败的邮件也不会丢。
+
+- 状态：pending -> sending -> sent；永久错误（5xx 拒收）或重试耗尽为 dead，可在管理 API 中重新入队
+- 投递器用带条件的 UPDATE 批量领取（租约 EMAIL_OUTBOX_LEASE_SECONDS），进程崩溃后租约过期即可被重新领取
+- 按收件域名（provider）令牌桶限速：EMAIL_RATE_PER_SECOND，EMAIL_PROVIDER_RATE_LIMITS 可单独指定
+- 失败按 EMAIL_OUTBOX_RETRY_BASE_SECONDS × 2^(n-1) 退避，最多 EMAIL_OUTBOX_MAX_ATTEMPTS 次
+- 多个进程都会启动投递器，但通过主节点锁（scheduler_leases）只有一个在发送，限速因此是全局的
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from email.message import Message
+from typing import Dict, List, Optional, Set, Union
+
+import aiosmtplib
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal
+from metrics import EMAIL_OUTBOX_DELIVERIES
+from models import EmailOutbox
+from routers.digests import save_daily_digest
+from services.email_sender import email_sender
+from services.leader import LeaderElector
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+
+def provider_of(to_email: str) -> str:
+    """收件域名（限速维度）"""
+    return to_email.rsplit("@", 1)[-1].strip().lower()
+
+
+async def enqueue_email(
+    db: AsyncSession,
+    *,
+    to_email: str,
+    message: Union[Message, str],
+    user_id: Optional[str] = None,
+    digest_date: Optional[date] = None,
+    dedupe_key: Optional[str] = None,
+) -> bool:
+    """
+    写入发件箱，不提交（由调用方与业务状态一起提交）。
+    dedupe_key 已存在时跳过（同一封日报不会入队两次），返回是否新写入。
+    """
+    if dedupe_key and await db.scalar(select(EmailOutbox.id).where(EmailOutbox.dedupe_key == dedupe_key)):
+        return False
+    try:
+        async with db.begin_nested():
+            db.add(EmailOutbox(
+                dedupe_key=dedupe_key,
+                user_id=user_id,
+                digest_date=digest_date,
+                to_email=to_email,
+                provider=provider_of(to_email),
+                message=message if isinstance(message, str) else message.as_string(),
+                state=PENDING,
+            ))
+    except IntegrityError:
+        return False
+    return True
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(
+            EmailOutbox.state == PENDING,
+            or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now),
+        ),
+        and_(EmailOutbox.state == SENDING, EmailOutbox.lease_expires_at < now),
+    )
+
+
+async def claim_batch(db: AsyncSession, owner: str, limit: int) -> List[EmailOutbox]:
+    """领取最多 limit 封到期的邮件（按入队顺序），返回已领取的行（lease_owner 为本次领取的令牌）。"""
+    now = datetime.utcnow()
+    ids = list(await db.scalars(
+        select(EmailOutbox.id)
+        .where(_claimable(now))
+        .order_by(EmailOutbox.created_at)
+        .limit(limit)
+    ))
+    if not ids:
+        return []
+    token = f"{owner}:{os.urandom(4).hex()}"
+    await db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids), _claimable(now))
+        .values(
+            state=SENDING,
+            lease_owner=token,
+            lease_expires_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return list(await db.scalars(select(EmailOutbox).where(EmailOutbox.lease_owner == token)))
+
+
+def _is_permanent(error: Exception) -> bool:
+    """收件人/发件人被拒等 5xx 错误重试也不会成功；认证失败是配置问题，修好后重试仍可成功"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, aiosmtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+async def record_result(db: AsyncSession, outbox_id: str, token: str, error: Optional[Exception], send_ms: int) -> str:
+    """记录一次发送结果，返回 sent / retry / dead（租约已被别人接手时返回 lost，不做修改）。"""
+    row = await db.get(EmailOutbox, outbox_id)
+    if row is None or row.lease_owner != token:
+        return "lost"
+    row.attempts = (row.attempts or 0) + 1
+    row.lease_owner = None
+    row.lease_expires_at = None
+    if error is None:
+        row.state = SENT
+        row.sent_at = datetime.utcnow()
+        row.send_ms = send_ms
+        row.last_error = None
+        if row.user_id and row.digest_date:
+            # 同步到 daily_digests（同一次提交）：/today 与重复入队检查以此为准
+            await save_daily_digest(db, row.user_id, row.digest_date, sent_at=row.sent_at)
+        else:
+            await db.commit()
+        return "sent"
+
+    row.last_error = str(error)[:1000]
+    if _is_permanent(error) or row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        row.state = DEAD
+        outcome = "dead"
+        logger.error(f"[outbox] {row.to_email} dead after {row.attempts} attempts: {error}")
+    else:
+        backoff = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** (row.attempts - 1))
+        row.state = PENDING
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+        outcome = "retry"
+        logger.warning(f"[outbox] {row.to_email} attempt {row.attempts} failed, retry in {backoff}s: {error}")
+    await db.commit()
+    return outcome
+
+
+async def outbox_stats(db: AsyncSession, dead_limit: int = 20) -> Dict:
+    """各状态的邮件数，以及最近的 dead 邮件（管理 API 使用）"""
+    counts = {state: 0 for state in (PENDING, SENDING, SENT, DEAD)}
+    for state, n in await db.execute(
+        select(EmailOutbox.state, func.count(EmailOutbox.id)).group_by(EmailOutbox.state)
+    ):
+        counts[state] = n
+    dead = (await db.scalars(
+        select(EmailOutbox)
+        .where(EmailOutbox.state == DEAD)
+        .order_by(EmailOutbox.updated_at.desc())
+        .limit(dead_limit)
+    )).all()
+    return {"counts": counts, "dead": dead}
+
+
+async def requeue_dead(db: AsyncSession, outbox_id: str) -> Optional[EmailOutbox]:
+    """把一封 dead 邮件重新放回发件箱（重试次数清零），不是 dead 状态时返回 None"""
+    row = await db.get(EmailOutbox, outbox_id)
+    if row is None or row.state != DEAD:
+        return None
+    row.state = PENDING
+    row.attempts = 0
+    row.next_attempt_at = None
+    await db.commit()
+    await db.refresh(row)
+    return row
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, float]:
+    """解析 "gmail.com=5,qq.com=2" 为 {"gmail.com": 5.0, "qq.com": 2.0}"""
+    limits: Dict[str, float] = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        domain, rate = part.split("=", 1)
+        try:
+            limits[domain.strip().lower()] = float(rate)
+        except ValueError:
+            logger.warning(f"[outbox] invalid rate limit {part!r}, ignored")
+    return limits
+
+
+class _TokenBucket:
+    """每秒 rate 个令牌，最多攒 1 秒的量"""
+
+    def __init__(self, rate: float):
+        self.rate = max(0.01, rate)
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboxDispatcher:
+    """从发件箱领取邮件并发送；同时在途的邮件最多 EMAIL_OUTBOX_BATCH_SIZE 封，真正的并发由 SMTP 连接池限制。"""
+
+    def __init__(self, owner: Optional[str] = None, poll_seconds: float = 2.0):
+        self.owner = owner or f"outbox-{socket.gethostname()}-{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self._limits = _parse_rate_limits(settings.EMAIL_PROVIDER_RATE_LIMITS)
+        self._buckets: Dict[str, _TokenBucket] = {}
+
+    def _bucket(self, provider: str) -> _TokenBucket:
+        bucket = self._buckets.get(provider)
+        if bucket is None:
+            bucket = _TokenBucket(self._limits.get(provider, settings.EMAIL_RATE_PER_SECOND))
+            self._buckets[provider] = bucket
+        return bucket
+
+    async def drain(self, *, stop_event: Optional[asyncio.Event] = None, exit_when_idle: bool = True) -> Counter:
+        """
+        持续领取并发送。exit_when_idle=True 时发件箱里没有到期邮件就返回（未到重试时间的不等）；
+        stop_event 被 set 后不再领取，等在途的邮件发完再返回。
+        """
+        progress: Counter = Counter()
+        inflight: Set[asyncio.Task] = set()
+        batch = max(1, settings.EMAIL_OUTBOX_BATCH_SIZE)
+        while True:
+            stopping = stop_event is not None and stop_event.is_set()
+            if not stopping and len(inflight) < batch:
+                async with AsyncSessionLocal() as db:
+                    rows = await claim_batch(db, self.owner, batch - len(inflight))
+                inflight.update(asyncio.create_task(self._deliver(row)) for row in rows)
+
+            if not inflight:
+                if stopping or exit_when_idle:
+                    break
+                if stop_event is None:
+                    await asyncio.sleep(self.poll_seconds)
+                else:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            done, inflight = await asyncio.wait(inflight, timeout=self.poll_seconds, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                progress[task.result()] += 1
+        return progress
+
+    async def _deliver(self, row: EmailOutbox) -> str:
+        await self._bucket(row.provider).acquire()
+        started = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            # 直接发送存储的邮件文本，不在事件循环上重新解析 / 序列化
+            await email_sender.send_message(row.message, row.to_email)
+        except Exception as e:
+            error = e
+        send_ms = int((time.perf_counter() - started) * 1000)
+
+        async with AsyncSessionLocal() as db:
+            try:
+                outcome = await record_result(db, row.id, row.lease_owner, error, send_ms)
+            except Exception as e:
+                # 结果没记下来：租约过期后会被重新领取（可能重复发送一次）
+                logger.exception(f"[outbox] failed to record result for {row.id}: {e}")
+                outcome = "error"
+        EMAIL_OUTBOX_DELIVERIES.labels(outcome=outcome).inc()
+        return outcome
+
+
+async def drain_outbox() -> Counter:
+    """立即发送发件箱中所有到期的邮件后返回（worker --exit-when-idle、手动触发和基准测试使用）。"""
+    progress = await OutboxDispatcher().drain()
+    if progress:
+        logger.info(f"[outbox] drained: {dict(progress)}")
+    return progress
+
+
+# ============ 常驻投递器（主节点上运行） ============
+
+_elector: Optional[LeaderElector] = None
+_task: Optional[asyncio.Task] = None
+_stop: Optional[asyncio.Event] = None
+
+
+async def _run_dispatcher(stop: asyncio.Event) -> None:
+    dispatcher = OutboxDispatcher()
+    while not stop.is_set():
+        try:
+            await dispatcher.drain(stop_event=stop, exit_when_idle=False)
+        except Exception as e:
+            # 数据库暂时不可用等：稍后继续，不让投递器就此停止
+            logger.exception(f"[outbox] dispatcher error: {e}")
+            await asyncio.sleep(dispatcher.poll_seconds)
+
+
+async def _on_elected() -> None:
+    global _task, _stop
+    _stop = asyncio.Event()
+    _task = asyncio.create_task(_run_dispatcher(_stop))
+    logger.info("[outbox] dispatcher started")
+
+
+async def _on_demoted() -> None:
+    """失去主节点：不再领取新邮件，在途的邮件继续发完。"""
+    if _stop is not None:
+        _stop.set()
+    logger.info("[outbox] dispatcher stopping")
+
+
+def start_email_dispatcher() -> Optional[LeaderElector]:
+    """启动常驻投递器（EMAIL_OUTBOX_ENABLED=false 时不启动）；多个进程同时调用时只有一个真正发送。"""
+    global _elector
+    if not settings.EMAIL_OUTBOX_ENABLED:
+        return None
+    _elector = LeaderElector(
+        "email_outbox_dispatcher",
+        settings.SCHEDULER_LEADER_TTL_SECONDS,
+        on_elected=_on_elected,
+        on_demoted=_on_demoted,
+    )
+    _elector.start()
+    return _elector
+
+
+async def stop_email_dispatcher(timeout: float = 30.0) -> None:
+    """停止投递器并释放主节点锁，最多等待 timeout 秒让在途的邮件发完。"""
+    global _elector, _task
+    if _elector is not None:
+        await _elector.stop()
+        _elector = None
+    if _task is not None:
+        try:
+            await asyncio.wait_for(_task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("[outbox] in-flight emails not finished before shutdown, they will be retried after lease expiry")
+        except Exception as e:
+            logger.warning(f"[outbox] dispatcher exited with error: {e}")
+        _task = None
@@ -1,15 +1,154 @@
 import aiosmtplib
-from email.mime.text import MIMEText
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
+from email.message import Message
+from email.mime.nonmultipart import MIMENonMultipart
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
+from pathlib import Path
+import binascii
+import hashlib
+import json
 import logging
 import re
+import time
 
 from config import settings
+from metrics import (
+    EMAIL_BODY_CACHE,
+    EMAIL_FRAGMENT_CACHE,
+    EMAIL_MESSAGE_BYTES,
+    EMAIL_RENDER_SECONDS,
+    EMAIL_SEND_SECONDS,
+    observe_seconds,
+)
+from services.smtp_pool import SMTPPool
+from services.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# 摘要中的引用标注，如 [1] [12]
+_CITATION_RE = re.compile(r"\[(\d{1,3})\]")
+
+# 每个公司区块都记一次命中 / 未命中：预先取好带标签的计数器，省去每次 labels() 的查找
+_FRAGMENT_HIT = EMAIL_FRAGMENT_CACHE.labels(result="hit")
+_FRAGMENT_MISS = EMAIL_FRAGMENT_CACHE.labels(result="miss")
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+# 共享正文里收件人地址的占位符（渲染一次后按它切成前后两段）
+_RECIPIENT_PLACEHOLDER = "\x00recipient\x00"
+# base64 每 57 字节输入编码成一行 76 个字符（MIME 要求每行不超过 76 个字符）
+_B64_LINE_BYTES = 57
+
+# 邮件里只保留这些协议的链接，其他（javascript: 等）替换为 #
+_SAFE_URL_PREFIXES = ("http://", "https://", "mailto:", "#")
+
+
+def _safe_url(url: Any) -> str:
+    url = str(url or "").strip()
+    return url if url.lower().startswith(_SAFE_URL_PREFIXES) else "#"
+
+
+def _b64_lines(data: bytes) -> str:
+    """按 MIME 要求每行 76 个字符编码（binascii.b2a_base64 每次正好编码一行）"""
+    return "".join(
+        binascii.b2a_base64(data[i:i + _B64_LINE_BYTES]).decode("ascii")
+        for i in range(0, len(data), _B64_LINE_BYTES)
+    )
+
+
+class _SharedPart:
+    """
+    一个 MIME 部分的共享正文：收件人地址之前 / 之后两段，已 base64 编码。
+    base64 每 3 字节编码成 4 个字符：前面各段长度都是 3 的倍数时，分别编码后直接拼接仍是合法的 base64，
+    解码结果与原文逐字节相同（不补任何字符，只是拼接处那一行短于 76 个字符）。
+    前段末尾不足 3 字节的零头、收件人地址和后段开头的 0~2 字节按收件人单独编码；
+    后段按这三种起点各编码一份（第一次用到时编码）。
+    """
+    __slots__ = ("head_b64", "head_rest", "tail", "_tail_b64")
+
+    def __init__(self, text: str):
+        head, tail = text.split(_RECIPIENT_PLACEHOLDER, 1)
+        head_bytes = head.encode("utf-8")
+        cut = len(head_bytes) - len(head_bytes) % 3
+        self.head_b64 = _b64_lines(head_bytes[:cut])
+        self.head_rest = head_bytes[cut:]
+        self.tail = tail.encode("utf-8")
+        self._tail_b64: List[Optional[str]] = [None, None, None]
+
+    def part(self, subtype: str, recipient: str) -> MIMENonMultipart:
+        """本收件人的 MIME 部分：共享的前段 + 收件人部分（补足到 3 的倍数）+ 对应起点的后段直接拼接"""
+        middle = self.head_rest + recipient.encode("utf-8")
+        offset = -len(middle) % 3
+        tail_b64 = self._tail_b64[offset]
+        if tail_b64 is None:
+            tail_b64 = self._tail_b64[offset] = _b64_lines(self.tail[offset:])
+        part = MIMENonMultipart("text", subtype, charset="utf-8")
+        part["Content-Transfer-Encoding"] = "base64"
+        part.set_payload(self.head_b64 + _b64_lines(middle + self.tail[:offset]) + tail_b64)
+        return part
+
+
+class _SharedBody:
+    """同一份日报（相同关注列表 + 日期）的纯文本和 HTML 正文"""
+    __slots__ = ("text", "html")
+
+    def __init__(self, text: _SharedPart, html: _SharedPart):
+        self.text = text
+        self.html = html
+
+
+class _Fragment:
+    """一个公司区块的 HTML 和纯文本渲染结果（各自在第一次使用时渲染，只要 HTML 时不渲染纯文本）"""
+    __slots__ = ("_section", "_html_template", "_text_template", "_html", "_text")
+
+    def __init__(self, section: Dict[str, Any], html_template, text_template):
+        self._section = section
+        self._html_template = html_template
+        self._text_template = text_template
+        self._html: Optional[Markup] = None
+        self._text: Optional[str] = None
+
+    @property
+    def html(self) -> Markup:
+        if self._html is None:
+            self._html = Markup(self._html_template.render(section=self._section))
+        return self._html
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._text_template.render(section=self._section)
+        return self._text
+
+
+def _build_template_env(html_style: str) -> Environment:
+    """
+    邮件模板环境：HTML 自动转义（标题、链接、摘要中的 < > & " 不会破坏邮件结构），纯文本模板不转义。
+    html_style=compact 时优先使用 compact/ 下的 HTML 模板（样式按 class 复用、去掉缩进），纯文本模板共用。
+    """
+    search_path = [str(TEMPLATE_DIR)]
+    if html_style == "compact":
+        search_path.insert(0, str(TEMPLATE_DIR / "compact"))
+    env = Environment(
+        loader=FileSystemLoader(search_path),
+        autoescape=select_autoescape(["html"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,
+        # 模板随代码发布，运行期不检查文件是否修改
+        auto_reload=False,
+    )
+    env.filters["safe_url"] = _safe_url
+    return env
+
 
 class EmailSender:
     """邮件发送服务"""
@@ -20,147 +159,242 @@ class EmailSender:
         self.smtp_user = settings.SMTP_USER
         self.smtp_password = settings.SMTP_PASSWORD
         self.from_email = settings.FROM_EMAIL
+        self.start_tls = settings.SMTP_START_TLS
+        self.pool_size = settings.SMTP_POOL_SIZE
+        self.pool_max_messages = settings.SMTP_POOL_MAX_MESSAGES
+        # 连接池绑定事件循环：worker / 脚本各自 asyncio.run 时按需重建
+        self._pool: Optional[SMTPPool] = None
+        self._pool_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 渲染进程池（EMAIL_RENDER_PROCESSES > 0 时按需创建）
+        self.render_processes = settings.EMAIL_RENDER_PROCESSES
+        self._render_executor: Optional[ProcessPoolExecutor] = None
+        self._fragment_cache_size = settings.EMAIL_FRAGMENT_CACHE_SIZE
+        self._body_cache_size = settings.EMAIL_BODY_CACHE_SIZE
+        self.load_templates(settings.EMAIL_HTML_STYLE)
+
+    def load_templates(self, html_style: str) -> None:
+        """编译邮件模板（创建单例时执行一次，之后每封邮件只执行编译好的渲染函数），并清空渲染缓存"""
+        if html_style not in ("compact", "inline"):
+            raise ValueError(f"EMAIL_HTML_STYLE 只能是 compact 或 inline: {html_style}")
+        self.html_style = html_style
+        templates = _build_template_env(html_style)
+        self._digest_template = templates.get_template("digest.html")
+        self._section_template = templates.get_template("company_section.html")
+        self._digest_text_template = templates.get_template("digest.txt")
+        self._section_text_template = templates.get_template("company_section.txt")
+        # 公司区块渲染缓存（LRU）：(ticker, 日期, 内容) -> 已渲染的 HTML / 纯文本片段
+        self._fragments: "OrderedDict[Tuple[str, str, Any], _Fragment]" = OrderedDict()
+        # 共享正文缓存（LRU）：(日期, 各公司区块缓存键) -> 编码好的正文，关注列表相同的收件人共用
+        self._bodies: "OrderedDict[Tuple, _SharedBody]" = OrderedDict()
     
+    @property
+    def is_configured(self) -> bool:
+        """SMTP 账号是否已配置"""
+        return bool(self.smtp_user and self.smtp_password)
+
+    def _extract_cited_numbers(self, summary: str, n_items: int) -> List[int]:
+        """解析摘要里的引用 [1] [2]...，返回去重后、落在 1..n_items 内的编号（保持出现顺序）。"""
+        cited_numbers: List[int] = []
+        seen: set[int] = set()
+        for m in _CITATION_RE.findall(summary or ""):
+            n = int(m)
+            if 1 <= n <= n_items and n not in seen:
+                seen.add(n)
+                cited_numbers.append(n)
+        return cited_numbers
+
+    def _reference_items(self, cited_numbers: List[int], items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """References 列表（优先展示被引用的；如果没有引用，则展示前 3 条）。"""
+        ref_numbers = cited_numbers if cited_numbers else list(range(1, min(len(items), 3) + 1))
+        references = []
+        for n in ref_numbers:
+            it = items[n - 1] if (n - 1) < len(items) else {}
+            references.append({
+                "n": n,
+                "title": it.get("title", "无标题"),
+                "url": it.get("url", "#"),
+                "source": it.get("source", "未知"),
+            })
+        return references
+
+    def _section_context(self, ticker: str, news_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """一个公司区块的模板数据：有 AI 摘要时为摘要 + References，否则为前 3 条新闻"""
+        summary_news = news_list[0]
+        if summary_news.get("summary"):
+            summary = summary_news.get("summary", "") or ""
+            items = summary_news.get("items") or []
+            # 解析摘要里的引用 [1] [2]...
+            cited_numbers = self._extract_cited_numbers(summary, len(items))
+            return {
+                "ticker": ticker,
+                "summary_lines": summary.split("\n"),
+                "references": self._reference_items(cited_numbers, items),
+            }
+
+        # 如果没有摘要，使用原来的格式：每个公司最多 3 条新闻
+        news = []
+        for it in news_list[:3]:
+            summary_text = it.get("summary", "")
+            if not summary_text and it.get("content"):
+                summary_text = it.get("content", "")[:200]
+            news.append({
+                "title": it.get("title", "无标题"),
+                "url": it.get("url", "#"),
+                "summary": summary_text,
+                "source": it.get("source", "未知"),
+            })
+        return {"ticker": ticker, "summary_lines": None, "news": news}
+
+    def _section_key(self, ticker: str, date_label: str, news_list: List[Dict[str, Any]]) -> Tuple[str, str, Any]:
+        """
+        区块缓存键 (ticker, 日期, 内容)。
+        有 AI 摘要时内容为摘要文本和每条新闻的 (标题, 链接, 来源)（References 只用到这几个字段），按值比较、不会冲突：
+        不能只凭摘要判断，未缓存的条目（如摘要生成失败的提示）和 --regenerate 后的记录可能摘要相同而新闻不同；
+        没有摘要时为实际展示的前 3 条新闻的哈希。
+        """
+        head = news_list[0]
+        if head.get("summary"):
+            refs = tuple([(it.get("title"), it.get("url"), it.get("source")) for it in head.get("items") or []])
+            return ticker, date_label, (head.get("summary"), refs)
+        raw = json.dumps(news_list[:3], ensure_ascii=False, sort_keys=True, default=str)
+        return ticker, date_label, hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _render_section(self, key: Tuple[str, str, Any], news_list: List[Dict[str, Any]]) -> _Fragment:
+        """渲染一个公司区块，相同 (ticker, 日期, 内容) 只渲染一次"""
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            _FRAGMENT_HIT.inc()
+            return fragment
+
+        _FRAGMENT_MISS.inc()
+        fragment = _Fragment(
+            self._section_context(key[0], news_list), self._section_template, self._section_text_template
+        )
+        if self._fragment_cache_size > 0:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self._fragment_cache_size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def _date_label(self, digest_content: Dict[str, Any]) -> str:
+        generated_at = digest_content.get("generated_at", datetime.utcnow().isoformat())
+        return datetime.fromisoformat(generated_at).strftime('%Y年%m月%d日')
+
+    def _sections(self, digest_content: Dict[str, Any], date_label: str) -> List[Tuple[Tuple[str, str, Any], List[Dict[str, Any]]]]:
+        """[(区块缓存键, 新闻列表)]；行业新闻已融合到“公司摘要”中，不再单独展示"""
+        return [
+            (self._section_key(ticker, date_label, news_list), news_list)
+            for ticker, news_list in digest_content.get("company_news", {}).items()
+            if news_list
+        ]
+
+    def _fragments_for(self, digest_content: Dict[str, Any], date_label: str) -> List[_Fragment]:
+        """各公司区块（缓存的片段）"""
+        return [self._render_section(key, news_list) for key, news_list in self._sections(digest_content, date_label)]
+
+    def _render_html(self, fragments: List[_Fragment], date_label: str, user_email: str) -> str:
+        return self._digest_template.render(
+            fragments=[f.html for f in fragments], date_label=date_label, user_email=Markup(escape(user_email))
+        )
+
+    def _render_text(self, fragments: List[_Fragment], date_label: str, user_email: str) -> str:
+        return self._digest_text_template.render(
+            fragments=[f.text for f in fragments], date_label=date_label, user_email=user_email
+        )
+
+    def _render_bodies(self, digest_content: Dict[str, Any], date_label: str, user_email: str) -> Tuple[str, str]:
+        """(纯文本, HTML)：页头 + 各公司区块 + 页脚"""
+        fragments = self._fragments_for(digest_content, date_label)
+        return (
+            self._render_text(fragments, date_label, user_email),
+            self._render_html(fragments, date_label, user_email),
+        )
+
     def _generate_html_content(self, digest_content: Dict[str, Any], user_email: str) -> str:
         """生成 HTML 邮件内容"""
-        company_news = digest_content.get("company_news", {})
-        generated_at = digest_content.get("generated_at", datetime.utcnow().isoformat())
-        
-        # 生成公司新闻 HTML
-        company_sections = ""
-        for ticker, news_list in company_news.items():
-            if news_list:
-                # 优先显示摘要，如果没有摘要则显示第一条新闻的摘要
-                summary_news = news_list[0] if news_list else None
-                if summary_news and summary_news.get('summary'):
-                    # 显示摘要
-                    company_name = summary_news.get('title', ticker).replace(' 新闻摘要', '')
-                    summary_text = (summary_news.get('summary', '') or '').replace("\n", "<br/>")
-                    items = summary_news.get("items") or []
-
-                    # 解析摘要里的引用 [1] [2]...
-                    cited_numbers = []
-                    for m in re.findall(r"\[(\d{1,3})\]", summary_news.get("summary", "") or ""):
-                        try:
-                            n = int(m)
-                        except Exception:
-                            continue
-                        if 1 <= n <= len(items) and n not in cited_numbers:
-                            cited_numbers.append(n)
-
-                    # 构建 references（优先展示被引用的；如果没有引用，则展示前 3 条）
-                    ref_numbers = cited_numbers if cited_numbers else list(range(1, min(len(items), 3) + 1))
-                    references_html = ""
-                    if ref_numbers:
-                        references_html += """
-                        <div style="margin-top: 14px; padding-top: 12px; border-top: 1px solid #e5e7eb;">
-                            <p style="color: #6b7280; font-size: 13px; margin: 0 0 8px 0;">References：</p>
-                            <ul style="list-style: none; padding: 0; margin: 0;">
-                        """
-                        for n in ref_numbers:
-                            it = items[n - 1] if (n - 1) < len(items) else {}
-                            title = it.get("title", "无标题")
-                            url = it.get("url", "#")
-                            src = it.get("source", "未知")
-                            references_html += f"""
-                                <li style="margin-bottom: 6px;">
-                                    <span style="color: #9ca3af; font-size: 12px; margin-right: 6px;">[{n}]</span>
-                                    <a href="{url}" style="color: #2563eb; text-decoration: none; font-size: 13px;">
-                                        {title}
-                                    </a>
-                                    <span style="color: #9ca3af; font-size: 12px; margin-left: 8px;">
-                                        来源: {src}
-                                    </span>
-                                </li>
-                            """
-                        references_html += """
-                            </ul>
-                        </div>
-                        """
-
-                    company_sections += f"""
-                    <div style="margin-bottom: 24px;">
-                        <h3 style="color: #1f2937; font-size: 18px; margin-bottom: 12px; border-left: 4px solid #3b82f6; padding-left: 12px;">
-                            {ticker}
-                        </h3>
-                        <p style="color: #374151; font-size: 15px; line-height: 1.7; margin-bottom: 12px;">
-                            {summary_text}
-                        </p>
-                        {references_html}
-                    </div>
-                    """
-                else:
-                    # 如果没有摘要，使用原来的格式
-                    news_items_html = ""
-                    for news in news_list[:3]:  # 每个公司最多3条新闻
-                        summary_text = news.get('summary', '')
-                        if not summary_text and news.get('content'):
-                            summary_text = news.get('content', '')[:200]
-                        
-                        news_items_html += f"""
-                        <li style="margin-bottom: 10px;">
-                            <a href="{news.get('url', '#')}" style="color: #2563eb; text-decoration: none; font-weight: 500;">
-                                {news.get('title', '无标题')}
-                            </a>
-                            <p style="margin: 5px 0 0 0; color: #6b7280; font-size: 14px;">
-                                {summary_text}
-                            </p>
-                            <span style="color: #9ca3af; font-size: 12px;">
-                                来源: {news.get('source', '未知')}
-                            </span>
-                        </li>
-                        """
-                    
-                    company_sections += f"""
-                    <div style="margin-bottom: 24px;">
-                        <h3 style="color: #1f2937; font-size: 18px; margin-bottom: 12px; border-left: 4px solid #3b82f6; padding-left: 12px;">
-                            {ticker}
-                        </h3>
-                        <ul style="list-style: none; padding: 0; margin: 0;">
-                            {news_items_html}
-                        </ul>
-                    </div>
-                    """
-        
-        # 行业新闻已融合到“公司摘要”中，此处不再单独展示
-        industry_section = ""
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        </head>
-        <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #374151; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #3b82f6 0%, #1d4ed8 100%); color: white; padding: 24px; border-radius: 12px 12px 0 0;">
-                <h1 style="margin: 0; font-size: 24px;">📈 StockDaily Digest</h1>
-                <p style="margin: 8px 0 0 0; opacity: 0.9;">您的每日美股新闻摘要</p>
-            </div>
-            
-            <div style="background: #ffffff; padding: 24px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 12px 12px;">
-                <p style="color: #6b7280; font-size: 14px; margin-bottom: 24px;">
-                    📅 {datetime.fromisoformat(generated_at).strftime('%Y年%m月%d日')} | 发送至: {user_email}
-                </p>
-                
-                <h2 style="color: #1f2937; font-size: 20px; margin-bottom: 16px;">
-                    🏢 公司新闻
-                </h2>
-                
-                {company_sections if company_sections else '<p style="color: #6b7280;">暂无公司新闻</p>'}
-                {industry_section}
-                
-                <div style="margin-top: 32px; padding-top: 24px; border-top: 1px solid #e5e7eb; text-align: center; color: #9ca3af; font-size: 12px;">
-                    <p>此邮件由 StockDaily Digest 自动发送</p>
-                    <p>如需修改关注列表，请访问 <a href="#" style="color: #3b82f6;">网站</a></p>
-                </div>
-            </div>
-        </body>
-        </html>
+        date_label = self._date_label(digest_content)
+        return self._render_html(self._fragments_for(digest_content, date_label), date_label, user_email)
+
+    def _generate_text_content(self, digest_content: Dict[str, Any], user_email: str) -> str:
+        """生成纯文本邮件内容"""
+        date_label = self._date_label(digest_content)
+        return self._render_text(self._fragments_for(digest_content, date_label), date_label, user_email)
+
+    def _shared_body(self, digest_content: Dict[str, Any]) -> _SharedBody:
         """
-        
-        return html
-    
+        关注列表和日期相同的收件人正文只差“发送至”一处：整封正文只渲染、编码一次，
+        以 (日期, 各公司区块缓存键) 为签名缓存，每个收件人只编码自己的地址。
+        """
+        date_label = self._date_label(digest_content)
+        signature = (date_label,) + tuple(key for key, _ in self._sections(digest_content, date_label))
+        body = self._bodies.get(signature)
+        if body is not None:
+            self._bodies.move_to_end(signature)
+            EMAIL_BODY_CACHE.labels(result="hit").inc()
+            return body
+
+        EMAIL_BODY_CACHE.labels(result="miss").inc()
+        text, html = self._render_bodies(digest_content, date_label, _RECIPIENT_PLACEHOLDER)
+        body = _SharedBody(_SharedPart(text), _SharedPart(html))
+        if self._body_cache_size > 0:
+            self._bodies[signature] = body
+            if len(self._bodies) > self._body_cache_size:
+                self._bodies.popitem(last=False)
+        return body
+
+    def build_digest_message(self, to_email: str, digest_content: Dict[str, Any], date_str: str) -> MIMEMultipart:
+        """渲染日报邮件（不发送）"""
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = f"📈 您的每日美股新闻摘要 - {date_str}"
+        msg["From"] = self.from_email
+        msg["To"] = to_email
+
+        # multipart/alternative：纯文本在前，客户端优先显示最后一个能显示的部分（HTML）
+        with observe_seconds(EMAIL_RENDER_SECONDS):
+            body = self._shared_body(digest_content)
+            msg.attach(body.text.part("plain", to_email))
+            msg.attach(body.html.part("html", str(escape(to_email))))
+        return msg
+
+    async def render_digest_message(self, to_email: str, digest_content: Dict[str, Any], date_str: str) -> str:
+        """
+        渲染并序列化日报邮件，返回可直接发送 / 写入发件箱的邮件文本。
+        EMAIL_RENDER_PROCESSES > 0 时在进程池中执行，事件循环只负责 SMTP / 数据库 I/O。
+        """
+        executor = self._get_render_executor()
+        if executor is None:
+            raw = self.build_digest_message(to_email, digest_content, date_str).as_string()
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                raw = await loop.run_in_executor(executor, _render_in_worker, to_email, digest_content, date_str)
+            except BrokenProcessPool:
+                # 子进程异常退出后进程池不可再用，下次调用时重建
+                self._render_executor = None
+                raise
+        # 邮件正文只含 ASCII（base64），字符数即字节数
+        EMAIL_MESSAGE_BYTES.observe(len(raw))
+        return raw
+
+    async def send_message(self, msg: Union[Message, str], to_email: Optional[str] = None) -> None:
+        """
+        发送一封已渲染好的邮件，失败时抛出异常。
+        msg 为 render_digest_message 返回的邮件文本时需给出 to_email（作为信封收件人，不再解析邮件）。
+        """
+        if not isinstance(msg, Message) and not to_email:
+            raise ValueError("发送已序列化的邮件时必须给出 to_email")
+        send_started = time.perf_counter()
+        try:
+            # 只记收件域名：trace 会写入本地文件，不记录收件人地址
+            domain = str(to_email or msg["To"] or "").rsplit("@", 1)[-1].strip().lower()
+            with span("email.send", domain=domain):
+                await self._deliver(msg, to_email)
+        except Exception:
+            EMAIL_SEND_SECONDS.labels(outcome="failed").observe(time.perf_counter() - send_started)
+            raise
+        EMAIL_SEND_SECONDS.labels(outcome="ok").observe(time.perf_counter() - send_started)
+
     async def send_digest_email(
         self,
         to_email: str,
@@ -178,39 +412,79 @@ class EmailSender:
         Returns:
             是否发送成功
         """
-        if not self.smtp_user or not self.smtp_password:
+        if not self.is_configured:
             logger.warning("SMTP 未配置，跳过邮件发送")
             return False
         
         try:
-            # 创建邮件
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = f"📈 您的每日美股新闻摘要 - {date_str}"
-            msg["From"] = self.from_email
-            msg["To"] = to_email
-            
-            # HTML 内容
-            html_content = self._generate_html_content(digest_content, to_email)
-            html_part = MIMEText(html_content, "html", "utf-8")
-            msg.attach(html_part)
+            raw = await self.render_digest_message(to_email, digest_content, date_str)
+            await self.send_message(raw, to_email)
+            logger.info(f"邮件已发送至 {to_email}")
+            return True
             
-            # 发送邮件
+        except Exception as e:
+            logger.error(f"发送邮件失败: {str(e)}")
+            return False
+
+    async def _deliver(self, msg: Union[Message, str], to_email: Optional[str] = None) -> None:
+        """通过连接池发送；SMTP_POOL_SIZE=0 时每封邮件单独建连（aiosmtplib.send）。"""
+        # 邮件文本直接作为 DATA 发送，信封发件人 / 收件人由参数给出
+        sender, recipients = (None, None) if isinstance(msg, Message) else (self.from_email, [to_email])
+        if self.pool_size <= 0:
             await aiosmtplib.send(
                 msg,
+                sender=sender,
+                recipients=recipients,
                 hostname=self.smtp_host,
                 port=self.smtp_port,
                 username=self.smtp_user,
                 password=self.smtp_password,
-                start_tls=True
+                start_tls=self.start_tls
             )
-            
-            logger.info(f"邮件已发送至 {to_email}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"发送邮件失败: {str(e)}")
-            return False
+            return
+        await self._get_pool().send_message(msg, sender=sender, recipients=recipients)
+
+    def _get_pool(self) -> SMTPPool:
+        loop = asyncio.get_running_loop()
+        if self._pool is None or self._pool_loop is not loop:
+            self._pool = SMTPPool(
+                self.smtp_host,
+                self.smtp_port,
+                self.smtp_user,
+                self.smtp_password,
+                start_tls=self.start_tls,
+                size=self.pool_size,
+                max_messages=self.pool_max_messages,
+            )
+            self._pool_loop = loop
+        return self._pool
+
+    def _get_render_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.render_processes <= 0:
+            return None
+        if self._render_executor is None:
+            # spawn：不继承父进程里的事件循环、数据库连接和调度器线程
+            self._render_executor = ProcessPoolExecutor(
+                max_workers=self.render_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._render_executor
+
+    async def close(self) -> None:
+        """关闭连接池中的空闲连接和渲染进程池（进程退出前调用）。"""
+        if self._pool is not None and self._pool_loop is asyncio.get_running_loop():
+            await self._pool.close()
+        self._pool = None
+        self._pool_loop = None
+        if self._render_executor is not None:
+            self._render_executor.shutdown(wait=False, cancel_futures=True)
+            self._render_executor = None
 
 
 # 单例实例
 email_sender = EmailSender()
+
+
+def _render_in_worker(to_email: str, digest_content: Dict[str, Any], date_str: str) -> str:
+    """渲染进程池中执行：每个子进程有自己的 email_sender 单例（模板和区块/正文缓存各自保留）"""
+    return email_sender.build_digest_message(to_email, digest_content, date_str).as_string()
@@ -0,0 +1,132 @@
+"""
+调度器主节点选举：数据库中的一行锁（scheduler_leases）+ 心跳续期。
+
+多个 uvicorn worker 或多个副本都会在启动时调用 start_daily_email_scheduler()，
+只有抢到锁的进程真正运行调度器；它每 ttl/3 秒续期一次，进程退出或卡死导致锁过期后，
+其他进程在下一次心跳时接管。抢锁用带条件的 UPDATE，对 SQLite / PostgreSQL 都适用。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+async def try_acquire(db: AsyncSession, name: str, owner: str, ttl_seconds: int) -> bool:
+    """抢占或续期锁：锁空闲、已过期或本来就由 owner 持有时成功。"""
+    now = datetime.utcnow()
+    if await db.get(SchedulerLease, name) is None:
+        try:
+            async with db.begin_nested():
+                db.add(SchedulerLease(name=name, owner=None, expires_at=None))
+        except IntegrityError:
+            pass  # 其他进程刚插入
+    result = await db.execute(
+        update(SchedulerLease)
+        .where(
+            SchedulerLease.name == name,
+            or_(
+                SchedulerLease.owner == owner,
+                SchedulerLease.owner.is_(None),
+                SchedulerLease.expires_at.is_(None),
+                SchedulerLease.expires_at < now,
+            ),
+        )
+        .values(owner=owner, expires_at=now + timedelta(seconds=ttl_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def release(db: AsyncSession, name: str, owner: str) -> None:
+    """主动释放锁（正常退出时调用，其他进程无需等过期即可接管）。"""
+    await db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name, SchedulerLease.owner == owner)
+        .values(owner=None, expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+class LeaderElector:
+    """
+    后台心跳：成为主节点时调用 on_elected，失去主节点时调用 on_demoted。
+    数据库暂时不可用时视为失去锁（宁可短暂无人调度，也不要两个进程同时调度）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: int,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+    ):
+        self.name = name
+        self.ttl_seconds = max(3, ttl_seconds)
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{os.urandom(3).hex()}"
+        self.is_leader = False
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.is_leader:
+            await self._set_leader(False)
+            async with AsyncSessionLocal() as db:
+                try:
+                    await release(db, self.name, self.owner)
+                except Exception as e:
+                    logger.warning(f"[leader] release failed: {e}")
+
+    async def _set_leader(self, leader: bool) -> None:
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        try:
+            if leader:
+                logger.info(f"[leader] {self.owner} elected as '{self.name}' leader")
+                await self._on_elected()
+            elif self._stopping:
+                logger.info(f"[leader] {self.owner} stepping down as '{self.name}' leader")
+                await self._on_demoted()
+            else:
+                logger.warning(f"[leader] {self.owner} lost '{self.name}' leadership")
+                await self._on_demoted()
+        except Exception as e:
+            logger.exception(f"[leader] leadership callback failed: {e}")
+
+    async def _run(self) -> None:
+        interval = self.ttl_seconds / 3
+        while True:
+            async with AsyncSessionLocal() as db:
+                try:
+                    leader = await try_acquire(db, self.name, self.owner, self.ttl_seconds)
+                except Exception as e:
+                    logger.warning(f"[leader] heartbeat failed: {e}")
+                    leader = False
+            await self._set_leader(leader)
+            await asyncio.sleep(interval)
@@ -0,0 +1,52 @@
+"""
+事件循环延迟监控：每隔 interval 秒 sleep 一次，实际醒来时间比预期晚多少就是循环被同步代码阻塞的时长。
+
+API 和日报发送共用一个事件循环时，渲染 / MIME 编码等 CPU 密集的工作会让同一循环上的请求一起变慢，
+stockdaily_event_loop_lag_seconds 用来观察这部分影响（EMAIL_RENDER_PROCESSES 开关前后对比）。
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+from metrics import EVENT_LOOP_LAG_SECONDS
+
+
+class LoopLagMonitor:
+    """在当前事件循环上采样延迟；keep_samples=True 时保留样本（基准测试计算分位数用）"""
+
+    def __init__(self, interval: float = 0.25, *, keep_samples: bool = False):
+        self.interval = interval
+        self.keep_samples = keep_samples
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "LoopLagMonitor":
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if self.keep_samples:
+                self.samples.append(lag)
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        return self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
@@ -5,8 +5,12 @@ from datetime import datetime, timedelta, timezone
 import logging
 import json
 import re
+import time
 
 from config import settings
+from metrics import AGENT_SEARCH_RETRIES, AGENT_SEARCH_SECONDS, AGENT_SEARCH_TIMEOUTS, COMPANY_NEWS_ITEMS
+from services.ai_usage import attribute, track_ai_call
+from services.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -28,19 +32,23 @@ class NewsCollector:
         max_tokens: int = 800,
         temperature: float = 0.2,
         timeout: float = 60.0,
+        stage: str = "chat",
+        ticker: Optional[str] = None,
     ) -> str:
-        """调用 Chat Completions（不做 web search），返回纯文本 content。"""
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                self.api_url,
-                headers=self.headers,
-                json={
-                    "model": "supermind-agent-v1",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                },
-            )
+        """调用 Chat Completions（不做 web search），返回纯文本 content。stage/ticker 用于 AI 调用台账。"""
+        with track_ai_call(stage, ticker=ticker) as call:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response = await client.post(
+                    self.api_url,
+                    headers=self.headers,
+                    json={
+                        "model": "supermind-agent-v1",
+                        "messages": [{"role": "user", "content": prompt}],
+                        "max_tokens": max_tokens,
+                        "temperature": temperature,
+                    },
+                )
+                call.set_response(response)
             if response.status_code != 200:
                 raise RuntimeError(f"chat completion failed: {response.status_code} - {response.text}")
             data = response.json()
@@ -107,7 +115,9 @@ Rules (critical):
 4) Output ONLY a valid JSON array of strings. No explanation.
 """
         try:
-            content = await self._chat_completion(prompt, max_tokens=400, temperature=0.2, timeout=45.0)
+            content = await self._chat_completion(
+                prompt, max_tokens=400, temperature=0.2, timeout=45.0, stage="context_queries", ticker=ticker
+            )
             arr = self._extract_json_array(content)
             queries = [q.strip() for q in arr if isinstance(q, str) and q.strip()]
             return queries[:max_queries] if queries else []
@@ -170,7 +180,9 @@ Output format (ONLY valid JSON array, no explanation):
 Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chinese reason>" }}
 """
         try:
-            content = await self._chat_completion(prompt, max_tokens=600, temperature=0.2, timeout=60.0)
+            content = await self._chat_completion(
+                prompt, max_tokens=600, temperature=0.2, timeout=60.0, stage="relevance_filter", ticker=ticker
+            )
             arr = self._extract_json_array(content)
             picks = []
             for obj in arr:
@@ -225,14 +237,15 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
         candidates: List[Dict[str, Any]] = []
         # 每个 query 拉 5 条，避免太慢/太贵
         per_query = 5
-        for q in queries[:3]:
-            items = await self.search_news_via_agent(
-                search_query=q,
-                target_date=target_date,
-                tz_name=tz_name,
-                max_results=per_query,
-            )
-            candidates.extend(items or [])
+        with attribute(ticker=ticker):
+            for q in queries[:3]:
+                items = await self.search_news_via_agent(
+                    search_query=q,
+                    target_date=target_date,
+                    tz_name=tz_name,
+                    max_results=per_query,
+                )
+                candidates.extend(items or [])
 
         candidates = self._dedupe_news_items(candidates)
         if not candidates:
@@ -316,47 +329,58 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
 """
 
         last_error = None
+        started = time.perf_counter()
         for attempt in range(max_retries + 1):
+            if attempt > 0:
+                AGENT_SEARCH_RETRIES.inc()
             try:
-                # 增加超时时间到 300 秒（5分钟），因为 AI agent 搜索可能需要更长时间
-                async with httpx.AsyncClient(timeout=300.0) as client:
-                    if attempt > 0:
-                        logger.info(f"重试第 {attempt} 次: {search_query[:50]}...")
-                    else:
-                        logger.info(f"使用 supermind-agent-v1 搜索: {search_query[:60]}... (date: {target_date}, tz={tz_name})")
-                    
-                    # max_results 增大时，模型输出 JSON 会更长，需要更多 token
-                    max_tokens = 3000 if max_results <= 5 else 6500
-                    response = await client.post(
-                        self.api_url,
-                        headers=self.headers,
-                        json={
-                            "model": "supermind-agent-v1",
-                            "messages": [
-                                {"role": "user", "content": prompt}
-                            ],
-                            "max_tokens": max_tokens,
-                            "temperature": 0.3
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        content = data["choices"][0]["message"]["content"].strip()
+                with span("news.search_attempt", attempt=attempt + 1, query=search_query[:80]) as sp, \
+                        track_ai_call("search", attempt=attempt + 1) as call:
+                    # 增加超时时间到 300 秒（5分钟），因为 AI agent 搜索可能需要更长时间
+                    async with httpx.AsyncClient(timeout=300.0) as client:
+                        if attempt > 0:
+                            logger.info(f"重试第 {attempt} 次: {search_query[:50]}...")
+                        else:
+                            logger.info(f"使用 supermind-agent-v1 搜索: {search_query[:60]}... (date: {target_date}, tz={tz_name})")
                         
-                        # 解析 AI 返回的内容
-                        news_items = self._parse_agent_response(content)
-                        news_items = self._filter_by_target_date(news_items, target_date)
-                        logger.info(f"搜索到 {len(news_items)} 条新闻")
-                        return news_items
-                    else:
+                        # max_results 增大时，模型输出 JSON 会更长，需要更多 token
+                        max_tokens = 3000 if max_results <= 5 else 6500
+                        response = await client.post(
+                            self.api_url,
+                            headers=self.headers,
+                            json={
+                                "model": "supermind-agent-v1",
+                                "messages": [
+                                    {"role": "user", "content": prompt}
+                                ],
+                                "max_tokens": max_tokens,
+                                "temperature": 0.3
+                            }
+                        )
+                        call.set_response(response)
+                        
+                        if response.status_code == 200:
+                            data = response.json()
+                            content = data["choices"][0]["message"]["content"].strip()
+                            
+                            # 解析 AI 返回的内容
+                            news_items = self._parse_agent_response(content)
+                            news_items = self._filter_by_target_date(news_items, target_date)
+                            logger.info(f"搜索到 {len(news_items)} 条新闻")
+                            sp.set_attribute("items", len(news_items))
+                            AGENT_SEARCH_SECONDS.labels(outcome="ok").observe(time.perf_counter() - started)
+                            return news_items
                         last_error = f"HTTP {response.status_code}: {response.text[:200]}"
-                        logger.warning(f"搜索失败 (attempt {attempt+1}/{max_retries+1}): {last_error}")
-                        if attempt < max_retries:
-                            await asyncio.sleep(2 * (attempt + 1))  # 递增延迟：2s, 4s
-                        continue
+                        sp.set_error(last_error)
+
+                # 非 200：退避后重试（退避等待不计入 attempt span）
+                logger.warning(f"搜索失败 (attempt {attempt+1}/{max_retries+1}): {last_error}")
+                if attempt < max_retries:
+                    await asyncio.sleep(2 * (attempt + 1))  # 递增延迟：2s, 4s
+                continue
                         
             except httpx.ReadTimeout as e:
+                AGENT_SEARCH_TIMEOUTS.inc()
                 last_error = f"超时: {str(e)}"
                 logger.warning(f"搜索超时 (attempt {attempt+1}/{max_retries+1}): {search_query[:50]}...")
                 if attempt < max_retries:
@@ -371,6 +395,7 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
         
         # 所有重试都失败
         logger.error(f"搜索最终失败（已重试 {max_retries} 次）: {search_query[:50]}... 最后错误: {last_error}")
+        AGENT_SEARCH_SECONDS.labels(outcome="failed").observe(time.perf_counter() - started)
         return []
     
     def _parse_agent_response(self, content: str) -> List[Dict[str, Any]]:
@@ -467,6 +492,7 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
         company_names: List[str],
         user_timezone: Optional[str] = None,
         max_results_per_company: int = 30,
+        target_date: Optional[str] = None,
     ) -> Dict[str, List[Dict]]:
         """
         收集公司相关新闻（过去的一天）
@@ -475,11 +501,13 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
             tickers: 股票代码列表
             company_names: 公司名称列表
             user_timezone: 用户时区（可选）
+            target_date: 指定目标日期（YYYY-MM-DD），用于预取/补跑；默认取前一天
             
         Returns:
             Dict[ticker, List[news_items]]
         """
-        target_date, tz_name = self._get_target_date(user_timezone)
+        default_date, tz_name = self._get_target_date(user_timezone)
+        target_date = target_date or default_date
         logger.info(f"收集公司新闻日期: {target_date} ({tz_name})")
 
         max_concurrency = max(1, int(getattr(settings, "MAX_CONCURRENT_AI_REQUESTS", 3)))
@@ -488,26 +516,30 @@ Each element: {{"index": <int>, "relevance_score": <0-100>, "why": "<short chine
 
         async def _fetch_one(ticker: str, name: str) -> tuple[str, List[Dict[str, Any]]]:
             async with sem:
-                try:
-                    search_query = (
-                        f"{name} ({ticker}) breaking news leak rumor product roadmap "
-                        f"earnings guidance SEC filing investigation lawsuit antitrust regulatory "
-                        f"supply chain recall partnership acquisition competitor product launch "
-                        f"\"last day\""
-                    )
-
-                    news_items = await self.search_news_via_agent(
-                        search_query=search_query,
-                        target_date=target_date,
-                        tz_name=tz_name,
-                        max_results=min(max_results_per_company, 30),
-                    )
-                    kept = (news_items or [])[: min(max_results_per_company, 30)]
-                    logger.info(f"✅ {ticker} ({name}): 收集到 {len(kept)} 条新闻")
-                    return ticker, kept
-                except Exception as e:
-                    logger.error(f"❌ {ticker} ({name}) 收集新闻失败: {str(e)}")
-                    return ticker, []
+                with span("news.collect_ticker", ticker=ticker) as sp, attribute(ticker=ticker):
+                    try:
+                        search_query = (
+                            f"{name} ({ticker}) breaking news leak rumor product roadmap "
+                            f"earnings guidance SEC filing investigation lawsuit antitrust regulatory "
+                            f"supply chain recall partnership acquisition competitor product launch "
+                            f"\"last day\""
+                        )
+
+                        news_items = await self.search_news_via_agent(
+                            search_query=search_query,
+                            target_date=target_date,
+                            tz_name=tz_name,
+                            max_results=min(max_results_per_company, 30),
+                        )
+                        kept = (news_items or [])[: min(max_results_per_company, 30)]
+                        COMPANY_NEWS_ITEMS.observe(len(kept))
+                        sp.set_attribute("items", len(kept))
+                        logger.info(f"✅ {ticker} ({name}): 收集到 {len(kept)} 条新闻")
+                        return ticker, kept
+                    except Exception as e:
+                        logger.error(f"❌ {ticker} ({name}) 收集新闻失败: {str(e)}")
+                        sp.set_error(e)
+                        return ticker, []
 
         pairs = list(zip(tickers, company_names))
         tasks = [_fetch_one(t, n) for t, n in pairs]
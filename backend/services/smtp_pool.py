@@ -0,0 +1,172 @@
+"""
+SMTP 连接池：复用已完成 STARTTLS + AUTH 的 aiosmtplib.SMTP 会话批量发信。
+
+aiosmtplib.send 每封邮件都要重新建连、握手、登录，发给几千个用户时握手耗时远大于发送本身。
+连接池最多保持 size 个会话（同时也是并发发送的上限）：
+- 空闲连接后进先出复用；空闲太久（服务器可能已断开）或已断开的连接直接丢弃重建
+- 每个连接发送 max_messages 封后主动 QUIT 重建，避免长连接被服务器限流或踢掉
+- 发送时发现连接已断开（服务器超时踢掉等），换一个新连接重试一次
+
+连接绑定创建它的事件循环，不要跨事件循环共用同一个连接池。
+"""
+
+import asyncio
+import logging
+import time
+from email.message import Message
+from typing import List, Optional, Union
+
+import aiosmtplib
+
+from metrics import SMTP_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+# 空闲超过这么多秒的连接不再复用（多数服务器空闲 60~300 秒后断开）
+_IDLE_RECYCLE_SECONDS = 50.0
+
+# 这些错误说明连接本身不可用，换新连接重试一次
+_CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    ConnectionError,
+)
+
+
+class _Connection:
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """固定上限的 SMTP 会话池。"""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        *,
+        start_tls: bool = True,
+        size: int = 4,
+        max_messages: int = 100,
+        timeout: float = 30.0,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = max(1, size)
+        self.max_messages = max(1, max_messages)
+        self.timeout = timeout
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(self.size)
+        self._closed = False
+
+    async def send_message(
+        self,
+        message: Union[Message, str],
+        *,
+        sender: Optional[str] = None,
+        recipients: Optional[List[str]] = None,
+    ) -> None:
+        """
+        发送一封邮件（最多 size 个并发，其余排队），失败时抛出 aiosmtplib 异常。
+        message 为已序列化的字符串时需要给出 sender / recipients（不再解析邮件头）。
+        """
+        if self._closed:
+            raise RuntimeError("SMTP 连接池已关闭")
+        async with self._slots:
+            conn = await self._acquire()
+            try:
+                await self._send(conn, message, sender, recipients)
+            except _CONNECTION_ERRORS as e:
+                # 连接已被服务器断开：丢弃并换新连接重试一次
+                logger.info(f"[smtp_pool] connection lost ({e}), reconnecting")
+                await self._discard(conn, "error")
+                conn = await self._connect()
+                try:
+                    await self._send(conn, message, sender, recipients)
+                except BaseException:
+                    await self._discard(conn, "error")
+                    raise
+            except Exception:
+                # 收件人被拒等业务错误不影响连接；连接已断开则丢弃
+                await self._release(conn)
+                raise
+            except BaseException:
+                # 被取消时连接停在协议中间，不能再复用
+                await self._discard(conn, "error")
+                raise
+            await self._release(conn)
+
+    @staticmethod
+    async def _send(
+        conn: _Connection,
+        message: Union[Message, str],
+        sender: Optional[str],
+        recipients: Optional[List[str]],
+    ) -> None:
+        if isinstance(message, Message):
+            await conn.smtp.send_message(message)
+        else:
+            await conn.smtp.sendmail(sender, recipients, message)
+
+    async def close(self) -> None:
+        """关闭所有空闲连接；之后不能再发送。"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._discard(conn, "closed")
+
+    async def _acquire(self) -> _Connection:
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if conn.smtp.is_connected and now - conn.last_used < _IDLE_RECYCLE_SECONDS:
+                return conn
+            await self._discard(conn, "idle")
+        return await self._connect()
+
+    async def _release(self, conn: _Connection) -> None:
+        conn.sent += 1
+        conn.last_used = time.monotonic()
+        if self._closed or not conn.smtp.is_connected:
+            await self._discard(conn, "closed")
+        elif conn.sent >= self.max_messages:
+            await self._discard(conn, "recycled")
+        else:
+            self._idle.append(conn)
+
+    async def _connect(self) -> _Connection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        try:
+            # connect() 内完成 EHLO、STARTTLS 和 AUTH
+            await smtp.connect()
+        except BaseException:
+            SMTP_CONNECTIONS.labels(event="connect_failed").inc()
+            raise
+        SMTP_CONNECTIONS.labels(event="opened").inc()
+        return _Connection(smtp)
+
+    async def _discard(self, conn: _Connection, reason: str) -> None:
+        SMTP_CONNECTIONS.labels(event=reason).inc()
+        if not conn.smtp.is_connected:
+            return
+        try:
+            await conn.smtp.quit()
+        except Exception:
+            conn.smtp.close()
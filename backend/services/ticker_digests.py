@@ -0,0 +1,132 @@
+"""
+按 (ticker, 目标日期) 缓存的新闻摘要（ticker_digests 表）。
+
+同一 ticker 在同一目标日期的新闻和摘要与用户无关：预取阶段提前算好写入，
+发送阶段所有关注该 ticker 的用户直接复用，不再重复检索/总结。
+缓存未命中时，同一进程内并发请求同一 (ticker, 日期) 只会计算一次（single-flight），其余请求等待结果。
+"""
+
+import asyncio
+import logging
+from datetime import date
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from metrics import TICKER_DIGEST_CACHE
+from models import TickerDigest
+
+logger = logging.getLogger(__name__)
+
+
+def _as_date(target_date) -> date:
+    return target_date if isinstance(target_date, date) else date.fromisoformat(target_date)
+
+
+async def load_ticker_digests(db: AsyncSession, tickers: Iterable[str], target_date) -> Dict[str, dict]:
+    """返回已缓存的 {ticker: entry}；未命中的 ticker 不在结果中。"""
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+    rows = await db.execute(
+        select(TickerDigest.ticker, TickerDigest.entry)
+        .where(TickerDigest.target_date == _as_date(target_date), TickerDigest.ticker.in_(tickers))
+    )
+    cached = {ticker: entry for ticker, entry in rows}
+    TICKER_DIGEST_CACHE.labels(result="hit").inc(len(cached))
+    TICKER_DIGEST_CACHE.labels(result="miss").inc(len(tickers) - len(cached))
+    return cached
+
+
+async def cached_tickers(db: AsyncSession, tickers: Iterable[str], target_date) -> Set[str]:
+    """tickers 中已写入 target_date 缓存的那些（只查 ticker，不计入命中率）。"""
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return set()
+    return set(await db.scalars(
+        select(TickerDigest.ticker)
+        .where(TickerDigest.target_date == _as_date(target_date), TickerDigest.ticker.in_(tickers))
+    ))
+
+
+async def store_ticker_digests(db: AsyncSession, target_date, entries: Dict[str, dict]) -> int:
+    """
+    写入缓存，返回新写入的条数。
+    多个 worker 可能同时算出同一 ticker：逐条用 savepoint 插入，唯一约束冲突说明别人已写入，直接跳过。
+    """
+    d = _as_date(target_date)
+    written = 0
+    for ticker, entry in entries.items():
+        try:
+            async with db.begin_nested():
+                db.add(TickerDigest(ticker=ticker, target_date=d, entry=entry))
+            written += 1
+        except IntegrityError:
+            logger.debug(f"[ticker_digests] {ticker} {d} already cached")
+    await db.commit()
+    return written
+
+
+async def delete_ticker_digests(db: AsyncSession, tickers: Iterable[str], target_date) -> int:
+    """删除 tickers 在 target_date 的缓存（重新生成历史摘要前使用），返回删除的条数。"""
+    tickers = list(tickers)
+    if not tickers:
+        return 0
+    result = await db.execute(
+        delete(TickerDigest)
+        .where(TickerDigest.target_date == _as_date(target_date), TickerDigest.ticker.in_(tickers))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# (ticker, 目标日期) -> 正在计算中的 Future
+_inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+async def compute_once(
+    tickers: List[str],
+    target_date: str,
+    compute: Callable[[List[str]], Awaitable[Dict[str, dict]]],
+) -> Dict[str, dict]:
+    """
+    计算 tickers 的日报条目：别的协程正在算的 ticker 直接等它的结果，其余的调用 compute 计算。
+    compute 收到的是本协程负责的 ticker 列表，需要返回 {ticker: entry}。
+    """
+    loop = asyncio.get_running_loop()
+    owned: List[str] = []
+    waiting: Dict[str, asyncio.Future] = {}
+    for ticker in tickers:
+        key = (ticker, target_date)
+        fut = _inflight.get(key)
+        if fut is not None and fut.get_loop() is loop:
+            waiting[ticker] = fut
+        else:
+            _inflight[key] = loop.create_future()
+            owned.append(ticker)
+
+    results: Dict[str, dict] = {}
+    if owned:
+        try:
+            results = await compute(owned)
+        finally:
+            # 计算失败时给等待者 None，由它们自己重算
+            for ticker in owned:
+                fut = _inflight.pop((ticker, target_date), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(results.get(ticker))
+
+    retry: List[str] = []
+    for ticker, fut in waiting.items():
+        entry = await fut
+        if entry is None:
+            retry.append(ticker)
+        else:
+            results[ticker] = entry
+    if retry:
+        results.update(await compute(retry))
+    return results
+
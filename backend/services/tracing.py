@@ -0,0 +1,146 @@
+"""
+轻量 tracing：span 通过 contextvars 传播。
+
+asyncio.gather / create_task 创建任务时会复制当前 context，因此并发抓取的各个 ticker 会自动
+挂到发起它们的父 span 下面，不需要手动传递。
+span 结束时追加写入本地 JSONL 文件（ENABLE_TRACING / TRACE_EXPORT_PATH），用 trace_waterfall.py 查看。
+关闭 tracing 时 span() 只返回一个空对象，开销可以忽略。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from config import BACKEND_DIR, settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """一次计时区间。start 为 epoch 秒，duration 为秒。"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "status", "attributes")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: Any) -> None:
+        self.status = "error"
+        self.attributes["error"] = str(error)[:300]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """tracing 关闭时返回的空 span，调用方无需判空。"""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("stockdaily_current_span", default=None)
+
+
+class JsonlSpanExporter:
+    """每个结束的 span 追加一行 JSON。多线程安全；文件按需打开。"""
+
+    def __init__(self, path: str):
+        p = Path(path)
+        if not p.is_absolute():
+            p = BACKEND_DIR / p
+        self.path = p
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                if self._fh is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._fh = open(self.path, "a", encoding="utf-8")
+                self._fh.write(line + "\n")
+                self._fh.flush()
+            except OSError as e:
+                logger.warning(f"[tracing] 写入 {self.path} 失败: {e}")
+
+
+_exporter: Optional[JsonlSpanExporter] = None
+
+
+def _get_exporter() -> JsonlSpanExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = JsonlSpanExporter(settings.TRACE_EXPORT_PATH)
+    return _exporter
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    记录一个 span；在已有 span 内调用时自动成为其子 span，否则开启新 trace。
+
+        with span("news.search_attempt", attempt=1) as sp:
+            ...
+            sp.set_attribute("items", 5)
+    """
+    if not settings.ENABLE_TRACING:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    sp = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    token = _current_span.set(sp)
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set_error(repr(e))
+        raise
+    finally:
+        sp.duration = time.perf_counter() - t0
+        _current_span.reset(token)
+        _get_exporter().export(sp)
@@ -0,0 +1,142 @@
+"""
+把 tracing 导出的 JSONL 渲染成每份日报的 waterfall，定位耗时是花在搜索、重试、摘要还是 SMTP 上。
+
+用法：
+  python trace_waterfall.py                      # 列出最近 20 个 trace
+  python trace_waterfall.py --latest             # 渲染最近一个 trace
+  python trace_waterfall.py <trace_id 前缀>      # 渲染指定 trace
+  python trace_waterfall.py --user <user_id> --latest
+  python trace_waterfall.py --file /path/to/traces.jsonl --width 80
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from config import BACKEND_DIR, settings
+
+
+def load_spans(path: Path) -> Dict[str, List[dict]]:
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sp = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            traces[sp["trace_id"]].append(sp)
+    return traces
+
+
+def trace_root(spans: List[dict]) -> dict:
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if not s.get("parent_id") or s["parent_id"] not in ids]
+    return min(roots or spans, key=lambda s: s["start"])
+
+
+def trace_user(spans: List[dict]) -> str:
+    for s in spans:
+        uid = (s.get("attributes") or {}).get("user_id")
+        if uid:
+            return uid
+    return ""
+
+
+def list_traces(traces: Dict[str, List[dict]], limit: int) -> None:
+    rows = sorted(traces.items(), key=lambda kv: trace_root(kv[1])["start"], reverse=True)[:limit]
+    print(f"{'trace_id':34s} {'root':22s} {'spans':>5s} {'errors':>6s} {'duration':>10s}  user")
+    for trace_id, spans in rows:
+        root = trace_root(spans)
+        errors = sum(1 for s in spans if s.get("status") == "error")
+        print(f"{trace_id:34s} {root['name'][:22]:22s} {len(spans):5d} {errors:6d} {root['duration']:9.2f}s  {trace_user(spans)}")
+
+
+def _fmt_attrs(attrs: dict) -> str:
+    keep = {k: v for k, v in (attrs or {}).items() if k not in ("user_id", "error")}
+    text = " ".join(f"{k}={v}" for k, v in keep.items())
+    return text[:24]
+
+
+def render_waterfall(spans: List[dict], width: int) -> None:
+    root = trace_root(spans)
+    t0 = min(s["start"] for s in spans)
+    total = max(s["start"] + s["duration"] for s in spans) - t0 or 1e-9
+
+    children: Dict[str, List[dict]] = defaultdict(list)
+    for s in spans:
+        if s is not root:
+            children[s.get("parent_id") or root["span_id"]].append(s)
+    for lst in children.values():
+        lst.sort(key=lambda s: s["start"])
+
+    print(f"trace {root['trace_id']}  total={total:.2f}s  spans={len(spans)}  user={trace_user(spans)}")
+    print("-" * (62 + width))
+
+    def walk(sp: dict, depth: int) -> None:
+        offset = int((sp["start"] - t0) / total * width)
+        length = max(1, int(sp["duration"] / total * width))
+        bar = " " * offset + ("█" if sp.get("status") != "error" else "▒") * min(length, width - offset)
+        label = ("  " * depth + sp["name"])[:28]
+        print(f"{label:28s} {_fmt_attrs(sp.get('attributes')):24s} {sp['duration']:8.2f}s |{bar:<{width}s}|")
+        if sp.get("status") == "error":
+            err = (sp.get("attributes") or {}).get("error", "")
+            print(f"{'':28s} ! {err[:100]}")
+        for child in children.get(sp["span_id"], []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+
+    # 按 span 名汇总：总耗时（注意并发子 span 的耗时会叠加）
+    agg: Dict[str, List[float]] = defaultdict(list)
+    for s in spans:
+        agg[s["name"]].append(s["duration"])
+    print("\n按阶段汇总（并发 span 耗时会叠加）：")
+    for name, ds in sorted(agg.items(), key=lambda kv: -sum(kv[1])):
+        print(f"  {name:28s} count={len(ds):4d} sum={sum(ds):9.2f}s max={max(ds):8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render digest traces as a waterfall")
+    parser.add_argument("trace_id", nargs="?", help="trace_id（可用前缀）")
+    parser.add_argument("--file", default=None, help="JSONL 路径（默认 TRACE_EXPORT_PATH）")
+    parser.add_argument("--latest", action="store_true", help="渲染最近一个 trace")
+    parser.add_argument("--user", default=None, help="只看该 user_id 的 trace")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--width", type=int, default=60)
+    args = parser.parse_args()
+
+    path = Path(args.file or settings.TRACE_EXPORT_PATH)
+    if not path.is_absolute():
+        path = BACKEND_DIR / path
+    if not path.exists():
+        print(f"未找到 trace 文件: {path}（是否设置了 ENABLE_TRACING=true？）")
+        sys.exit(1)
+
+    traces = load_spans(path)
+    if args.user:
+        traces = {tid: sps for tid, sps in traces.items() if trace_user(sps) == args.user}
+    if not traces:
+        print("没有可显示的 trace")
+        sys.exit(1)
+
+    if args.trace_id:
+        matches = [tid for tid in traces if tid.startswith(args.trace_id)]
+        if len(matches) != 1:
+            print(f"trace_id 前缀匹配到 {len(matches)} 个 trace")
+            sys.exit(1)
+        render_waterfall(traces[matches[0]], args.width)
+    elif args.latest:
+        latest = max(traces.values(), key=lambda sps: trace_root(sps)["start"])
+        render_waterfall(latest, args.width)
+    else:
+        list_traces(traces, args.limit)
+
+
+if __name__ == "__main__":
+    main()
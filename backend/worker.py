@@ -0,0 +1,153 @@
+"""
+独立的日报 worker：启动 N 个进程，从 digest_jobs 表领取任务并生成/发送日报。
+
+配合 DIGEST_WORKER_MODE=queue 使用：API 进程里的调度器只负责入队，生成日报的 CPU/网络开销
+不再占用 API 的事件循环，可以按需在多核、多台机器上横向扩展（任务通过数据库租约分配，互不重复）。
+
+用法（在 backend 目录下）：
+  python -m worker                         # DIGEST_WORKER_PROCESSES 个进程，每个进程并发 DIGEST_USER_CONCURRENCY
+  python -m worker --processes 4 --concurrency 8
+  python -m worker --date 2026-01-05 --exit-when-idle   # 只处理某一天，处理完退出
+  python -m worker --metrics-port 9100     # 第 i 个进程在 9100+i 暴露 Prometheus 指标
+
+收到 SIGTERM / Ctrl+C 后不再领取新任务，处理完手上的任务再退出；子进程异常退出会被自动拉起。
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing as mp
+import signal
+import time
+from datetime import date
+from typing import List, Optional
+
+logger = logging.getLogger("worker")
+
+
+def _setup_logging() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+
+async def _worker_main(run_date: Optional[date], concurrency: int, exit_when_idle: bool, poll_seconds: float) -> None:
+    from config import settings
+    from services.digest_jobs import run_digest_workers
+    from services.email_outbox import drain_outbox, start_email_dispatcher, stop_email_dispatcher
+    from services.email_sender import email_sender
+    from services.loop_monitor import LoopLagMonitor
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    # 常驻模式下各进程竞争投递器锁，只有一个进程发送发件箱里的邮件
+    if not exit_when_idle:
+        start_email_dispatcher()
+    loop_monitor = LoopLagMonitor().start()
+    try:
+        progress = await run_digest_workers(
+            run_date,
+            concurrency=concurrency,
+            worker_prefix="worker",
+            exit_when_idle=exit_when_idle,
+            idle_poll_seconds=poll_seconds,
+            stop_event=stop,
+        )
+        if exit_when_idle and settings.EMAIL_OUTBOX_ENABLED and not stop.is_set():
+            # 一次性运行：任务处理完后把本进程写入的邮件发出去再退出
+            await drain_outbox()
+    finally:
+        await loop_monitor.stop()
+        if not exit_when_idle:
+            await stop_email_dispatcher()
+        await email_sender.close()
+    logger.info(f"worker stopped: {dict(progress)}")
+
+
+def _run_process(
+    index: int,
+    run_date: Optional[date],
+    concurrency: int,
+    exit_when_idle: bool,
+    poll_seconds: float,
+    metrics_port: Optional[int],
+) -> None:
+    """子进程入口（spawn 启动，模块在子进程内重新导入，各自持有独立的数据库连接池）。"""
+    _setup_logging()
+    if metrics_port:
+        from prometheus_client import start_http_server
+
+        start_http_server(metrics_port + index)
+    asyncio.run(_worker_main(run_date, concurrency, exit_when_idle, poll_seconds))
+
+
+def main():
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="StockDaily digest worker")
+    parser.add_argument("--processes", type=int, default=settings.DIGEST_WORKER_PROCESSES, help="worker 进程数")
+    parser.add_argument("--concurrency", type=int, default=settings.DIGEST_USER_CONCURRENCY, help="每个进程并发处理的任务数")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="只处理该日期（YYYY-MM-DD）的任务")
+    parser.add_argument("--exit-when-idle", action="store_true", help="没有可处理的任务时退出")
+    parser.add_argument("--poll-seconds", type=float, default=5.0, help="空闲时轮询间隔（秒）")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Prometheus 端口基数（第 i 个进程使用 port+i）")
+    args = parser.parse_args()
+
+    _setup_logging()
+    from database import Base, add_missing_columns, engine
+
+    # 建表/补列在父进程里做一次，避免多个子进程同时执行 DDL
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    engine.dispose()
+
+    ctx = mp.get_context("spawn")
+    n = max(1, args.processes)
+    stopping = False
+
+    def _spawn(i: int) -> mp.Process:
+        p = ctx.Process(
+            target=_run_process,
+            args=(i, args.date, max(1, args.concurrency), args.exit_when_idle, args.poll_seconds, args.metrics_port),
+            name=f"digest-worker-{i}",
+        )
+        p.start()
+        return p
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            logger.info("stopping workers (waiting for in-flight jobs)...")
+        stopping = True
+        for p in procs:
+            if p.is_alive():
+                p.terminate()  # 子进程收到 SIGTERM 后优雅退出
+
+    procs: List[mp.Process] = [_spawn(i) for i in range(n)]
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    logger.info(f"started {n} worker processes, concurrency={args.concurrency} per process")
+
+    while True:
+        alive = 0
+        for i, p in enumerate(procs):
+            if p.is_alive():
+                alive += 1
+                continue
+            if stopping or (args.exit_when_idle and p.exitcode == 0):
+                continue
+            logger.warning(f"{p.name} exited with code {p.exitcode}, restarting")
+            procs[i] = _spawn(i)
+            alive += 1
+        if alive == 0:
+            break
+        time.sleep(1)
+    logger.info("all workers exited")
+
+
+if __name__ == "__main__":
+    main()